@@ -2,8 +2,16 @@
 Autodrop App - Main Dashboard
 """
 
+import os
+import runpy
+
 import streamlit as st
 
+# The Diagnostics view lives outside pages/ to keep it out of the sidebar
+if "diagnostics" in st.query_params:
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagnostics.py"))
+    st.stop()
+
 # Page configuration
 st.set_page_config(
     page_title="Summary",
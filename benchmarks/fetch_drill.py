@@ -0,0 +1,122 @@
+"""
+Fetch drill - Exercise the fetch scheduler and video catalog against stub channels
+
+Starts a ChannelStubServer with a fast, a slow, a failing and a flaky channel,
+loads them through VideoCatalog + FetchScheduler the way the Videos page does,
+then breaks the fast channel and checks that:
+
+- a slow channel misses its deadline without holding up the others
+- a flaky channel loads after a retry
+- a refresh after new uploads reads only the first page
+- a channel that starts failing is served from its last good catalog
+- its circuit breaker opens and stops further requests
+
+Prints one line per channel and round, and exits with status 1 if a check fails.
+
+Usage:
+    python benchmarks/fetch_drill.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from fetch_scheduler import FetchScheduler
+from stub_servers import ChannelStubServer, iter_stub_shorts
+from video_catalog import VideoCatalog
+
+
+def load(catalog: VideoCatalog, server: ChannelStubServer, names: List[str], count: int, label: str) -> Dict[str, dict]:
+    """Request every channel like the Videos page does and report each outcome"""
+    start = time.monotonic()
+    futures = {name: catalog.request(server.url(name), count) for name in names}
+    wait(list(futures.values()))
+    outcomes = {}
+    for name, future in futures.items():
+        error = future.exception()
+        status = catalog.status(server.url(name))
+        outcomes[name] = {
+            "videos": 0 if error else len(future.result()),
+            "error": type(error).__name__ if error else None,
+            "stale": bool(status["error"]) and not error,
+            "breaker": status["breaker"],
+            "requests": server.requests.get(name, 0),
+        }
+        o = outcomes[name]
+        print(
+            f"  {label:12s} {name:10s} videos {o['videos']:>2}  requests {o['requests']:>3}  "
+            f"breaker {o['breaker']:9s} {o['error'] or ('served last good catalog' if o['stale'] else '')}"
+        )
+    print(f"  {label:12s} all channels answered in {time.monotonic() - start:.2f}s")
+    return outcomes
+
+
+def main() -> Optional[int]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--deadline", type=float, default=2.0, help="Per-channel deadline (seconds)")
+    args = parser.parse_args()
+
+    checks = []
+
+    def check(name: str, passed: bool) -> None:
+        checks.append((name, passed))
+
+    with ChannelStubServer() as server, tempfile.TemporaryDirectory(prefix="autodrop-drill-") as tmp:
+        server.add("fast")
+        server.add("slow", mode="slow", delay=args.deadline * 2)
+        server.add("broken", mode="fail")
+        server.add("flaky", mode="flaky")
+        names = list(server.channels)
+
+        scheduler = FetchScheduler(
+            max_workers=4, rate_per_host=50, burst=10, deadline=args.deadline,
+            retries=2, backoff=0.1, max_backoff=0.5, failure_threshold=2, cooldown=60,
+        )
+        catalog = VideoCatalog(
+            os.path.join(tmp, "catalog.sqlite3"), refresh_interval=0, step=5,
+            lister=iter_stub_shorts, scheduler=scheduler,
+        )
+
+        print("First load:")
+        start = time.monotonic()
+        first = load(catalog, server, names, 5, "first load")
+        check("fast channel loads", first["fast"]["videos"] == 5)
+        check("slow channel times out", first["slow"]["error"] == "FetchTimeoutError")
+        check("slow channel does not hold the page past its deadline", time.monotonic() - start < args.deadline + 1)
+        check("broken channel fails", first["broken"]["error"] is not None)
+        check("flaky channel loads after a retry", first["flaky"]["videos"] == 5)
+
+        print("New uploads:")
+        server.publish("fast", 3)
+        before = server.requests["fast"]
+        load(catalog, server, ["fast"], 5, "refresh")  # serves the catalog, refreshes in the background
+        time.sleep(0.5)
+        check("refresh reads only the first page", server.requests["fast"] - before == 1)
+        newest = catalog.videos(server.url("fast"), 1)[0]["id"]
+        check("new uploads are listed first", newest == "fast-43")
+
+        print("Fast channel breaks:")
+        server.add("fast", mode="fail", videos=43)
+        for i in range(3):
+            outcome = load(catalog, server, ["fast"], 8, f"broken #{i + 1}")["fast"]
+            time.sleep(0.3)
+        check("failing channel is served from its last good catalog", outcome["videos"] == 8 and outcome["stale"])
+        check("circuit breaker opens", outcome["breaker"] == "open")
+        requests = server.requests["fast"]
+        load(catalog, server, ["fast"], 8, "open")
+        time.sleep(0.3)
+        check("open breaker stops requests", server.requests["fast"] == requests)
+
+    print("Checks:")
+    for name, passed in checks:
+        print(f"  {'OK  ' if passed else 'FAIL'} {name}")
+    return 1 if not all(passed for _, passed in checks) else None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
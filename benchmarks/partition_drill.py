@@ -0,0 +1,88 @@
+"""
+Partition drill - Exercise the day-partition cache across midnight
+
+Answers the timeline breakdown through DayPartitionedCache from an in-memory
+stand-in for the cloud DB, with a simulated clock, and checks that:
+
+- a day cached while it was today is re-fetched after midnight
+- rows synced late (within the sync lag) still reach the cached day
+- a day fetched after midnight plus the sync lag is closed and never re-fetched
+- partitions of open days are not re-fetched within the TTL
+
+Prints one line per step, and exits with status 1 if a check fails.
+
+Usage:
+    python benchmarks/partition_drill.py
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from partition_cache import DayPartitionedCache
+
+
+def main() -> Optional[int]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ttl", type=float, default=300, help="TTL of open partitions (seconds)")
+    parser.add_argument("--sync-lag-hours", type=float, default=3, help="Hours late rows may still arrive")
+    args = parser.parse_args()
+
+    checks = []
+
+    def check(name: str, passed: bool) -> None:
+        checks.append((name, passed))
+
+    day = date(2026, 3, 10)
+    uploads: Dict[date, int] = {day - timedelta(days=1): 5, day: 2}
+    fetched: List[Tuple[date, date]] = []
+    now = [datetime.combine(day, datetime.min.time()).replace(hour=15).timestamp()]
+
+    def fetch(day_query: str, window: Tuple[date, date]) -> pd.DataFrame:
+        fetched.append(window)
+        days = [d for d in sorted(uploads) if window[0] <= d <= window[1]]
+        return pd.DataFrame({"day": pd.to_datetime(days), "videos_uploaded": [uploads[d] for d in days]})
+
+    cache = DayPartitionedCache(today_ttl=args.ttl, sync_lag=args.sync_lag_hours * 3600, clock=lambda: now[0])
+
+    def render(label: str, hours: float) -> int:
+        """Advance the clock and render the window up to the simulated today; returns day's uploads"""
+        now[0] += hours * 3600
+        today = datetime.fromtimestamp(now[0]).date()
+        before = len(fetched)
+        df = cache.get_window("timeline", (day - timedelta(days=1), today), fetch)
+        count = int(df.loc[df["upload_date"] == pd.Timestamp(day), "videos_uploaded"].sum())
+        ranges = ", ".join(f"{first:%b %d}-{last:%b %d}" for first, last in fetched[before:]) or "nothing"
+        print(f"  {datetime.fromtimestamp(now[0]):%b %d %H:%M} {label:30s} {day:%b %d} shows {count:>2}, fetched {ranges}")
+        return count
+
+    print("Simulated day:")
+    render("first render", 0)
+    uploads[day] = 40
+    check("open day is not re-fetched within the TTL", render("more uploads, within the TTL", args.ttl / 7200) == 2)
+
+    midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+    now[0] = midnight - 3600
+    check("day cached before midnight is re-fetched after it", render("just after midnight", 2) == 40)
+    uploads[day] = 45
+    check("late rows within the sync lag reach the day", render("late sync", args.sync_lag_hours) == 45)
+
+    uploads[day] = 50
+    before = len(fetched)
+    count = render("next day, after the sync lag", 12)
+    check("day fetched after the sync lag is closed", count == 45 and all(first > day for first, _ in fetched[before:]))
+    check("closed earlier day is never re-fetched", all(first >= day for first, _ in fetched[1:]))
+
+    print("Checks:")
+    for name, passed in checks:
+        print(f"  {'OK  ' if passed else 'FAIL'} {name}")
+    return 1 if not all(passed for _, passed in checks) else None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Plan check - Catch query plan regressions in the Analytics SQL
+
+Runs ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` for every registered Analytics
+query and the selected Time Periods against a target database, records each
+plan's shape, estimated vs. actual rows and buffer use, and flags:
+
+- sequential scans on tables with at least ``--large-table-rows`` rows
+- row estimates off by more than ``--misestimate`` times in either direction
+- tables filtered on ``created_at`` or a status column without an index
+  leading with that column
+
+With ``--baseline`` the plans are diffed against a stored run: changed plan
+shapes, new flags and big slowdowns are reported and the script exits with
+status 1. Run it against the benchmark dataset before each release.
+
+Usage:
+    python benchmarks/plan_check.py --dsn "dbname=autodrop_bench" --output benchmarks/results/plans.json
+    python benchmarks/plan_check.py --dsn "dbname=autodrop_bench" --baseline benchmarks/results/plans.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from periods import PERIODS, get_date_range
+from query_registry import list_queries
+
+# Columns dashboard filters should be able to use an index for
+INDEXED_FILTER_COLUMNS = ("created_at", "status", "upload_status", "review_status")
+
+# Execution time differences below this are noise, whatever the ratio
+NOISE_FLOOR_MS = 10.0
+
+_CONDITION_KEYS = ("Filter", "Index Cond", "Recheck Cond", "Join Filter", "Hash Cond")
+
+
+def _nodes(plan: Dict[str, Any], depth: int = 0) -> Iterator[tuple]:
+    """(depth, node) pairs of a plan tree, depth first"""
+    yield depth, plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child, depth + 1)
+
+
+def _node_label(node: Dict[str, Any]) -> str:
+    label = node["Node Type"]
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def _table_info(cur) -> Dict[str, Dict[str, Any]]:
+    """Estimated rows and index leading columns of every user table"""
+    cur.execute("""
+        SELECT c.relname, c.reltuples::bigint,
+               COALESCE(array_agg(a.attname) FILTER (WHERE a.attname IS NOT NULL), '{}')
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_index i ON i.indrelid = c.oid
+        LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+        WHERE c.relkind IN ('r', 'p') AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+        GROUP BY c.relname, c.reltuples
+    """)
+    return {name: {"rows": max(rows, 0), "index_columns": set(columns)} for name, rows, columns in cur.fetchall()}
+
+
+def analyze_plan(plan: Dict[str, Any], tables: Dict[str, Dict[str, Any]], large_table_rows: int, misestimate: float) -> Dict[str, Any]:
+    """
+    Summarize one EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result
+
+    Returns:
+        Dict with execution/planning ms, shared hit/read blocks, the plan
+        ``shape`` (indented node labels), per-node estimated/actual rows and
+        the list of ``flags``
+    """
+    root = plan["Plan"]
+    nodes, shape, flags = [], [], []
+    filtered: Dict[str, Set[str]] = {}
+    for depth, node in _nodes(root):
+        label = _node_label(node)
+        shape.append("  " * depth + label)
+        estimated = node.get("Plan Rows", 0) * node.get("Actual Loops", 1)
+        actual = node.get("Actual Rows", 0) * node.get("Actual Loops", 1)
+        nodes.append({
+            "node": label,
+            "estimated_rows": estimated,
+            "actual_rows": actual,
+            "shared_hit": node.get("Shared Hit Blocks", 0),
+            "shared_read": node.get("Shared Read Blocks", 0),
+        })
+
+        relation = node.get("Relation Name")
+        if node["Node Type"] == "Seq Scan" and relation in tables and tables[relation]["rows"] >= large_table_rows:
+            flags.append(f"seq scan on {relation} ({tables[relation]['rows']:,} rows)")
+        if max(estimated, actual) >= 100 and min(estimated, actual) * misestimate < max(estimated, actual):
+            flags.append(f"{label}: estimated {estimated:,} rows, actual {actual:,}")
+        if relation:
+            conditions = " ".join(str(node.get(key, "")) for key in _CONDITION_KEYS)
+            for column in INDEXED_FILTER_COLUMNS:
+                if re.search(rf"\b{column}\b", conditions):
+                    filtered.setdefault(relation, set()).add(column)
+
+    for relation, columns in sorted(filtered.items()):
+        info = tables.get(relation)
+        if info is None or info["rows"] < large_table_rows:
+            continue
+        for column in sorted(columns - info["index_columns"]):
+            flags.append(f"no index leading with {relation}.{column}")
+
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "planning_ms": plan.get("Planning Time"),
+        "shared_hit": root.get("Shared Hit Blocks", 0),
+        "shared_read": root.get("Shared Read Blocks", 0),
+        "shape": shape,
+        "nodes": nodes,
+        "flags": sorted(set(flags)),
+    }
+
+
+def check_plans(dsn: str, periods: List[str], large_table_rows: int, misestimate: float, runs: int = 3) -> Dict[str, Dict[str, Any]]:
+    """
+    Explain every registered query for every period
+
+    Each query is explained ``runs`` times and the fastest run is kept, so
+    execution times are comparable between checks.
+
+    Returns:
+        {query: {period: analyze_plan() summary}}
+    """
+    plans: Dict[str, Dict[str, Any]] = {}
+    conn = psycopg2.connect(dsn)
+    conn.set_session(readonly=True, autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            tables = _table_info(cur)
+            for query in list_queries():
+                for period in periods:
+                    start_date, end_date = get_date_range(period)
+                    sql, bound = query.as_pyformat((start_date.date(), end_date.date()))
+                    explained = []
+                    for _ in range(max(runs, 1)):
+                        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, bound)
+                        raw = cur.fetchone()[0]
+                        explained.append((json.loads(raw) if isinstance(raw, str) else raw)[0])
+                    fastest = min(explained, key=lambda plan: plan.get("Execution Time", 0))
+                    summary = analyze_plan(fastest, tables, large_table_rows, misestimate)
+                    plans.setdefault(query.name, {})[period] = summary
+                    print(f"  {query.name:22s} {period:15s} {summary['execution_ms']:>9.1f} ms  {len(summary['flags'])} flag(s)")
+    finally:
+        conn.close()
+    return plans
+
+
+def diff_plans(plans: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    Differences from a baseline run worth a look before release
+
+    Returns:
+        One line per changed plan shape, new flag, or execution time / buffer
+        use more than ``threshold`` times the baseline
+    """
+    changes = []
+    for name, periods in plans.items():
+        for period, summary in periods.items():
+            before = baseline.get(name, {}).get(period)
+            label = f"{name} / {period}"
+            if before is None:
+                changes.append(f"{label}: not in baseline")
+                continue
+            if summary["shape"] != before["shape"]:
+                old_nodes = [line.strip() for line in before["shape"]]
+                new_nodes = [line.strip() for line in summary["shape"]]
+                removed = [node for node in old_nodes if node not in new_nodes]
+                added = [node for node in new_nodes if node not in old_nodes]
+                changes.append(f"{label}: plan changed (-{removed} +{added})")
+            for flag in sorted(set(summary["flags"]) - set(before["flags"])):
+                changes.append(f"{label}: new flag: {flag}")
+            for field in ("execution_ms", "shared_hit"):
+                new, old = summary.get(field) or 0, before.get(field) or 0
+                if old and new > old * threshold and (field != "execution_ms" or new - old > NOISE_FLOOR_MS):
+                    changes.append(f"{label}: {field} {old:,.1f} -> {new:,.1f} ({new / old:.2f}x)")
+    return changes
+
+
+def main() -> Optional[int]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", default="dbname=autodrop_bench", help="Target database (libpq connection string)")
+    parser.add_argument("--periods", nargs="+", default=["Last 30 days", "All-time"], choices=PERIODS, metavar="PERIOD")
+    parser.add_argument("--large-table-rows", type=int, default=100_000, help="Tables at least this big must not be seq scanned")
+    parser.add_argument("--runs", type=int, default=3, help="EXPLAIN ANALYZE runs per query; the fastest is kept")
+    parser.add_argument("--misestimate", type=float, default=10.0, help="Flag row estimates off by more than this factor")
+    parser.add_argument("--output", help="Plan JSON path (default: benchmarks/results/plans-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier plan JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Slowdown / buffer growth ratio reported as a change")
+    args = parser.parse_args()
+
+    print("Explaining:")
+    plans = check_plans(args.dsn, args.periods, args.large_table_rows, args.misestimate, runs=args.runs)
+
+    flagged = [(name, period, flag) for name, periods in plans.items() for period, s in periods.items() for flag in s["flags"]]
+    if flagged:
+        print("Flags:")
+        for name, period, flag in flagged:
+            print(f"  {name} / {period}: {flag}")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"plans-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "database": {k: v for k, v in parse_dsn(args.dsn).items() if k != "password"},
+            "plans": plans,
+        }, f, indent=2)
+    print(f"Plans written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            changes = diff_plans(plans, json.load(f)["plans"], args.threshold)
+        for line in changes:
+            print(f"CHANGED {line}")
+        if changes:
+            return 1
+        print("No plan changes")
+    return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Benchmarks - Latency, rows scanned and memory of the Analytics queries and page
+
+Runs every registered Analytics query and a full Analytics page render for
+every Time Period against a Postgres database (normally one filled by
+synthetic_data.py) and writes the results as JSON. Compare two runs with
+``--baseline`` to catch regressions.
+
+For each query and period: cold (first run, statement not yet prepared) and
+min/median/max latency over ``--repeat`` runs, rows returned, rows scanned
+(``pg_stat_user_tables`` sequential plus index tuple reads) and peak Python
+memory of fetching the result. For each page render: cold (empty result and
+partition caches) and warm latency, peak Python memory of a cold render and
+any exceptions. Memory is traced in separate runs so it does not skew timings.
+
+Usage:
+    python benchmarks/run_benchmarks.py --dsn "dbname=autodrop_bench" --scale 1000000
+    python benchmarks/run_benchmarks.py --dsn "dbname=autodrop_bench" --baseline benchmarks/results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from psycopg2.extras import RealDictCursor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from db_pool import PooledConnection
+from periods import PERIODS, get_date_range
+from query_registry import execute_query, list_queries
+from synthetic_data import generate, table_counts
+
+ANALYTICS_PAGE = os.path.join(ROOT, "pages", "01_Analytics.py")
+
+# Differences below this are noise, whatever the ratio
+NOISE_FLOOR_MS = 5.0
+
+
+def _tuples_read(cur) -> int:
+    """Tuples read by scans of all user tables so far (flushes this session's stats first)"""
+    cur.execute("SELECT pg_stat_force_next_flush()")
+    cur.execute("SELECT pg_stat_clear_snapshot()")
+    cur.execute("SELECT COALESCE(SUM(seq_tup_read + COALESCE(idx_tup_fetch, 0)), 0) FROM pg_stat_user_tables")
+    return int(cur.fetchone()[0])
+
+
+def _window(period: str) -> tuple:
+    start_date, end_date = get_date_range(period)
+    return (start_date.date(), end_date.date())
+
+
+def bench_queries(dsn: str, periods: List[str], repeat: int) -> List[Dict[str, Any]]:
+    """Run every registered query for every period on one session"""
+    results = []
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        pooled = PooledConnection(conn)
+        with conn.cursor() as stats_cur:
+            for name in (query.name for query in list_queries()):
+                for period in periods:
+                    params = _window(period)
+                    timings, scanned, rows = [], [], 0
+                    for _ in range(1 + repeat):
+                        before = _tuples_read(stats_cur)
+                        start = time.perf_counter()
+                        rows = len(execute_query(pooled, name, params, cursor_factory=RealDictCursor))
+                        timings.append((time.perf_counter() - start) * 1000)
+                        scanned.append(_tuples_read(stats_cur) - before)
+                    # Separate traced run: tracemalloc slows Python down too much to time with it
+                    tracemalloc.start()
+                    execute_query(pooled, name, params, cursor_factory=RealDictCursor)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    warm = timings[1:]
+                    results.append({
+                        "query": name,
+                        "period": period,
+                        "cold_ms": round(timings[0], 2),
+                        "min_ms": round(min(warm), 2),
+                        "median_ms": round(statistics.median(warm), 2),
+                        "max_ms": round(max(warm), 2),
+                        "rows": rows,
+                        "rows_scanned": scanned[-1],
+                        "peak_kib": round(peak / 1024, 1),
+                    })
+                    print(f"  {name:22s} {period:15s} {results[-1]['median_ms']:>9.1f} ms  {rows:>8,} rows")
+    finally:
+        conn.close()
+    return results
+
+
+def bench_pages(periods: List[str]) -> List[Dict[str, Any]]:
+    """Render the Analytics page for every period, cold and warm"""
+    from streamlit.testing.v1 import AppTest
+
+    from partition_cache import get_partition_cache
+    from result_cache import clear_caches
+
+    def render(period: str, cold: bool, traced: bool = False) -> tuple:
+        at = AppTest.from_file(ANALYTICS_PAGE, default_timeout=600)
+        at.run()
+        at.sidebar.selectbox[0].select(period)
+        if cold:
+            # The first run rendered the default period; start the measured run from empty caches
+            clear_caches()
+            get_partition_cache().clear()
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        at.run()
+        elapsed = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1] if traced else 0
+        tracemalloc.stop()
+        errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+        return elapsed, peak, errors
+
+    results = []
+    for period in periods:
+        cold_ms, _, cold_errors = render(period, cold=True)
+        warm_ms, _, warm_errors = render(period, cold=False)
+        # Separate traced cold run for peak memory (tracemalloc distorts timings)
+        _, peak, _ = render(period, cold=True, traced=True)
+        results.append({
+            "page": "Analytics",
+            "period": period,
+            "cold_ms": round(cold_ms, 1),
+            "warm_ms": round(warm_ms, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "errors": cold_errors + warm_errors,
+        })
+        print(f"  Analytics {period:15s} cold {cold_ms:>8.0f} ms  warm {warm_ms:>6.0f} ms")
+    return results
+
+
+def _use_database(dsn: str, cache_dir: str) -> None:
+    """Point the app's config at the benchmark database, with no disk cache"""
+    params = parse_dsn(dsn)
+    os.environ["CLOUD_HOST"] = params.get("host", os.environ.get("PGHOST", "localhost"))
+    os.environ["CLOUD_DB_PORT"] = params.get("port", os.environ.get("PGPORT", "5432"))
+    os.environ["CLOUD_DATABASE_NAME"] = params.get("dbname", "autodrop")
+    os.environ["CLOUD_READONLY_USER"] = params.get("user", os.environ.get("PGUSER", ""))
+    os.environ["CLOUD_READONLY_DB_PASSWORD"] = params.get("password", os.environ.get("PGPASSWORD", ""))
+    os.environ["ANALYTICS_BACKEND"] = "postgres"
+    os.environ["DISK_CACHE_ENABLED"] = "false"
+    os.environ["AUTODROP_CACHE_DIR"] = cache_dir
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Regressions of ``results`` against ``baseline``
+
+    Returns:
+        One line per query median or page latency more than ``threshold``
+        times (and NOISE_FLOOR_MS) slower than in the baseline
+    """
+    regressions = []
+    checks = [("queries", ("query", "period"), "median_ms"), ("pages", ("page", "period"), "cold_ms"), ("pages", ("page", "period"), "warm_ms")]
+    for section, key_fields, field in checks:
+        old = {tuple(row[k] for k in key_fields): row for row in baseline.get(section, [])}
+        for row in results.get(section, []):
+            before = old.get(tuple(row[k] for k in key_fields))
+            if before is None or not before.get(field):
+                continue
+            new, prev = row[field], before[field]
+            if new > prev * threshold and new - prev > NOISE_FLOOR_MS:
+                label = " / ".join(str(row[k]) for k in key_fields)
+                regressions.append(f"{label} {field}: {prev:.1f} -> {new:.1f} ({new / prev:.2f}x)")
+    return regressions
+
+
+def main() -> Optional[int]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", default="dbname=autodrop_bench", help="Benchmark database (libpq connection string)")
+    parser.add_argument("--scale", type=int, help="Regenerate the synthetic dataset with about this many rows first")
+    parser.add_argument("--days", type=int, default=730, help="Days of history when generating")
+    parser.add_argument("--periods", nargs="+", default=PERIODS, choices=PERIODS, metavar="PERIOD")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm runs per query and period")
+    parser.add_argument("--skip-pages", action="store_true", help="Only benchmark the queries")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.scale:
+        print(f"Generating ~{args.scale:,} rows...")
+        generate(args.dsn, args.scale, days=args.days)
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        dataset = table_counts(conn)
+        server_version = conn.server_version
+    finally:
+        conn.close()
+
+    results: Dict[str, Any] = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "database": {k: v for k, v in parse_dsn(args.dsn).items() if k != "password"},
+        "environment": {"python": platform.python_version(), "postgres": server_version, "machine": platform.machine()},
+        "dataset": dataset,
+    }
+    print(f"Dataset: {sum(dataset.values()):,} rows")
+
+    print("Queries:")
+    results["queries"] = bench_queries(args.dsn, args.periods, args.repeat)
+    if not args.skip_pages:
+        print("Pages:")
+        with tempfile.TemporaryDirectory(prefix="autodrop-bench-") as cache_dir:
+            _use_database(args.dsn, cache_dir)
+            results["pages"] = bench_pages(args.periods)
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions")
+    return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Stub servers - Local stand-ins for the external services the Videos page fetches from
+
+ChannelStubServer serves fake channels' Shorts listings as JSON pages
+(``GET /<channel>/shorts?page=N``), newest first, with a behaviour per
+channel to exercise the fetch scheduler:
+
+- ``ok``: answers immediately
+- ``slow``: sleeps ``delay`` seconds before every page
+- ``fail``: answers 500
+- ``flaky``: fails every other request
+
+It also serves every listed Short's thumbnail as a full-size JPEG
+(``GET /<channel>/thumb/<n>``, IMAGE_SIZE pixels), counting requests per
+image in ``image_requests``, to exercise the thumbnail cache.
+
+iter_stub_shorts() reads a stub channel the way iter_shorts() reads YouTube
+(one page per generator step), so VideoCatalog(lister=iter_stub_shorts) runs
+against the stub instead of YouTube.
+"""
+import io
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+PAGE_SIZE = 10
+IMAGE_SIZE = (1280, 720)
+
+
+class ChannelStubServer:
+    """Threaded local HTTP server of fake channels; use as a context manager"""
+
+    def __init__(self, port: int = 0):
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {}
+        self.image_requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def add(self, name: str, mode: str = "ok", videos: int = 40, delay: float = 0.0) -> str:
+        """
+        Add (or change) a channel
+
+        Returns:
+            The channel URL
+        """
+        with self._lock:
+            self.channels[name] = {"mode": mode, "videos": videos, "delay": delay}
+        return self.url(name)
+
+    def publish(self, name: str, count: int = 1) -> None:
+        """Add ``count`` new Shorts at the top of a channel"""
+        with self._lock:
+            self.channels[name]["videos"] += count
+
+    def url(self, name: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{name}"
+
+    def __enter__(self) -> "ChannelStubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, name: str, page: int) -> tuple:
+        """(status, body) for one listing page"""
+        with self._lock:
+            channel = self.channels.get(name)
+            if channel is None:
+                return 404, {"error": "no such channel"}
+            self.requests[name] = self.requests.get(name, 0) + 1
+            count = self.requests[name]
+            mode, total, delay = channel["mode"], channel["videos"], channel["delay"]
+
+        if mode == "slow":
+            time.sleep(delay)
+        elif mode == "fail" or (mode == "flaky" and count % 2):
+            return 500, {"error": "internal error"}
+
+        # Video n is the n-th upload, so new uploads appear at the top
+        first = total - page * PAGE_SIZE
+        ids = range(first, max(first - PAGE_SIZE, 0), -1)
+        return 200, {
+            "entries": [
+                {"id": f"{name}-{n}", "title": f"{name} short {n}", "thumbnail": f"{self.url(name)}/thumb/{n}"}
+                for n in ids
+            ],
+            "next": first - PAGE_SIZE > 0,
+        }
+
+    def _image(self, name: str, n: str) -> tuple:
+        """(status, JPEG bytes) for one thumbnail"""
+        with self._lock:
+            channel = self.channels.get(name)
+            if channel is None or not n.isdigit() or not 0 < int(n) <= channel["videos"]:
+                return 404, b""
+            key = f"{name}-{n}"
+            self.image_requests[key] = self.image_requests.get(key, 0) + 1
+
+        # A gradient with a few shapes so it compresses like a photo rather than a flat fill
+        image = Image.linear_gradient("L").resize(IMAGE_SIZE).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        seed = int(n)
+        for i in range(12):
+            x, y = (seed * 97 + i * 131) % IMAGE_SIZE[0], (seed * 53 + i * 71) % IMAGE_SIZE[1]
+            draw.ellipse((x, y, x + 160, y + 160), fill=((seed * 40 + i * 20) % 256, (i * 37) % 256, (seed * 11) % 256))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=90)
+        return 200, out.getvalue()
+
+    def _handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip("/").split("/")
+                content_type = "application/json"
+                if len(parts) == 3 and parts[1] == "thumb":
+                    status, payload = stub._image(parts[0], parts[2])
+                    content_type = "image/jpeg"
+                elif len(parts) != 2 or parts[1] != "shorts":
+                    status, payload = 404, json.dumps({"error": "not found"}).encode()
+                else:
+                    page = int(parse_qs(parsed.query).get("page", ["0"])[0])
+                    status, body = stub._respond(parts[0], page)
+                    payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def iter_stub_shorts(channel_url: str, timeout: float = 10.0) -> Iterator[Dict[str, str]]:
+    """Yield a stub channel's Shorts newest first, requesting the next page only when needed"""
+    page = 0
+    while True:
+        with urllib.request.urlopen(f"{channel_url}/shorts?page={page}", timeout=timeout) as response:
+            body = json.load(response)
+        yield from body["entries"]
+        if not body["next"]:
+            return
+        page += 1
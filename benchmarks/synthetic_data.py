@@ -0,0 +1,186 @@
+"""
+Synthetic data - Generate an Autodrop-shaped dataset in a local Postgres
+
+Creates ``channels``, ``news``, ``article_summaries``, ``audio_transcripts``,
+``video_generations`` and ``video_uploads`` with the columns the dashboard
+reads, and fills them server-side with ``generate_series`` so even 10M rows
+load in minutes. Every article walks the pipeline with random stage delays and
+drop-offs (summaries ~85% of articles, audio ~90% of summaries, videos ~95%
+of audio, reviews 60% approved / 20% rejected / 20% pending, ~8% failed
+uploads), spread over the last ``days`` days.
+
+Usage:
+    python benchmarks/synthetic_data.py --dsn "dbname=autodrop_bench" --scale 1000000
+"""
+import argparse
+import time
+from typing import Dict
+
+import psycopg2
+
+# Rows in all tables per news article, from the drop-off rates above
+ROWS_PER_ARTICLE = 3.7
+
+TABLES = ("channels", "news", "article_summaries", "audio_transcripts", "video_generations", "video_uploads")
+
+_SCHEMA = """
+DROP TABLE IF EXISTS video_uploads, video_generations, audio_transcripts, article_summaries, news, channels CASCADE;
+CREATE TABLE channels (
+  id serial PRIMARY KEY,
+  name text NOT NULL
+);
+CREATE TABLE news (
+  id serial PRIMARY KEY,
+  title text NOT NULL,
+  category text,
+  source_name text,
+  created_at timestamp NOT NULL
+);
+CREATE TABLE article_summaries (
+  id serial PRIMARY KEY,
+  article_id integer NOT NULL REFERENCES news (id),
+  created_at timestamp NOT NULL
+);
+CREATE TABLE audio_transcripts (
+  id serial PRIMARY KEY,
+  article_id integer NOT NULL REFERENCES news (id),
+  created_at timestamp NOT NULL
+);
+CREATE TABLE video_generations (
+  id serial PRIMARY KEY,
+  article_id integer NOT NULL REFERENCES news (id),
+  status text NOT NULL,
+  review_status text,
+  created_at timestamp NOT NULL,
+  completed_at timestamp,
+  reviewed_at timestamp
+);
+CREATE TABLE video_uploads (
+  id serial PRIMARY KEY,
+  video_generation_id integer NOT NULL REFERENCES video_generations (id),
+  channel_id integer REFERENCES channels (id),
+  platform text NOT NULL,
+  upload_status text NOT NULL,
+  error_message text,
+  created_at timestamp NOT NULL
+);
+"""
+
+_DATA = """
+SELECT setseed(%(seed)s);
+
+INSERT INTO channels (name)
+SELECT 'Channel ' || g FROM generate_series(1, %(channels)s) g;
+
+INSERT INTO news (title, category, source_name, created_at)
+SELECT
+  'Article ' || g,
+  (ARRAY['sports', 'technology', 'politics', 'business', 'entertainment', 'science', 'health', 'world'])[1 + floor(random() * 8)::int],
+  'source_' || floor(power(random(), 2) * 60)::int,
+  now()::timestamp - random() * make_interval(days => %(days)s)
+FROM generate_series(1, %(articles)s) g;
+
+INSERT INTO article_summaries (article_id, created_at)
+SELECT id, created_at + make_interval(secs => 60 + random() * 1800)
+FROM news WHERE random() < 0.85;
+
+INSERT INTO audio_transcripts (article_id, created_at)
+SELECT article_id, created_at + make_interval(secs => 60 + random() * 1200)
+FROM article_summaries WHERE random() < 0.90;
+
+INSERT INTO video_generations (article_id, status, review_status, created_at, completed_at, reviewed_at)
+SELECT
+  article_id,
+  CASE WHEN r < 0.10 THEN 'failed' ELSE 'completed' END,
+  CASE WHEN r < 0.10 THEN NULL WHEN r < 0.28 THEN NULL WHEN r < 0.46 THEN 'rejected' ELSE 'approved' END,
+  started,
+  CASE WHEN r < 0.10 THEN NULL ELSE started + make_interval(secs => 300 + random() * 3300) END,
+  CASE WHEN r < 0.28 THEN NULL ELSE started + make_interval(secs => 3900 + power(random(), 3) * 172800) END
+FROM (
+  SELECT article_id, random() AS r, created_at + make_interval(secs => 30 + random() * 600) AS started
+  FROM audio_transcripts WHERE random() < 0.95
+) t;
+
+INSERT INTO video_uploads (video_generation_id, channel_id, platform, upload_status, error_message, created_at)
+SELECT
+  id,
+  1 + floor(random() * %(channels)s)::int,
+  'youtube',
+  CASE WHEN r < 0.08 THEN 'failed' ELSE 'completed' END,
+  CASE WHEN r < 0.08 THEN (ARRAY['Quota exceeded', 'Upload timed out', 'Invalid credentials', NULL])[1 + floor(random() * 4)::int] END,
+  reviewed_at + make_interval(secs => 60 + random() * 7200)
+FROM (SELECT id, reviewed_at, random() AS r FROM video_generations WHERE review_status = 'approved') t;
+"""
+
+_INDEXES = """
+CREATE INDEX ON news (created_at);
+CREATE INDEX ON article_summaries (created_at);
+CREATE INDEX ON article_summaries (article_id);
+CREATE INDEX ON audio_transcripts (created_at);
+CREATE INDEX ON audio_transcripts (article_id);
+CREATE INDEX ON video_generations (created_at);
+CREATE INDEX ON video_generations (article_id);
+CREATE INDEX ON video_uploads (created_at);
+CREATE INDEX ON video_uploads (video_generation_id);
+"""
+
+
+def generate(dsn: str, scale: int, days: int = 730, seed: float = 0.42, channels: int = 6, indexes: bool = True) -> Dict[str, int]:
+    """
+    (Re)create the Autodrop tables in a database and fill them with synthetic rows
+
+    Args:
+        dsn: libpq connection string of the target database (its tables are dropped)
+        scale: Approximate total rows across all tables
+        days: Days of history the rows are spread over, ending now
+        seed: Random seed (-1..1), so a scale always produces the same dataset
+        channels: Number of upload channels
+        indexes: Create created_at and foreign key indexes (primary keys are always created)
+
+    Returns:
+        Table name -> row count
+    """
+    articles = max(1, int(scale / ROWS_PER_ARTICLE))
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(_SCHEMA)
+            cur.execute(_DATA, {"seed": seed, "channels": channels, "days": days, "articles": articles})
+            if indexes:
+                cur.execute(_INDEXES)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+        return table_counts(conn)
+    finally:
+        conn.close()
+
+
+def table_counts(conn) -> Dict[str, int]:
+    """Row count of every Autodrop table"""
+    counts = {}
+    with conn.cursor() as cur:
+        for table in TABLES:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dsn", default="dbname=autodrop_bench", help="Target database (its Autodrop tables are dropped)")
+    parser.add_argument("--scale", type=int, default=100_000, help="Approximate total rows (10k to 10M)")
+    parser.add_argument("--days", type=int, default=730, help="Days of history")
+    parser.add_argument("--seed", type=float, default=0.42, help="Random seed between -1 and 1")
+    parser.add_argument("--no-indexes", action="store_true", help="Only create primary keys")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.dsn, args.scale, days=args.days, seed=args.seed, indexes=not args.no_indexes)
+    for table, count in counts.items():
+        print(f"{table:20s} {count:>12,}")
+    print(f"{'total':20s} {sum(counts.values()):>12,}  ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
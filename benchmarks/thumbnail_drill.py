@@ -0,0 +1,108 @@
+"""
+Thumbnail drill - Exercise the thumbnail cache against a stub image server
+
+Starts a ChannelStubServer, lists a channel's Shorts and loads their
+thumbnails through ThumbnailCache the way the Videos grid does, then checks
+that:
+
+- every thumbnail is downloaded once, also when several pages ask for it at once
+- the cached copies are WebP, no wider than the configured width, and smaller
+  than the originals
+- the cache directory stays under its size cap, evicting the least recently
+  used thumbnails first
+- an image that cannot be downloaded returns None (the grid falls back to its URL)
+
+Prints the sizes and timings, and exits with status 1 if a check fails.
+
+Usage:
+    python benchmarks/thumbnail_drill.py
+"""
+import argparse
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from stub_servers import ChannelStubServer, iter_stub_shorts
+from thumbnail_cache import ThumbnailCache
+
+
+def main() -> Optional[int]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--videos", type=int, default=12, help="Thumbnails to load")
+    parser.add_argument("--width", type=int, default=320, help="Cached thumbnail width (pixels)")
+    parser.add_argument("--quality", type=int, default=70, help="WebP quality")
+    args = parser.parse_args()
+
+    checks = []
+
+    def check(name: str, passed: bool) -> None:
+        checks.append((name, passed))
+
+    with ChannelStubServer() as server, tempfile.TemporaryDirectory(prefix="autodrop-thumbs-") as tmp:
+        url = server.add("channel", videos=args.videos)
+        items = [(v["id"], v["thumbnail"]) for v in itertools.islice(iter_stub_shorts(url), args.videos)]
+        cache = ThumbnailCache(os.path.join(tmp, "thumbs"), max_bytes=1 << 30, width=args.width, quality=args.quality)
+
+        # Several pages rendering the same grid at once
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: cache.get_many(items), range(4)))
+        cold = time.monotonic() - start
+        start = time.monotonic()
+        warm_results = cache.get_many(items)
+        warm = time.monotonic() - start
+
+        check("every thumbnail loads", all(results[0][video_id] for video_id, _ in items))
+        check("concurrent pages download each thumbnail once", all(server.image_requests.get(video_id) == 1 for video_id, _ in items))
+        check("a second load downloads nothing", sum(server.image_requests.values()) == len(items) and warm_results == results[0])
+
+        with urllib.request.urlopen(items[0][1]) as response:
+            raw = response.read()
+        original = Image.open(io.BytesIO(raw))
+        cached = [warm_results[video_id] for video_id, _ in items]
+        images = [Image.open(io.BytesIO(data)) for data in cached]
+        check("cached thumbnails are WebP", all(image.format == "WEBP" for image in images))
+        check(f"cached thumbnails are at most {args.width}px wide", all(image.width <= args.width for image in images))
+        average = sum(len(data) for data in cached) / len(cached)
+        check("cached thumbnails are smaller than the originals", average < len(raw))
+        print(f"Original {original.size} {original.format}: {len(raw) / 1024:.1f} KiB")
+        print(f"Cached {images[0].size} WebP: {average / 1024:.1f} KiB on average ({len(raw) / average:.0f}x smaller)")
+        print(f"{len(items)} thumbnails: {cold * 1000:.0f} ms cold (4 pages at once), {warm * 1000:.1f} ms warm")
+
+        # Room for about four thumbnails: after reading the first one again,
+        # the fifth should evict the second rather than the first
+        capped = ThumbnailCache(os.path.join(tmp, "capped"), max_bytes=int(average * 4.5), width=args.width, quality=args.quality)
+        for video_id, thumbnail in items[:4] + [items[0]] + items[4:5]:
+            capped.get(video_id, thumbnail)
+            time.sleep(0.01)
+        check("eviction keeps recently read thumbnails", os.path.exists(capped._path(items[0][0])))
+        check("eviction removes the least recently used thumbnail", not os.path.exists(capped._path(items[1][0])))
+        for video_id, thumbnail in items[5:]:
+            capped.get(video_id, thumbnail)
+        stats = capped.stats()
+        on_disk = sum(entry.stat().st_size for entry in os.scandir(capped.directory))
+        print(f"Capped cache: {stats['files']} files, {on_disk / 1024:.1f} KiB of {stats['max_bytes'] / 1024:.1f} KiB")
+        check("capped cache stays under its size cap", on_disk <= stats["max_bytes"] and stats["bytes"] == on_disk)
+
+        missing = cache.get("missing", f"{url}/thumb/{args.videos + 1}")
+        unreachable = cache.get("unreachable", "http://127.0.0.1:9/thumb.jpg")
+        check("a missing or unreachable image returns None", missing is None and unreachable is None)
+
+    print("Checks:")
+    for name, passed in checks:
+        print(f"  {'OK  ' if passed else 'FAIL'} {name}")
+    return 1 if not all(passed for _, passed in checks) else None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Columnar fetch - Build typed DataFrames from query results without per-row dicts
+
+Two fetch modes are available:
+- "tuples": executes the prepared statement on a plain tuple cursor and builds
+  the frame with ``DataFrame.from_records`` (keeps server-side plan reuse)
+- "copy": streams ``COPY (query) TO STDOUT`` as CSV straight into
+  ``pandas.read_csv``, so values are parsed in C without any Python row objects
+
+In both modes columns are cast to NumPy/pandas dtypes from the Postgres type of
+each result column.
+"""
+import io
+import time
+from typing import Any, List, Sequence, Tuple
+
+import pandas as pd
+
+import query_metrics
+from config_loader import get_config_value
+from db_pool import PooledConnection
+from query_registry import get_query, run_prepared
+
+# Postgres type OIDs -> pandas dtypes
+_DTYPES = {
+    16: "boolean",   # bool
+    20: "Int64",     # int8
+    21: "Int64",     # int2
+    23: "Int64",     # int4
+    700: "float64",  # float4
+    701: "float64",  # float8
+    1700: "float64", # numeric
+}
+_TIMESTAMP_TYPES = {1082, 1114}  # date, timestamp
+_TIMESTAMPTZ = 1184
+
+Columns = List[Tuple[str, int]]
+
+
+def _columns(description) -> Columns:
+    return [(col.name, col.type_code) for col in description]
+
+
+def _typed(df: pd.DataFrame, columns: Columns) -> pd.DataFrame:
+    for name, oid in columns:
+        if oid in _DTYPES:
+            df[name] = df[name].astype(_DTYPES[oid])
+        elif oid in _TIMESTAMP_TYPES:
+            df[name] = pd.to_datetime(df[name])
+        elif oid == _TIMESTAMPTZ:
+            df[name] = pd.to_datetime(df[name], utc=True)
+    return df
+
+
+def frame_from_rows(rows: Sequence[Tuple[Any, ...]], description) -> pd.DataFrame:
+    """
+    Build a typed DataFrame from tuple rows and a cursor description
+
+    Args:
+        rows: Result rows as tuples
+        description: ``cursor.description`` of the query that produced them
+
+    Returns:
+        DataFrame with one typed column per result column
+    """
+    columns = _columns(description)
+    df = pd.DataFrame.from_records(rows, columns=[col for col, _ in columns], coerce_float=True)
+    return _typed(df, columns)
+
+
+def _fetch_tuples(conn: PooledConnection, name: str, params: Sequence[Any]) -> pd.DataFrame:
+    with conn.cursor() as cur:
+        run_prepared(cur, conn, name, params)
+        return frame_from_rows(cur.fetchall(), cur.description)
+
+
+def _fetch_copy(conn: PooledConnection, name: str, params: Sequence[Any]) -> pd.DataFrame:
+    sql, bound = get_query(name).as_pyformat(params)
+    buffer = io.StringIO()
+    with conn.cursor() as cur:
+        # Result column names and types, without running the query
+        cur.execute(f"SELECT * FROM ({sql}) q LIMIT 0", bound)
+        columns = _columns(cur.description)
+        start = time.perf_counter()
+        cur.copy_expert(cur.mogrify(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", bound).decode(), buffer)
+        query_metrics.record_db(time.perf_counter() - start, rows=cur.rowcount, nbytes=buffer.tell())
+    buffer.seek(0)
+    if not buffer.getvalue():
+        return _typed(pd.DataFrame({col: pd.Series(dtype=object) for col, _ in columns}), columns)
+    df = pd.read_csv(
+        buffer,
+        header=None,
+        names=[col for col, _ in columns],
+        dtype={col: "string" for col, oid in columns if oid not in _DTYPES},
+        true_values=["t"],
+        false_values=["f"],
+    )
+    return _typed(df, columns)
+
+
+def fetch_frame(conn: PooledConnection, name: str, params: Sequence[Any], mode: str = "") -> pd.DataFrame:
+    """
+    Fetch a registered metric as a typed DataFrame
+
+    Args:
+        conn: Pooled connection
+        name: Registered metric name
+        params: Positional parameter values
+        mode: "tuples" or "copy" (default: COLUMNAR_FETCH_MODE, else "tuples")
+
+    Returns:
+        DataFrame with one typed column per result column
+    """
+    mode = mode or str(get_config_value("COLUMNAR_FETCH_MODE", "tuples")).lower()
+    if mode == "copy":
+        return _fetch_copy(conn, name, params)
+    if mode == "tuples":
+        return _fetch_tuples(conn, name, params)
+    raise ValueError(f"unknown columnar fetch mode: {mode!r}")
@@ -82,3 +82,44 @@ def get_db_config() -> Dict[str, Any]:
         "user": get_config_value("CLOUD_READONLY_USER"),
         "password": get_config_value("CLOUD_READONLY_DB_PASSWORD"),
     }
+
+
+def get_db_pool_config() -> Dict[str, Any]:
+    """
+    Get connection pool sizing from Streamlit secrets or .env
+    
+    Returns:
+        Dictionary with pool sizing and recycling parameters (seconds)
+    """
+    return {
+        "min_size": int(get_config_value("DB_POOL_MIN_SIZE", 1)),
+        "max_size": int(get_config_value("DB_POOL_MAX_SIZE", 5)),
+        "max_lifetime": float(get_config_value("DB_POOL_MAX_LIFETIME", 1800)),
+        "max_idle": float(get_config_value("DB_POOL_MAX_IDLE", 300)),
+        "health_check_interval": float(get_config_value("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+        "acquire_timeout": float(get_config_value("DB_POOL_ACQUIRE_TIMEOUT", 10)),
+    }
+
+
+def get_cache_dir() -> str:
+    """
+    Get the directory for local caches and stores (created if missing)
+    
+    Returns:
+        Absolute path of AUTODROP_CACHE_DIR (default: .cache in the app root)
+    """
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+    path = os.path.abspath(get_config_value("AUTODROP_CACHE_DIR", default))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_analytics_backend() -> str:
+    """
+    Get the backend that answers Analytics metrics
+    
+    Returns:
+        "postgres" (query the cloud DB directly), "rollup" (local daily rollups)
+        or "snapshot" (local Parquet snapshot queried with DuckDB)
+    """
+    return str(get_config_value("ANALYTICS_BACKEND", "postgres")).strip().lower()
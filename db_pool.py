@@ -0,0 +1,241 @@
+"""
+Database connection pool - Process-wide, reusable connections to the cloud DB
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+from config_loader import get_db_config, get_db_pool_config
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class PooledConnection:
+    """A psycopg2 connection plus the bookkeeping the pool needs to recycle it"""
+
+    def __init__(self, conn: psycopg2.extensions.connection):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Names of server-side prepared statements that exist on this session
+        self.prepared: Set[str] = set()
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    @property
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool shared by every Streamlit session in the process
+
+    Connections are created lazily up to ``max_size``. On checkout, connections
+    older than ``max_lifetime`` are recycled, connections idle for longer than
+    ``health_check_interval`` are pinged, and broken connections are evicted.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        min_size: int = 1,
+        max_size: int = 5,
+        max_lifetime: float = 1800,
+        max_idle: float = 300,
+        health_check_interval: float = 30,
+        acquire_timeout: float = 10,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.connect_kwargs = connect_kwargs
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: Deque[PooledConnection] = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {"created": 0, "recycled": 0, "evicted": 0, "timeouts": 0}
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(**self.connect_kwargs)
+        # Dashboard traffic is read-only; let the server know
+        conn.set_session(readonly=True)
+        return PooledConnection(conn)
+
+    def _discard(self, pooled: PooledConnection) -> None:
+        """Close a connection and free its slot (caller must hold the lock)"""
+        try:
+            if not pooled.conn.closed:
+                pooled.conn.close()
+        except psycopg2.Error:
+            pass
+        self._size -= 1
+        self._cond.notify()
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        if pooled.conn.closed:
+            return False
+        if pooled.idle_for < self.health_check_interval:
+            return True
+        try:
+            with pooled.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reap_idle(self) -> None:
+        """Close idle connections beyond ``min_size`` (caller must hold the lock)"""
+        keep: Deque[PooledConnection] = deque()
+        while self._idle:
+            pooled = self._idle.popleft()
+            if pooled.idle_for > self.max_idle and self._size > self.min_size:
+                self._discard(pooled)
+            else:
+                keep.append(pooled)
+        self._idle = keep
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check out a healthy connection, creating one if the pool has room
+
+        Raises:
+            PoolTimeoutError: If the pool stays exhausted for ``acquire_timeout``
+            psycopg2.Error: If a new connection cannot be established
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                self._reap_idle()
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeoutError(
+                                f"no database connection available after {self.acquire_timeout:.0f}s"
+                            )
+                        self._cond.wait(remaining)
+                        continue
+                else:
+                    create = False
+                    if pooled.age > self.max_lifetime:
+                        self._stats["recycled"] += 1
+                        self._discard(pooled)
+                        continue
+
+            if create:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+            elif not self._is_healthy(pooled):
+                with self._cond:
+                    self._stats["evicted"] += 1
+                    self._discard(pooled)
+                continue
+
+            pooled.last_used = time.monotonic()
+            return pooled
+
+    def release(self, pooled: PooledConnection, broken: bool = False) -> None:
+        """Return a connection to the pool, evicting it if broken or expired"""
+        if not broken and not pooled.conn.closed:
+            try:
+                if pooled.conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    pooled.conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        with self._cond:
+            if broken or pooled.conn.closed:
+                self._stats["evicted"] += 1
+                self._discard(pooled)
+            elif self._closed or pooled.age > self.max_lifetime:
+                self._stats["recycled"] += 1
+                self._discard(pooled)
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Context manager that checks out a connection and always returns it"""
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(pooled, broken=broken)
+
+    def close(self) -> None:
+        """Close idle connections; checked-out ones are closed on release"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.popleft())
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Get the process-wide pool, creating it from config on first use
+
+    Returns:
+        ConnectionPool shared across all Streamlit sessions
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(get_db_config(), **get_db_pool_config())
+            atexit.register(_pool.close)
+        return _pool
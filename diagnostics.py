@@ -0,0 +1,143 @@
+"""
+Diagnostics - Query latency and cache efficiency of the dashboard fetchers
+
+Not a page under pages/, so it never shows up in the sidebar: Summary.py runs
+this script when the app is opened as ``/?diagnostics=<DIAGNOSTICS_KEY>``.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import query_metrics
+from config_loader import get_config_value
+from db_pool import get_pool
+from fetch_scheduler import get_fetch_scheduler
+from query_registry import invalidate_query, list_queries
+from result_cache import cache_stats, flight_stats
+from thumbnail_cache import get_thumbnail_cache
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺", layout="wide")
+
+diagnostics_key = get_config_value("DIAGNOSTICS_KEY")
+if not diagnostics_key or st.query_params.get("diagnostics") != str(diagnostics_key):
+    st.info("This page is not available.")
+    st.stop()
+
+st.title("🩺 Diagnostics")
+st.caption("Per-process metrics since the last restart (ring buffer of recent cached fetches)")
+
+if st.button("Refresh"):
+    st.rerun()
+
+# Cache efficiency
+st.header("💾 Cache")
+stats = cache_stats()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Entries in Memory", f"{stats['entries']:,}")
+col2.metric("Memory Used", f"{stats['bytes'] / 1024 / 1024:.1f} MB")
+col3.metric("Memory Budget", f"{stats['max_bytes'] / 1024 / 1024:.0f} MB")
+col4.metric("Evictions", f"{stats['evictions']:,}")
+
+df_caches = pd.DataFrame(stats["caches"])
+if len(df_caches) > 0:
+    served = df_caches[["hits", "stale_hits", "disk_hits", "misses"]].sum(axis=1)
+    df_caches["hit_rate"] = ((served - df_caches["misses"]) / served.where(served > 0) * 100).round(1)
+    df_caches["bytes"] = (df_caches["bytes"] / 1024).round(1)
+    st.dataframe(
+        df_caches.rename(columns={
+            "namespace": "Fetcher", "hits": "Hits", "stale_hits": "Stale Hits", "disk_hits": "Disk Hits",
+            "misses": "Misses", "evictions": "Evictions", "entries": "Entries", "bytes": "KB",
+            "hit_rate": "Hit Rate (%)",
+        }),
+        width='stretch',
+        hide_index=True,
+    )
+
+# Forces a re-query of a metric after its data was corrected in the cloud DB
+col1, col2 = st.columns([3, 1])
+invalidate = col1.selectbox("Invalidate cached results of", ["All metrics"] + [query.name for query in list_queries()])
+if col2.button("Invalidate"):
+    invalidate_query(None if invalidate == "All metrics" else invalidate)
+    st.success(f"Invalidated: {invalidate}. The next render re-runs the query.")
+
+flights = [flight for flight in flight_stats() if flight["coalesced"]]
+if flights:
+    st.subheader("Coalesced Fetches")
+    st.dataframe(
+        pd.DataFrame(flights[:20])[["namespace", "key", "executions", "coalesced"]].rename(columns={
+            "namespace": "Fetcher", "key": "Arguments", "executions": "Executions", "coalesced": "Coalesced Callers",
+        }),
+        width='stretch',
+        hide_index=True,
+    )
+
+st.markdown("---")
+
+# Per-metric latency
+st.header("⏱️ Latency by Metric")
+summary = pd.DataFrame(query_metrics.latency_summary())
+if len(summary) > 0:
+    summary["hit_rate"] = (summary["hit_rate"] * 100).round(1)
+    summary["bytes"] = summary["bytes"] / 1024
+    st.dataframe(
+        summary.round(1).rename(columns={
+            "namespace": "Fetcher", "metric": "Metric", "calls": "Calls", "refreshes": "Refreshes",
+            "errors": "Errors", "hit_rate": "Hit Rate (%)", "p50_ms": "p50 (ms)", "p90_ms": "p90 (ms)",
+            "p99_ms": "p99 (ms)", "max_ms": "Max (ms)", "db_ms": "DB per Fetch (ms)", "rows": "Rows per Fetch",
+            "bytes": "KB per Fetch",
+        }),
+        width='stretch',
+        hide_index=True,
+    )
+else:
+    st.info("No calls recorded yet. Open the Analytics or Videos page first.")
+
+st.subheader("Slowest Recent Calls")
+slowest = pd.DataFrame(query_metrics.slowest(20))
+if len(slowest) > 0:
+    slowest["started_at"] = slowest["started_at"].map(lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+    st.dataframe(
+        slowest[["started_at", "namespace", "key", "cache", "wall_ms", "db_ms", "queries", "rows", "bytes", "error"]]
+        .round(1)
+        .rename(columns={
+            "started_at": "Time", "namespace": "Fetcher", "key": "Arguments", "cache": "Cache",
+            "wall_ms": "Wall (ms)", "db_ms": "DB (ms)", "queries": "Queries", "rows": "Rows",
+            "bytes": "Bytes", "error": "Error",
+        }),
+        width='stretch',
+        hide_index=True,
+    )
+
+st.markdown("---")
+
+# Connection pool
+st.header("🔌 Connection Pool")
+st.json(get_pool().stats())
+
+st.markdown("---")
+
+# Channel fetches
+st.header("📡 Channel Fetches")
+breakers = pd.DataFrame(get_fetch_scheduler().stats())
+if len(breakers) > 0:
+    st.dataframe(
+        breakers.rename(columns={"key": "Channel", "state": "Circuit", "failures": "Failures", "last_error": "Last Error"}),
+        width='stretch',
+        hide_index=True,
+    )
+else:
+    st.info("No channel fetches yet. Open the Videos page first.")
+
+thumbnail_cache = get_thumbnail_cache()
+if thumbnail_cache is not None:
+    thumbs = thumbnail_cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Thumbnails Cached", f"{thumbs['files']:,}")
+    col2.metric("Thumbnail Disk Used", f"{thumbs['bytes'] / 1024 / 1024:.1f} of {thumbs['max_bytes'] / 1024 / 1024:.0f} MB")
+    col3.metric("Thumbnail Hits", f"{thumbs['hits']:,}")
+    col4.metric("Thumbnail Downloads", f"{thumbs['misses']:,}", delta=f"{thumbs['failures']:,} failed", delta_color="off")
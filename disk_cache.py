@@ -0,0 +1,189 @@
+"""
+Disk cache - Persistent result cache that survives app restarts
+
+A SQLite-backed key/value tier beneath the in-memory result cache. Entries
+carry their own expiry, every write is a single transaction (readers never see
+a partial entry), and the file is kept under a byte budget by evicting the
+least recently used entries.
+
+The file also holds the metric cache generations (query_registry), which are
+part of the cached keys: an invalidated metric stays invalidated across
+restarts instead of its old results coming back from disk.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, Optional, Tuple
+
+from config_loader import get_cache_dir, get_config_value
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  key TEXT PRIMARY KEY,
+  namespace TEXT NOT NULL,
+  value BLOB NOT NULL,
+  size INTEGER NOT NULL,
+  stored_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS generations (
+  name TEXT PRIMARY KEY,
+  generation INTEGER NOT NULL
+);
+"""
+
+
+class DiskCache:
+    """Size-capped LRU cache of pickled values in a SQLite file"""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(namespace: str, args: Tuple[Any, ...], kwargs: Optional[dict] = None) -> str:
+        raw = repr((namespace, args, sorted((kwargs or {}).items())))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        Look up an entry
+
+        Returns:
+            (value, stored_at) if present and unexpired, else None
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT value, stored_at, expires_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, stored_at, expires_at = row
+                if expires_at <= now:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    return None
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                return None
+        try:
+            return pickle.loads(value), stored_at
+        except Exception:
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "", stored_at: Optional[float] = None) -> None:
+        """Store a value for ``ttl`` seconds, then evict LRU entries over the byte budget"""
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        stored_at = stored_at or now
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, namespace, value, size, stored_at, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, namespace, blob, len(blob), stored_at, stored_at + ttl, now),
+                )
+                self._evict()
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+
+    def _evict(self) -> None:
+        """Drop expired entries, then LRU entries until under budget (caller holds the lock)"""
+        self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            except sqlite3.Error:
+                pass
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._db.execute("DELETE FROM entries")
+            else:
+                self._db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def generation(self, name: str) -> Optional[int]:
+        """Stored generation of ``name`` (0 if never bumped), or None if the file cannot be read"""
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT generation FROM generations WHERE name = ?", (name,)).fetchone()
+            except sqlite3.Error:
+                return None
+        return row[0] if row else 0
+
+    def bump_generations(self, names: Iterable[str]) -> bool:
+        """Increment the stored generation of each name in one transaction; False if it could not be written"""
+        with self._lock:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    "INSERT INTO generations (name, generation) VALUES (?, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET generation = generation + 1",
+                    [(name,) for name in names],
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                return False
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """
+    Get the process-wide disk cache
+
+    Returns:
+        DiskCache in DISK_CACHE_DIR (default: the cache dir), capped at
+        DISK_CACHE_MAX_MB, or None when DISK_CACHE_ENABLED is false
+    """
+    global _cache
+    if str(get_config_value("DISK_CACHE_ENABLED", "true")).lower() in ("0", "false", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            directory = get_config_value("DISK_CACHE_DIR") or get_cache_dir()
+            os.makedirs(directory, exist_ok=True)
+            max_bytes = int(float(get_config_value("DISK_CACHE_MAX_MB", 256)) * 1024 * 1024)
+            _cache = DiskCache(os.path.join(directory, "results.sqlite3"), max_bytes=max_bytes)
+        return _cache
+
@@ -0,0 +1,261 @@
+"""
+Fetch scheduler - Bounded, deadline-aware execution of external fetches
+
+Scrapes of external sites (channel listings on the Videos page) run through
+one process-wide scheduler that:
+
+- caps how many fetches run at once (FETCH_MAX_CONCURRENCY)
+- rate limits requests per host with a token bucket (FETCH_RATE_PER_HOST, FETCH_BURST)
+- gives every fetch a deadline, counting time spent queued (FETCH_DEADLINE)
+- retries failures with jittered exponential backoff (FETCH_RETRIES, FETCH_BACKOFF)
+- trips a per-key circuit breaker after repeated failures, failing fast until
+  a cooldown has passed (FETCH_BREAKER_THRESHOLD, FETCH_BREAKER_COOLDOWN)
+
+A fetch that misses its deadline keeps running on its worker (blocking I/O
+cannot be interrupted), but its caller gets FetchTimeoutError right away.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from config_loader import get_config_value
+
+
+class FetchTimeoutError(TimeoutError):
+    """A fetch did not finish before its deadline"""
+
+
+class CircuitOpenError(RuntimeError):
+    """A fetch was refused because its key failed too often recently"""
+
+
+class HostRateLimiter:
+    """Token bucket: ``rate`` requests per second with bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        """
+        Take a token, waiting for one if needed
+
+        Args:
+            deadline: time.monotonic() value after which to give up
+
+        Returns:
+            False if no token became available before the deadline
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures; after ``cooldown`` seconds a
+    single trial fetch is let through (half-open) and its outcome closes or
+    re-opens the breaker
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._trial or time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a fetch may run now (claims the trial slot when half-open)"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, error: Optional[BaseException]) -> None:
+        """Record the outcome of an allowed fetch (``error`` is None on success)"""
+        with self._lock:
+            self._trial = False
+            if error is None:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            if self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+class FetchScheduler:
+    """Runs fetches on a bounded pool with rate limits, deadlines, retries and circuit breakers"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        rate_per_host: float = 2.0,
+        burst: float = 4,
+        deadline: float = 20.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        failure_threshold: int = 3,
+        cooldown: float = 300.0,
+    ):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.deadline = deadline
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="fetch")
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, host: str) -> HostRateLimiter:
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostRateLimiter(self.rate_per_host, self.burst)
+            return self._limiters[host]
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        """The circuit breaker of a key (created closed)"""
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self._breakers[key]
+
+    def _attempts(self, url: str, fn: Callable[[], Any], deadline_at: float) -> Any:
+        """Run ``fn`` with per-host rate limiting, retrying with full-jitter backoff until the deadline"""
+        host = urlparse(url).netloc or url
+        limiter = self._limiter(host)
+        for attempt in range(self.retries + 1):
+            if time.monotonic() >= deadline_at:
+                raise FetchTimeoutError(f"{url}: deadline passed before the fetch could start")
+            if not limiter.acquire(deadline_at):
+                raise FetchTimeoutError(f"{url}: rate limit for {host} left no time before the deadline")
+            try:
+                return fn()
+            except Exception:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                    raise
+                time.sleep(delay)
+
+    def submit(self, key: str, url: str, fn: Callable[[], Any], deadline: Optional[float] = None) -> Future:
+        """
+        Schedule a fetch
+
+        Args:
+            key: What the circuit breaker tracks (e.g. the channel URL)
+            url: URL being fetched; its host is rate limited
+            fn: Performs the fetch; called again on retries, so must be idempotent
+            deadline: Seconds until the caller gives up (default: the scheduler's)
+
+        Returns:
+            Future with ``fn``'s result, or raising CircuitOpenError,
+            FetchTimeoutError or ``fn``'s last exception
+        """
+        outer: Future = Future()
+        breaker = self.breaker(key)
+        if not breaker.allow():
+            outer.set_exception(CircuitOpenError(
+                f"{key}: skipped after {breaker.failures} failed fetches ({breaker.last_error})"
+            ))
+            return outer
+
+        deadline = self.deadline if deadline is None else deadline
+        settle_lock = threading.Lock()
+
+        def settle(result: Any = None, error: Optional[BaseException] = None) -> None:
+            with settle_lock:
+                if outer.done():
+                    return
+                breaker.record(error)
+                try:
+                    if error is None:
+                        outer.set_result(result)
+                    else:
+                        outer.set_exception(error)
+                except InvalidStateError:
+                    pass
+
+        timer = threading.Timer(deadline, lambda: settle(error=FetchTimeoutError(f"{url}: no result after {deadline:g}s")))
+        timer.daemon = True
+        timer.start()
+
+        def done(inner: Future) -> None:
+            timer.cancel()
+            error = inner.exception()
+            settle(None if error else inner.result(), error)
+
+        self._executor.submit(self._attempts, url, fn, time.monotonic() + deadline).add_done_callback(done)
+        return outer
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Circuit breaker state per key"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return [
+            {"key": key, "state": breaker.state, "failures": breaker.failures, "last_error": breaker.last_error}
+            for key, breaker in sorted(breakers.items())
+        ]
+
+
+_scheduler: Optional[FetchScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fetch_scheduler() -> FetchScheduler:
+    """
+    Get the process-wide fetch scheduler
+
+    Returns:
+        FetchScheduler configured from the FETCH_* keys
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FetchScheduler(
+                max_workers=int(get_config_value("FETCH_MAX_CONCURRENCY", 4)),
+                rate_per_host=float(get_config_value("FETCH_RATE_PER_HOST", 2)),
+                burst=float(get_config_value("FETCH_BURST", 4)),
+                deadline=float(get_config_value("FETCH_DEADLINE", 20)),
+                retries=int(get_config_value("FETCH_RETRIES", 2)),
+                backoff=float(get_config_value("FETCH_BACKOFF", 0.5)),
+                max_backoff=float(get_config_value("FETCH_BACKOFF_MAX", 8)),
+                failure_threshold=int(get_config_value("FETCH_BREAKER_THRESHOLD", 3)),
+                cooldown=float(get_config_value("FETCH_BREAKER_COOLDOWN", 300)),
+            )
+        return _scheduler
@@ -0,0 +1,371 @@
+"""
+Funnel engine - Pipeline funnel from one row of stage timestamps per article
+
+For every news article the first time it reached each pipeline stage
+(Ingested → Summarized → Audio Generated → Video Generated → Approved →
+Uploaded) is kept in a local SQLite file. Refreshes recompute only the articles
+touched since the per-table watermarks, and the funnel of any window (articles
+ingested in it) is a single scan: stage counts, drop-off, conversion and the
+average time between consecutive stages.
+
+The rows follow ANALYTICS_BACKEND: with "snapshot" they are rebuilt from the
+local Parquet snapshot whenever it changes (no cloud DB needed), with
+"rollup" the last build is served while a refresh runs in the background, and
+otherwise they are refreshed from the cloud DB before being read.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import psycopg2
+
+from config_loader import get_analytics_backend, get_cache_dir, get_config_value
+from db_pool import PoolError, get_pool
+from result_cache import get_refresh_executor
+from snapshot_store import SnapshotStore, get_snapshot_store
+
+# Display label -> column of the articles table, in pipeline order
+FUNNEL_STAGES = (
+    ("Ingested", "ingested_at"),
+    ("Summarized", "summarized_at"),
+    ("Audio Generated", "audio_at"),
+    ("Video Generated", "video_at"),
+    ("Approved", "approved_at"),
+    ("Uploaded", "uploaded_at"),
+)
+
+
+@dataclass(frozen=True)
+class FunnelSource:
+    """A source table: how to reach its article and when a row last changed"""
+
+    name: str
+    from_sql: str
+    article_id: str
+    changed_at: str
+
+
+SOURCES: Tuple[FunnelSource, ...] = (
+    FunnelSource("news", "news", "id", "created_at"),
+    FunnelSource("article_summaries", "article_summaries", "article_id", "created_at"),
+    FunnelSource("audio_transcripts", "audio_transcripts", "article_id", "created_at"),
+    FunnelSource(
+        "video_generations", "video_generations", "article_id", "GREATEST(created_at, completed_at, reviewed_at)"
+    ),
+    FunnelSource(
+        "video_uploads",
+        "video_uploads vu JOIN video_generations vg ON vg.id = vu.video_generation_id",
+        "vg.article_id",
+        "vu.created_at",
+    ),
+)
+
+# First timestamp of every stage per article; {ids} is empty or an id filter
+_STAGES_SQL = """
+SELECT n.id, n.created_at, s.ts, a.ts, v.video_at, v.approved_at, u.ts
+FROM news n
+LEFT JOIN (
+  SELECT article_id, MIN(created_at) as ts FROM article_summaries {ids_and} GROUP BY 1
+) s ON s.article_id = n.id
+LEFT JOIN (
+  SELECT article_id, MIN(created_at) as ts FROM audio_transcripts {ids_and} GROUP BY 1
+) a ON a.article_id = n.id
+LEFT JOIN (
+  SELECT
+    article_id,
+    MIN(COALESCE(completed_at, created_at)) FILTER (WHERE status = 'completed') as video_at,
+    MIN(COALESCE(reviewed_at, completed_at, created_at)) FILTER (WHERE review_status = 'approved') as approved_at
+  FROM video_generations {ids_and}
+  GROUP BY 1
+) v ON v.article_id = n.id
+LEFT JOIN (
+  SELECT vg.article_id, MIN(vu.created_at) as ts
+  FROM video_uploads vu
+  JOIN video_generations vg ON vg.id = vu.video_generation_id
+  WHERE vu.upload_status = 'completed' {vg_ids_and}
+  GROUP BY 1
+) u ON u.article_id = n.id
+{ids_where}
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+  article_id INTEGER PRIMARY KEY,
+  ingested_at TEXT NOT NULL,
+  summarized_at TEXT,
+  audio_at TEXT,
+  video_at TEXT,
+  approved_at TEXT,
+  uploaded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_ingested ON articles (ingested_at);
+CREATE TABLE IF NOT EXISTS watermarks (
+  source TEXT PRIMARY KEY,
+  max_ts TEXT NOT NULL,
+  refreshed_at REAL NOT NULL
+);
+"""
+
+# Articles recomputed per statement during incremental refreshes
+_BATCH_SIZE = 5000
+
+
+def _stages_sql(filtered: bool) -> str:
+    if not filtered:
+        return _STAGES_SQL.format(ids_and="", vg_ids_and="", ids_where="")
+    return _STAGES_SQL.format(
+        ids_and="WHERE article_id = ANY(%(ids)s)",
+        vg_ids_and="AND vg.article_id = ANY(%(ids)s)",
+        ids_where="WHERE n.id = ANY(%(ids)s)",
+    )
+
+
+def _ts(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat(sep=" ") if value is not None else None
+
+
+class FunnelEngine:
+    """Per-article stage timestamps, persisted in SQLite and refreshed by watermark"""
+
+    def __init__(self, path: str, lookback: timedelta = timedelta(hours=6)):
+        self.path = path
+        self.lookback = lookback
+        self.last_error: Optional[str] = None
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._last_refresh = 0.0
+        self._snapshot_generation: Optional[int] = None
+        self._refreshing = False
+
+    def _watermarks(self) -> Dict[str, datetime]:
+        rows = self._db.execute("SELECT source, max_ts FROM watermarks").fetchall()
+        return {source: datetime.fromisoformat(max_ts) for source, max_ts in rows}
+
+    def _store(self, rows: Iterable[Tuple[Any, ...]], replace_ids: Optional[List[int]] = None) -> int:
+        """Write article rows, first dropping ``replace_ids`` (articles no longer in the source vanish)"""
+        records = [(article_id, *(_ts(ts) for ts in stamps)) for article_id, *stamps in rows]
+        with self._db:
+            if replace_ids:
+                self._db.executemany("DELETE FROM articles WHERE article_id = ?", [(i,) for i in replace_ids])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO articles (article_id, ingested_at, summarized_at, audio_at, video_at, "
+                "approved_at, uploaded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+        return len(records)
+
+    def refresh(self, conn=None) -> int:
+        """
+        Recompute the articles touched since the last refresh
+
+        The first refresh (or one after a source was added) loads every article
+        through a server-side cursor.
+
+        Args:
+            conn: Optional pooled connection; one is checked out if omitted
+
+        Returns:
+            Number of recomputed articles
+        """
+        if conn is None:
+            with get_pool().connection() as pooled:
+                return self.refresh(pooled)
+
+        with self._lock:
+            watermarks = self._watermarks()
+            full = any(source.name not in watermarks for source in SOURCES)
+            new_watermarks: Dict[str, datetime] = {}
+            changed: Set[int] = set()
+            with conn.cursor() as cur:
+                for source in SOURCES:
+                    if full:
+                        cur.execute(f"SELECT MAX({source.changed_at}) FROM {source.from_sql}")
+                        max_ts = cur.fetchone()[0]
+                    else:
+                        cur.execute(
+                            f"SELECT {source.article_id}, MAX({source.changed_at}) FROM {source.from_sql} "
+                            f"WHERE {source.changed_at} > %(since)s GROUP BY 1",
+                            {"since": watermarks[source.name] - self.lookback},
+                        )
+                        rows = cur.fetchall()
+                        changed.update(article_id for article_id, _ in rows)
+                        max_ts = max((ts for _, ts in rows if ts), default=None)
+                    stamps = [ts for ts in (max_ts, watermarks.get(source.name)) if ts]
+                    new_watermarks[source.name] = max(stamps) if stamps else datetime(1970, 1, 1)
+
+            recomputed = 0
+            if full:
+                with self._db:
+                    self._db.execute("DELETE FROM articles")
+                itersize = int(get_config_value("STREAM_ITERSIZE", 5000))
+                with conn.cursor(name="autodrop_funnel") as cur:
+                    cur.itersize = itersize
+                    cur.execute(_stages_sql(filtered=False))
+                    while True:
+                        rows = cur.fetchmany(itersize)
+                        if not rows:
+                            break
+                        recomputed += self._store(rows)
+            else:
+                ids = sorted(changed)
+                with conn.cursor() as cur:
+                    for i in range(0, len(ids), _BATCH_SIZE):
+                        batch = ids[i:i + _BATCH_SIZE]
+                        cur.execute(_stages_sql(filtered=True), {"ids": batch})
+                        self._store(cur.fetchall(), replace_ids=batch)
+                        recomputed += len(batch)
+
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO watermarks (source, max_ts, refreshed_at) VALUES (?, ?, ?)",
+                    [(name, ts.isoformat(), time.time()) for name, ts in new_watermarks.items()],
+                )
+            self._last_refresh = time.monotonic()
+            self.last_error = None
+            return recomputed
+
+    def refresh_if_stale(self, max_age: float) -> None:
+        """
+        Refresh unless the last attempt in this process is younger than max_age seconds
+
+        Once the funnel has been built, an unreachable cloud DB keeps the last
+        refreshed rows being served (the error is kept in ``last_error``).
+        """
+        with self._lock:
+            if time.monotonic() - self._last_refresh < max_age:
+                return
+            try:
+                self.refresh()
+            except (psycopg2.Error, PoolError) as e:
+                if not self._watermarks():
+                    raise
+                self._last_refresh = time.monotonic()
+                self.last_error = str(e).strip()
+
+    @property
+    def built(self) -> bool:
+        """Whether the articles have been loaded from the cloud DB at least once"""
+        with self._lock:
+            return bool(self._watermarks())
+
+    def refresh_in_background(self, max_age: float) -> None:
+        """refresh_if_stale() on the shared refresh workers, at most one at a time"""
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._last_refresh < max_age:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self.refresh_if_stale(max_age)
+            finally:
+                self._refreshing = False
+
+        get_refresh_executor().submit(run)
+
+    def load_snapshot(self, store: SnapshotStore) -> int:
+        """
+        Rebuild every article from the local snapshot, unless it has not changed since the last load
+
+        The cloud DB watermarks are dropped, so a later refresh() starts with a
+        full load.
+
+        Returns:
+            Number of loaded articles
+        """
+        with self._lock:
+            if self._snapshot_generation == store.generation:
+                return 0
+            with self._db:
+                self._db.execute("DELETE FROM articles")
+                self._db.execute("DELETE FROM watermarks")
+            loaded = 0
+            for chunk in store.stream_sql(_stages_sql(filtered=False)):
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                loaded += self._store(chunk.itertuples(index=False, name=None))
+            self._snapshot_generation = store.generation
+            self.last_error = store.last_error
+            return loaded
+
+    def funnel(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """
+        Funnel of the articles ingested in a window, in one scan
+
+        Args:
+            start: First day of the window (inclusive)
+            end: Last day of the window (inclusive)
+
+        Returns:
+            One row per stage in pipeline order: ``stage``, ``count`` (articles
+            that reached it), ``drop_off`` (articles lost since the previous
+            stage), ``step_conversion`` and ``conversion`` (% of the previous
+            stage / of ingested articles) and ``avg_hours`` (mean time from the
+            previous stage, over articles that reached both)
+        """
+        columns = [column for _, column in FUNNEL_STAGES]
+        counts = ", ".join(f"COUNT({column})" for column in columns)
+        transitions = ", ".join(
+            f"AVG((julianday({column}) - julianday({previous})) * 24)"
+            for previous, column in zip(columns, columns[1:])
+        )
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {counts}, {transitions} FROM articles WHERE ingested_at >= ? AND ingested_at < ?",
+                (start.isoformat(), (end + timedelta(days=1)).isoformat()),
+            ).fetchone()
+
+        stage_counts, hours = row[:len(columns)], (None,) + row[len(columns):]
+        ingested = stage_counts[0]
+        funnel = []
+        for i, (stage, _) in enumerate(FUNNEL_STAGES):
+            count = stage_counts[i]
+            previous = stage_counts[i - 1] if i else count
+            funnel.append({
+                "stage": stage,
+                "count": count,
+                "drop_off": previous - count,
+                "step_conversion": round(100.0 * count / previous, 1) if previous else None,
+                "conversion": round(100.0 * count / ingested, 1) if ingested else None,
+                "avg_hours": round(hours[i], 2) if hours[i] is not None else None,
+            })
+        return funnel
+
+
+_engine: Optional[FunnelEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_funnel_engine() -> FunnelEngine:
+    """
+    Get the process-wide funnel engine, up to date for ANALYTICS_BACKEND
+
+    With "snapshot" it is rebuilt from the local snapshot when that changed;
+    with "rollup" an existing build is served and refreshed in the background;
+    otherwise it is refreshed from the cloud DB at most every
+    ROLLUP_REFRESH_INTERVAL seconds.
+
+    Returns:
+        FunnelEngine backed by funnel.sqlite3 in the cache dir
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FunnelEngine(
+                os.path.join(get_cache_dir(), "funnel.sqlite3"),
+                lookback=timedelta(hours=float(get_config_value("ROLLUP_REFRESH_LOOKBACK_HOURS", 6))),
+            )
+        engine = _engine
+    backend = get_analytics_backend()
+    interval = float(get_config_value("ROLLUP_REFRESH_INTERVAL", 300))
+    if backend == "snapshot":
+        engine.load_snapshot(get_snapshot_store())
+    elif backend == "rollup" and engine.built:
+        engine.refresh_in_background(interval)
+    else:
+        engine.refresh_if_stale(interval)
+    return engine
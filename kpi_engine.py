@@ -0,0 +1,70 @@
+"""
+KPI engine - Computes the whole Key Metrics row in a single statement
+"""
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+
+# Single-round-trip KPI statement for a window ($1 = first day, $2 = last day,
+# both inclusive). Each table is scanned once; the per-metric conditions are
+# aggregate FILTER clauses instead of separate statements.
+KPI_SQL = """
+WITH generations AS (
+  SELECT
+    COUNT(*) FILTER (WHERE status = 'completed') as total_generated,
+    COUNT(*) FILTER (WHERE reviewed_at IS NULL AND review_status IS NULL) as pending_review,
+    COUNT(*) FILTER (WHERE review_status = 'approved') as approved,
+    COUNT(*) FILTER (WHERE review_status IS NOT NULL) as reviewed
+  FROM video_generations
+  WHERE created_at >= $1
+  AND created_at < $2 + interval '1 day'
+),
+uploads AS (
+  SELECT COUNT(DISTINCT video_generation_id) as total_uploaded
+  FROM video_uploads
+  WHERE upload_status = 'completed'
+  AND created_at >= $1
+  AND created_at < $2 + interval '1 day'
+),
+ingested AS (
+  SELECT COUNT(*) as ingested
+  FROM news
+  WHERE created_at >= $1
+  AND created_at < $2 + interval '1 day'
+)
+SELECT g.total_generated, g.pending_review, g.approved, g.reviewed, u.total_uploaded, i.ingested
+FROM generations g, uploads u, ingested i;
+"""
+
+
+@dataclass(frozen=True)
+class KpiSummary:
+    """Raw counts behind the Key Metrics row, with the derived rates"""
+
+    total_generated: int = 0
+    total_uploaded: int = 0
+    pending_review: int = 0
+    approved: int = 0
+    reviewed: int = 0
+    ingested: int = 0
+
+    @property
+    def approval_rate(self) -> Optional[float]:
+        """Approved share of reviewed videos (%), None when nothing was reviewed"""
+        if not self.reviewed:
+            return None
+        return self.approved / self.reviewed * 100
+
+    @property
+    def pipeline_conversion_rate(self) -> Optional[float]:
+        """Uploaded videos per ingested article (%), None when nothing was ingested"""
+        if not self.ingested:
+            return None
+        return round(100.0 * self.total_uploaded / self.ingested, 1)
+
+    @classmethod
+    def from_row(cls, row: Optional[Mapping[str, Any]]) -> "KpiSummary":
+        """Build a summary from the KPI query's result row (missing row -> zeros)"""
+        if not row:
+            return cls()
+        return cls(**{name: int(row.get(name) or 0) for name in cls.__dataclass_fields__})
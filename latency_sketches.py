@@ -0,0 +1,182 @@
+"""
+Latency sketches - Per-stage processing-time distributions from daily t-digests
+
+For every pipeline stage (News → Summary → Audio → Video) a t-digest of the
+stage durations is kept per generation day in a local SQLite file. Refreshes
+rebuild only the days with new or updated video generations (streamed through
+a server-side cursor), and the p50/p90/p99 and box-plot statistics of any
+window come from merging that window's day digests.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from config_loader import get_cache_dir, get_config_value
+from db_pool import get_pool
+from partition_cache import day_runs
+from quantile_sketch import TDigest
+from query_stream import stream_query
+
+# Column of the stage_durations statement -> display label
+STAGES = (
+    ("news_to_summary", "News → Summary"),
+    ("summary_to_audio", "Summary → Audio"),
+    ("audio_to_video", "Audio → Video"),
+    ("news_to_video", "News → Video (Total)"),
+)
+
+_CHANGED_SQL = """
+SELECT created_at::date as day, MAX(GREATEST(created_at, completed_at)) as max_ts
+FROM video_generations
+WHERE %(since)s::timestamp IS NULL OR GREATEST(created_at, completed_at) > %(since)s::timestamp
+GROUP BY 1
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketches (
+  stage TEXT NOT NULL,
+  day TEXT NOT NULL,
+  digest BLOB NOT NULL,
+  PRIMARY KEY (stage, day)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+  name TEXT PRIMARY KEY,
+  max_ts TEXT NOT NULL,
+  refreshed_at REAL NOT NULL
+);
+"""
+
+
+class LatencySketchStore:
+    """Daily per-stage t-digests, persisted in SQLite and refreshed by watermark"""
+
+    def __init__(self, path: str, lookback: timedelta = timedelta(hours=6), compression: float = 100):
+        self.path = path
+        self.lookback = lookback
+        self.compression = compression
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._last_refresh = 0.0
+
+    def refresh(self, conn=None) -> int:
+        """
+        Rebuild the day digests of days with new or updated generations
+
+        Args:
+            conn: Optional pooled connection; one is checked out if omitted
+
+        Returns:
+            Number of rebuilt days
+        """
+        if conn is None:
+            with get_pool().connection() as pooled:
+                return self.refresh(pooled)
+
+        with self._lock:
+            row = self._db.execute("SELECT max_ts FROM watermarks WHERE name = 'stage_durations'").fetchone()
+            watermark = datetime.fromisoformat(row[0]) if row else None
+            with conn.cursor() as cur:
+                cur.execute(_CHANGED_SQL, {"since": watermark - self.lookback if watermark else None})
+                changed = cur.fetchall()
+            if changed:
+                days = sorted(day for day, _ in changed)
+                digests: Dict[tuple, TDigest] = {}
+                for first, last in day_runs(days):
+                    for chunk in stream_query("stage_durations", (first, last), conn=conn):
+                        for day, rows in chunk.groupby("day"):
+                            for stage, _ in STAGES:
+                                key = (stage, day.date().isoformat())
+                                digest = digests.setdefault(key, TDigest(self.compression))
+                                digest.update(rows[stage].to_numpy(dtype="float64", na_value=float("nan")))
+
+                new_watermark = max([ts for _, ts in changed if ts] + ([watermark] if watermark else []))
+                with self._db:
+                    self._db.executemany(
+                        "DELETE FROM sketches WHERE day = ?", [(day.isoformat(),) for day in days]
+                    )
+                    self._db.executemany(
+                        "INSERT INTO sketches (stage, day, digest) VALUES (?, ?, ?)",
+                        [(stage, day, digest.to_bytes()) for (stage, day), digest in digests.items() if digest.count],
+                    )
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO watermarks (name, max_ts, refreshed_at) VALUES (?, ?, ?)",
+                        ("stage_durations", new_watermark.isoformat(), time.time()),
+                    )
+            self._last_refresh = time.monotonic()
+            return len(changed)
+
+    def refresh_if_stale(self, max_age: float) -> None:
+        """Refresh unless the last refresh in this process is younger than max_age seconds"""
+        with self._lock:
+            if time.monotonic() - self._last_refresh >= max_age:
+                self.refresh()
+
+    def distributions(self, start: date, end: date) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Merge the day digests of a window into per-stage summaries
+
+        Args:
+            start: First day of the window (inclusive)
+            end: Last day of the window (inclusive)
+
+        Returns:
+            Stage column -> TDigest.summary() (n, mean, min, max, q1, median, q3,
+            p90, p99, lowerfence, upperfence)
+        """
+        merged = {stage: TDigest(self.compression) for stage, _ in STAGES}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT stage, digest FROM sketches WHERE day >= ? AND day <= ?",
+                (start.isoformat(), end.isoformat()),
+            ).fetchall()
+        for stage, blob in rows:
+            if stage in merged:
+                merged[stage].merge(TDigest.from_bytes(blob))
+        return {stage: digest.summary() for stage, digest in merged.items()}
+
+
+def summarize_stages(chunks: Iterable[pd.DataFrame], compression: float = 100) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Per-stage summaries of stage_durations chunks, without the day digests
+
+    Used when the rows come from a local source (the snapshot backend) and
+    streaming them again is cheaper than keeping digests up to date.
+
+    Returns:
+        Same shape as LatencySketchStore.distributions()
+    """
+    digests = {stage: TDigest(compression) for stage, _ in STAGES}
+    for chunk in chunks:
+        for stage, digest in digests.items():
+            digest.update(chunk[stage].to_numpy(dtype="float64", na_value=float("nan")))
+    return {stage: digest.summary() for stage, digest in digests.items()}
+
+
+_store: Optional[LatencySketchStore] = None
+_store_lock = threading.Lock()
+
+
+def get_latency_store() -> LatencySketchStore:
+    """
+    Get the process-wide sketch store, refreshed at most every ROLLUP_REFRESH_INTERVAL seconds
+
+    Returns:
+        LatencySketchStore backed by latency_sketches.sqlite3 in the cache dir
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LatencySketchStore(
+                os.path.join(get_cache_dir(), "latency_sketches.sqlite3"),
+                lookback=timedelta(hours=float(get_config_value("ROLLUP_REFRESH_LOOKBACK_HOURS", 6))),
+                compression=float(get_config_value("LATENCY_SKETCH_COMPRESSION", 100)),
+            )
+        store = _store
+    store.refresh_if_stale(float(get_config_value("ROLLUP_REFRESH_INTERVAL", 300)))
+    return store
@@ -5,7 +5,7 @@ Analytics Dashboard - Metrics and visualizations for Autodrop
 import os
 # Import config loader for Streamlit secrets + .env support
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import pandas as pd
 import plotly.express as px
@@ -16,60 +16,109 @@ from dotenv import load_dotenv
 from psycopg2.extras import RealDictCursor
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config_loader import get_db_config
+from columnar import fetch_frame
+from config_loader import get_analytics_backend
+from db_pool import get_pool
+from funnel_engine import get_funnel_engine
+from kpi_engine import KpiSummary
+from latency_sketches import STAGES, get_latency_store, summarize_stages
+from partition_cache import PARTITIONED_METRICS, fetch_partitioned
+from periods import PERIODS, get_date_range
+from query_dispatch import QueryDispatcher
+from query_registry import execute_query, query_generation
+from query_stream import CountAggregator, TopKAggregator, aggregate
+from result_cache import cached
+from rollup_store import get_rollup_store
+from snapshot_store import SnapshotUnavailableError, get_snapshot_store
+from timeseries import GRANULARITIES, aggregate as aggregate_series, area_chart
 
 load_dotenv()
 
 st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
 
-@st.cache_data(ttl=3600)
-def fetch_metric_data(query: str):
-    """Fetch data with caching (1 hour TTL)"""
-    conn = None
-    try:
-        db_config = get_db_config()
-        conn = psycopg2.connect(
-            host=db_config["host"],
-            port=db_config["port"],
-            database=db_config["database"],
-            user=db_config["user"],
-            password=db_config["password"]
-        )
-        
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query)
-            data = cur.fetchall()
-            return data
-            
-    except psycopg2.Error as e:
-        st.error(f"Database query failed: {e}")
-        return None
-    finally:
-        if conn and not conn.closed:
-            conn.close()
-
-def get_date_range(period: str) -> tuple:
-    """Calculate date range based on period selection"""
-    end_date = datetime.now()
-    
-    if period == "Last 7 days":
-        start_date = end_date - timedelta(days=7)
-    elif period == "Last 30 days":
-        start_date = end_date - timedelta(days=30)
-    elif period == "Last 90 days":
-        start_date = end_date - timedelta(days=90)
-    elif period == "Last 6 months":
-        start_date = end_date - timedelta(days=180)
-    elif period == "Last 12 months":
-        start_date = end_date - timedelta(days=365)
-    else:  # All-time
-        start_date = datetime(2020, 1, 1)
-    
-    return start_date, end_date
+@cached("analytics.metric_data", ttl=3600)
+def fetch_metric_data(name: str, params: tuple, generation: int = 0):
+    """
+    Fetch a registered metric with caching (1 hour TTL) over a pooled connection
+
+    Expired results keep being served while a background worker refreshes
+    them (see result_cache); they are also persisted in the disk cache, so a
+    restarted app serves them without touching the database.
+
+    Served from the local daily rollups when ANALYTICS_BACKEND is "rollup",
+    from the local Parquet snapshot when it is "snapshot", otherwise from the
+    cloud DB. Cached on (metric name, params, generation);
+    ``generation`` comes from query_registry so a single metric can be
+    invalidated. Runs on dispatcher worker threads, so failures are raised (and
+    never cached) and rendered by the section that asked for the data.
+    """
+    backend = get_analytics_backend()
+    if backend == "rollup":
+        return get_rollup_store().query(name, params)
+    if backend == "snapshot":
+        df = get_snapshot_store().query(name, params)
+        # DuckDB aggregates over no rows come back as NaN; the other backends return None
+        return df.astype(object).where(df.notna(), None).to_dict("records")
+    with get_pool().connection() as conn:
+        return execute_query(conn, name, params, cursor_factory=RealDictCursor)
+
+@cached("analytics.metric_frame", ttl=3600)
+def fetch_metric_frame(name: str, params: tuple, generation: int = 0) -> pd.DataFrame:
+    """
+    Fetch a registered metric as a typed DataFrame (1 hour TTL)
+
+    Used by the chart sections: results go from the cursor (or COPY stream)
+    straight into columns without a dict per row. Breakdowns go through the
+    day-partitioned cache, so a wider window only fetches the missing days.
+    """
+    backend = get_analytics_backend()
+    if backend == "rollup":
+        return pd.DataFrame(get_rollup_store().query(name, params))
+    if backend == "snapshot":
+        return get_snapshot_store().query(name, params)
+    if name in PARTITIONED_METRICS:
+        return fetch_partitioned(name, params)
+    with get_pool().connection() as conn:
+        return fetch_frame(conn, name, params)
+
+@cached("analytics.upload_failures", ttl=3600)
+def fetch_upload_failures(params: tuple, generation: int = 0) -> dict:
+    """Stream failed uploads in chunks and keep only the totals and top errors (1 hour TTL)"""
+    total, by_channel, top_errors = aggregate(
+        "upload_failures", params,
+        CountAggregator(),
+        CountAggregator(by="channel_name"),
+        TopKAggregator(["error_message", "channel_name"], k=10),
+        stream=get_snapshot_store().stream if get_analytics_backend() == "snapshot" else None,
+    )
+    return {"total": total, "by_channel": by_channel, "top_errors": top_errors}
+
+@cached("analytics.funnel", ttl=3600)
+def fetch_funnel(params: tuple, generation: int = 0) -> list:
+    """Funnel of the articles ingested in the window, from the per-article stage timestamps (1 hour TTL)"""
+    return get_funnel_engine().funnel(*params)
+
+@cached("analytics.stage_latency", ttl=3600)
+def fetch_stage_latency(params: tuple, generation: int = 0) -> dict:
+    """Per-stage duration summaries merged from the daily t-digests (1 hour TTL)"""
+    if get_analytics_backend() == "snapshot":
+        return summarize_stages(get_snapshot_store().stream("stage_durations", params))
+    return get_latency_store().distributions(*params)
 
 # Title
 st.title("Analytics Dashboard")
 st.markdown("""_If you are visiting the page for the first time, it make take some time to load all metrics..._""")
+if get_analytics_backend() == "snapshot":
+    try:
+        snapshot = get_snapshot_store()
+    except SnapshotUnavailableError as e:
+        st.warning(str(e))
+    else:
+        refreshed_at = snapshot.refreshed_at
+        note = f"Snapshot as of {datetime.fromtimestamp(refreshed_at):%Y-%m-%d %H:%M}" if refreshed_at else "Snapshot"
+        if snapshot.last_error:
+            note += f" (refresh failed: {snapshot.last_error})"
+        st.caption(f"{note}. Upload statuses are re-read for the current and previous month only; later changes to older uploads are not reflected.")
 st.markdown("---")
 
 # Sidebar - Time range selector
@@ -77,124 +126,88 @@ with st.sidebar:
     st.header("Filters")
     time_period = st.selectbox(
         "Time Period",
-        ["Last 7 days", "Last 30 days", "Last 90 days", "Last 6 months", "Last 12 months", "All-time"],
+        PERIODS,
         index=1
     )
     start_date, end_date = get_date_range(time_period)
     st.text(f"Range: {start_date.date()} to {end_date.date()}")
 
-# SECTION 1: Key Performance Indicators
-st.header("Key Metrics")
-col1, col2, col3, col4, col5 = st.columns(5)
-
-# Query: Total videos generated
-query_generated = f"""
-SELECT COUNT(*) as total_generated 
-FROM video_generations 
-WHERE status = 'completed' 
-AND created_at >= '{start_date.date()}'::date
-AND created_at < '{end_date.date()}'::date + interval '1 day';
-"""
+window = (start_date.date(), end_date.date())
 
-# Query: Total videos uploaded
-query_uploaded = f"""
-SELECT COUNT(DISTINCT video_generation_id) as total_uploaded 
-FROM video_uploads 
-WHERE upload_status = 'completed'
-AND created_at >= '{start_date.date()}'::date
-AND created_at < '{end_date.date()}'::date + interval '1 day';
-"""
 
-# Query: Videos awaiting review
-query_pending = f"""
-SELECT COUNT(*) as pending_review 
-FROM video_generations 
-WHERE reviewed_at IS NULL
-AND review_status IS NULL
-AND created_at >= '{start_date.date()}'::date
-AND created_at < '{end_date.date()}'::date + interval '1 day';
-"""
+def metric(name: str) -> tuple:
+    """Dispatcher arguments for a registered metric over the selected window"""
+    return (name, window, query_generation(name))
 
-# Query: Approval rate
-query_approval = f"""
-SELECT 
-  COUNT(CASE WHEN review_status = 'approved' THEN 1 END)::float / 
-  NULLIF(COUNT(CASE WHEN review_status IS NOT NULL THEN 1 END), 0) * 100 as approval_rate
-FROM video_generations 
-WHERE created_at >= '{start_date.date()}'::date
-AND created_at < '{end_date.date()}'::date + interval '1 day';
-"""
 
-# Query: Overall pipeline conversion (uploaded / ingested)
-query_upload_rate = f"""
-WITH stats AS (
-  SELECT 
-    (SELECT COUNT(DISTINCT video_generation_id) FROM video_uploads WHERE upload_status = 'completed' AND created_at >= '{start_date.date()}'::date AND created_at < '{end_date.date()}'::date + interval '1 day') as uploaded_count,
-    (SELECT COUNT(*) FROM news WHERE created_at >= '{start_date.date()}'::date AND created_at < '{end_date.date()}'::date + interval '1 day') as ingested_count
-)
-SELECT ROUND(100.0 * uploaded_count / NULLIF(ingested_count, 0), 1) as pipeline_conversion_rate
-FROM stats;
-"""
+# Dispatcher section -> (queries, fetch function)
+section_queries = {
+    "kpis": ({"kpis": metric("kpis")}, None),
+    "timeline": ({"timeline": metric("timeline")}, fetch_metric_frame),
+    "funnel": ({"funnel": (window, query_generation("funnel"))}, fetch_funnel),
+    "processing": ({"processing": metric("processing_time"), "turnaround": metric("turnaround_time")}, None),
+    "stage_latency": ({"stages": (window, query_generation("stage_durations"))}, fetch_stage_latency),
+    "channels": ({"channels": metric("channels")}, fetch_metric_frame),
+    "upload_errors": ({"failures": (window, query_generation("upload_failures"))}, fetch_upload_failures),
+    "categories": ({"categories": metric("categories")}, fetch_metric_frame),
+    "sources": ({"sources": metric("sources")}, fetch_metric_frame),
+}
+
+# Page sections below the KPIs: key -> (dispatcher sections, shown by default)
+page_sections = {
+    "timeline": (("timeline",), True),
+    "funnel": (("funnel", "processing", "stage_latency"), True),
+    "channels": (("channels", "upload_errors"), False),
+    "content": (("categories", "sources"), False),
+}
+
+
+def is_shown(key: str) -> bool:
+    return st.session_state.get(f"show_{key}", page_sections[key][1])
+
+
+# KPIs are queued first so nothing waits ahead of them; shown sections are
+# prefetched concurrently, hidden ones only query once they are switched on
+dispatcher = QueryDispatcher(fetch_metric_data)
+for section in ("kpis",) + tuple(s for key in page_sections if is_shown(key) for s in page_sections[key][0]):
+    queries, fetch = section_queries[section]
+    dispatcher.submit(section, queries, fetch=fetch)
+
+
+def render_kpis(results):
+    kpis = KpiSummary.from_row(results["kpis"][0] if results["kpis"] else None)
+
+    col1, col2, col3, col4, col5 = st.columns(5)
 
-# Execute queries
-try:
-    data_generated = fetch_metric_data(query_generated)
-    data_uploaded = fetch_metric_data(query_uploaded)
-    data_pending = fetch_metric_data(query_pending)
-    data_approval = fetch_metric_data(query_approval)
-    data_upload_rate = fetch_metric_data(query_upload_rate)
-    
     with col1:
-        generated = data_generated[0]['total_generated'] if data_generated else 0
-        st.metric("Generated", generated)
+        st.metric("Generated", kpis.total_generated)
     
     with col2:
-        uploaded = data_uploaded[0]['total_uploaded'] if data_uploaded else 0
-        st.metric("Uploaded", uploaded)
+        st.metric("Uploaded", kpis.total_uploaded)
     
     with col3:
-        pending = data_pending[0]['pending_review'] if data_pending else 0
-        st.metric("Pending Review", pending)
+        st.metric("Pending Review", kpis.pending_review)
     
     with col4:
-        approval = data_approval[0]['approval_rate'] if data_approval and data_approval[0]['approval_rate'] else 0
+        approval = kpis.approval_rate
         st.metric("Approval Rate", f"{approval:.1f}%" if approval else "0%")
     
     with col5:
-        conversion_rate = data_upload_rate[0]['pipeline_conversion_rate'] if data_upload_rate and data_upload_rate[0]['pipeline_conversion_rate'] else 0
+        conversion_rate = kpis.pipeline_conversion_rate
         st.metric("Pipeline Conversion", f"{conversion_rate:.1f}%" if conversion_rate else "0%")
-except Exception as e:
-    st.warning(f"Error loading KPI metrics: {e}")
 
-st.markdown("---")
 
-# SECTION 2: Upload Timeline
-st.header("Upload Timeline")
-
-query_timeline = f"""
-SELECT 
-  DATE(created_at)::text as upload_date,
-  COUNT(DISTINCT video_generation_id) as videos_uploaded
-FROM video_uploads 
-WHERE upload_status = 'completed'
-AND created_at >= '{start_date.date()}'::date
-AND created_at < '{end_date.date()}'::date + interval '1 day'
-GROUP BY DATE(created_at)
-ORDER BY upload_date;
-"""
+def render_timeline(results):
+    df = results["timeline"]
+    if len(df) > 0:
+        df = df.assign(upload_date=pd.to_datetime(df['upload_date']))
+        timeline_granularity = st.session_state.get("timeline_granularity", "Daily")
+        df = aggregate_series(df, 'upload_date', 'videos_uploaded', timeline_granularity)
 
-try:
-    timeline_data = fetch_metric_data(query_timeline)
-    if timeline_data and len(timeline_data) > 0:
-        df = pd.DataFrame(timeline_data)
-        df['upload_date'] = pd.to_datetime(df['upload_date'])
-        df = df.sort_values('upload_date')
-        
-        fig = px.area(df, x='upload_date', y='videos_uploaded',
-                     title="Daily Video Uploads",
-                     labels={'upload_date': 'Date', 'videos_uploaded': 'Videos Uploaded'},
-                     color_discrete_sequence=['#9D4EDD'])
-        fig.update_traces(fillcolor='rgba(157, 78, 221, 0.3)', line=dict(color='#9D4EDD', width=3))
+        # Downsampled to the chart width and drawn with WebGL for long histories
+        fig = area_chart(df, 'upload_date', 'videos_uploaded',
+                         title=f"{timeline_granularity} Video Uploads",
+                         labels={'upload_date': 'Date', 'videos_uploaded': 'Videos Uploaded'})
         fig.update_layout(
             hovermode='x unified',
             height=400,
@@ -206,165 +219,117 @@ try:
         st.plotly_chart(fig, width='stretch')
     else:
         st.info("No upload data available for selected period")
-except Exception as e:
-    st.warning(f"Error loading timeline: {e}")
 
-st.markdown("---")
 
-# SECTION 3: Pipeline Funnel
-st.header("Pipeline Funnel")
-col_funnel1, col_funnel2 = st.columns(2)
-
-with col_funnel1:
-    query_funnel = f"""
-    WITH funnel_data AS (
-      SELECT 1 as stage_order, 'Ingested' as stage, COUNT(DISTINCT id) as count
-      FROM news
-      WHERE created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-      UNION ALL
-      SELECT 2, 'Summarized', COUNT(DISTINCT article_id)
-      FROM article_summaries
-      WHERE created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-      UNION ALL
-      SELECT 3, 'Audio Generated', COUNT(DISTINCT article_id)
-      FROM audio_transcripts
-      WHERE created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-      UNION ALL
-      SELECT 4, 'Video Generated', COUNT(DISTINCT id)
-      FROM video_generations
-      WHERE status = 'completed'
-      AND created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-      UNION ALL
-      SELECT 5, 'Approved', COUNT(DISTINCT id)
-      FROM video_generations
-      WHERE review_status = 'approved'
-      AND created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-      UNION ALL
-      SELECT 6, 'Uploaded', COUNT(DISTINCT video_generation_id)
-      FROM video_uploads
-      WHERE upload_status = 'completed'
-      AND created_at >= '{start_date.date()}'::date
-      AND created_at < '{end_date.date()}'::date + interval '1 day'
-    )
-    SELECT stage, count FROM funnel_data ORDER BY stage_order;
-    """
-    
-    try:
-        funnel_data = fetch_metric_data(query_funnel)
-        if funnel_data and len(funnel_data) > 0:
-            df_funnel = pd.DataFrame(funnel_data)
-            # Sort by stage_order to get correct sequence
-            df_funnel = df_funnel.sort_values('stage', key=lambda x: x.map({'Ingested': 1, 'Summarized': 2, 'Audio Generated': 3, 'Video Generated': 4, 'Approved': 5, 'Uploaded': 6}))
-            
-            fig = go.Figure(go.Funnel(
-                y = df_funnel['stage'],
-                x = df_funnel['count'],
-                textposition = "inside",
-                textinfo = "value+percent initial",
-                marker=dict(
-                    color=df_funnel['count'],
-                    colorscale='Purples',
-                    line=dict(color='rgba(157, 78, 221, 0.8)', width=1)
-                )
-            ))
-            fig.update_layout(
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
+def render_funnel(results):
+    funnel_data = results["funnel"]
+    if funnel_data and funnel_data[0]["count"]:
+        # Rows come in pipeline order
+        df_funnel = pd.DataFrame(funnel_data)
+
+        fig = go.Figure(go.Funnel(
+            y = df_funnel['stage'],
+            x = df_funnel['count'],
+            textposition = "inside",
+            textinfo = "value+percent initial",
+            marker=dict(
+                color=df_funnel['count'],
+                colorscale='Purples',
+                line=dict(color='rgba(157, 78, 221, 0.8)', width=1)
             )
-            st.plotly_chart(fig, width='stretch')
-        else:
-            st.info("No pipeline data available")
-    except Exception as e:
-        st.warning(f"Error loading funnel: {e}")
-
-with col_funnel2:
-    st.subheader("Processing Time Analysis")
+        ))
+        fig.update_layout(
+            height=400,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig, width='stretch')
+
+        st.dataframe(
+            df_funnel[["stage", "drop_off", "step_conversion", "avg_hours"]].iloc[1:].rename(columns={
+                "stage": "Stage", "drop_off": "Drop-off", "step_conversion": "From Previous",
+                "avg_hours": "Avg Time From Previous",
+            }),
+            hide_index=True,
+            width='stretch',
+            column_config={
+                "From Previous": st.column_config.NumberColumn(format="%.1f%%"),
+                "Avg Time From Previous": st.column_config.NumberColumn(format="%.2fh"),
+            },
+        )
+    else:
+        st.info("No pipeline data available")
+
+
+def render_processing(results):
+    processing_data = results["processing"]
+    turnaround_data = results["turnaround"]
     
-    # Query 1: Automated processing time (news to video completion, before review)
-    query_processing_time = f"""
-    SELECT 
-      ROUND(AVG(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as avg_hours,
-      ROUND(MIN(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as min_hours,
-      ROUND(MAX(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as max_hours
-    FROM video_generations vg
-    JOIN news n ON vg.article_id = n.id
-    WHERE vg.status = 'completed'
-    AND vg.completed_at IS NOT NULL
-    AND vg.created_at >= '{start_date.date()}'::date
-    AND vg.created_at < '{end_date.date()}'::date + interval '1 day';
-    """
+    if processing_data and processing_data[0]['avg_hours']:
+        avg_proc = processing_data[0]['avg_hours']
+        min_proc = processing_data[0]['min_hours']
+        max_proc = processing_data[0]['max_hours']
+        
+        st.metric("Processing Time (Excl. Review)", f"{avg_proc:.1f}h")
+        st.caption(f"News → Video Completion | Range: {min_proc:.1f}h - {max_proc:.1f}h")
     
-    # Query 2: Total turnaround including review (news to upload)
-    query_turnaround_time = f"""
-    SELECT 
-      ROUND(AVG(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as avg_hours,
-      ROUND(MIN(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as min_hours,
-      ROUND(MAX(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as max_hours
-    FROM video_generations vg
-    JOIN news n ON vg.article_id = n.id
-    JOIN video_uploads vu ON vg.id = vu.video_generation_id
-    WHERE vu.upload_status = 'completed'
-    AND vu.created_at >= '{start_date.date()}'::date
-    AND vu.created_at < '{end_date.date()}'::date + interval '1 day';
-    """
+    st.markdown("")
     
-    try:
-        processing_data = fetch_metric_data(query_processing_time)
-        turnaround_data = fetch_metric_data(query_turnaround_time)
-        
-        if processing_data and processing_data[0]['avg_hours']:
-            avg_proc = processing_data[0]['avg_hours']
-            min_proc = processing_data[0]['min_hours']
-            max_proc = processing_data[0]['max_hours']
-            
-            st.metric("Processing Time (Excl. Review)", f"{avg_proc:.1f}h")
-            st.caption(f"News → Video Completion | Range: {min_proc:.1f}h - {max_proc:.1f}h")
+    if turnaround_data and turnaround_data[0]['avg_hours']:
+        avg_turn = turnaround_data[0]['avg_hours']
+        min_turn = turnaround_data[0]['min_hours']
+        max_turn = turnaround_data[0]['max_hours']
         
-        st.markdown("")
-        
-        if turnaround_data and turnaround_data[0]['avg_hours']:
-            avg_turn = turnaround_data[0]['avg_hours']
-            min_turn = turnaround_data[0]['min_hours']
-            max_turn = turnaround_data[0]['max_hours']
-            
-            st.metric("Total Turnaround (Incl. Review)", f"{avg_turn:.1f}h")
-            st.caption(f"News → Upload | Range: {min_turn:.1f}h - {max_turn:.1f}h")
-        
-        if not processing_data and not turnaround_data:
-            st.info("No processing time data available")
-    except Exception as e:
-        st.warning(f"Error loading processing time: {e}")
+        st.metric("Total Turnaround (Incl. Review)", f"{avg_turn:.1f}h")
+        st.caption(f"News → Upload | Range: {min_turn:.1f}h - {max_turn:.1f}h")
+    
+    if not processing_data and not turnaround_data:
+        st.info("No processing time data available")
+
+
+def render_stage_latency(results):
+    stages = [(label, results["stages"][stage]) for stage, label in STAGES]
+    stages = [(label, stats) for label, stats in stages if stats["n"]]
+    if not stages:
+        st.info("No processing time data available")
+        return
+
+    col_box, col_pct = st.columns([2, 1])
+
+    with col_box:
+        fig = go.Figure()
+        for label, stats in stages:
+            fig.add_trace(go.Box(
+                name=label,
+                q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+                lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]],
+                mean=[stats["mean"]],
+                marker_color='#9D4EDD',
+            ))
+        fig.update_layout(
+            title="Stage Durations (hours)",
+            showlegend=False,
+            height=400,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            yaxis=dict(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)')
+        )
+        st.plotly_chart(fig, width='stretch')
 
-st.markdown("---")
+    with col_pct:
+        df_pct = pd.DataFrame([
+            {"Stage": label, "p50": stats["median"], "p90": stats["p90"], "p99": stats["p99"], "Videos": stats["n"]}
+            for label, stats in stages
+        ])
+        st.dataframe(
+            df_pct, hide_index=True, width='stretch',
+            column_config={col: st.column_config.NumberColumn(format="%.2fh") for col in ("p50", "p90", "p99")},
+        )
 
-# SECTION 4: Channel Performance
-st.header("Channel Metrics")
-
-query_channels = f"""
-SELECT 
-  c.name as channel_name,
-  COUNT(*) as total_uploads,
-  SUM(CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END) as successful,
-  ROUND(100.0 * SUM(CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END) / NULLIF(COUNT(*), 0), 1) as success_rate,
-  u.platform
-FROM video_uploads u
-LEFT JOIN channels c ON u.channel_id = c.id
-WHERE u.created_at >= '{start_date.date()}'::date
-AND u.created_at < '{end_date.date()}'::date + interval '1 day'
-GROUP BY c.name, u.platform
-ORDER BY total_uploads DESC;
-"""
 
-try:
-    channel_data = fetch_metric_data(query_channels)
-    if channel_data and len(channel_data) > 0:
-        df_channels = pd.DataFrame(channel_data)
+def render_channels(results):
+    df_channels = results["channels"]
+    if len(df_channels) > 0:
         
         col_ch1, col_ch2 = st.columns(2)
         
@@ -401,74 +366,162 @@ try:
             st.plotly_chart(fig_success, width='stretch')
     else:
         st.info("No channel data available")
-except Exception as e:
-    st.warning(f"Error loading channel data: {e}")
 
+
+def render_categories(results):
+    df_categories = results["categories"]
+    if len(df_categories) > 0:
+        fig = px.pie(df_categories, values='count', names='category',
+                    title="Content by Category")
+        fig.update_layout(height=400)
+        st.plotly_chart(fig, width='stretch')
+    else:
+        st.info("No category data available")
+
+
+def render_sources(results):
+    df_sources = results["sources"]
+    if len(df_sources) > 0:
+        df_sources = df_sources.sort_values('count', ascending=True)
+        fig = px.bar(df_sources, y='source_name', x='count',
+                    orientation='h',
+                    title="Top 10 News Sources",
+                    labels={'source_name': 'Source', 'count': 'Articles'},
+                    color='count',
+                    color_continuous_scale='Viridis')
+        fig.update_layout(
+            height=400,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            xaxis=dict(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)'),
+            coloraxis_colorbar=dict(title="Count")
+        )
+        st.plotly_chart(fig, width='stretch')
+    else:
+        st.info("No source data available")
+
+
+def render_upload_errors(results):
+    failures = results["failures"]
+    st.subheader("Upload Errors")
+    if not failures["total"]:
+        st.info("No failed uploads in selected period")
+        return
+    st.caption(f"{failures['total']} failed uploads")
+    df_errors = pd.DataFrame(failures["top_errors"]).rename(
+        columns={"error_message": "Error", "channel_name": "Channel", "count": "Failures"}
+    )
+    st.dataframe(df_errors[["Error", "Channel", "Failures"]], hide_index=True, width='stretch')
+
+
+renderers = {
+    "kpis": (render_kpis, "KPI metrics"),
+    "timeline": (render_timeline, "timeline"),
+    "funnel": (render_funnel, "funnel"),
+    "processing": (render_processing, "processing time"),
+    "stage_latency": (render_stage_latency, "processing time distribution"),
+    "channels": (render_channels, "channel data"),
+    "upload_errors": (render_upload_errors, "upload errors"),
+    "categories": (render_categories, "categories"),
+    "sources": (render_sources, "sources"),
+}
+
+
+def render_section(section: str) -> None:
+    """Show a loading placeholder, wait for the section's queries and render them in its place"""
+    placeholder = st.empty()
+    placeholder.caption("Loading...")
+    if section not in dispatcher:
+        queries, fetch = section_queries[section]
+        dispatcher.submit(section, queries, fetch=fetch)
+    results, error = dispatcher.result(section)
+    render, label = renderers[section]
+    with placeholder.container():
+        if isinstance(error, psycopg2.Error):
+            st.error(f"Database query failed: {error}")
+            return
+        try:
+            if error:
+                raise error
+            render(results)
+        except Exception as e:
+            st.warning(f"Error loading {label}: {e}")
+
+
+def section_toggle(key: str) -> bool:
+    """Switch that loads a section; flipping it only reruns that section's fragment"""
+    return st.toggle("Show", value=page_sections[key][1], key=f"show_{key}")
+
+
+# Each section below the KPIs is a fragment: it loads on its own and its
+# widgets rerun only that section, not every query on the page
+
+# SECTION 1: Key Performance Indicators
+st.header("Key Metrics")
+render_section("kpis")
+st.markdown("---")
+
+
+# SECTION 2: Upload Timeline
+@st.fragment
+def timeline_section():
+    st.header("Upload Timeline")
+    if section_toggle("timeline"):
+        st.radio("Granularity", list(GRANULARITIES), horizontal=True, label_visibility="collapsed", key="timeline_granularity")
+        render_section("timeline")
+
+
+timeline_section()
+st.markdown("---")
+
+
+# SECTION 3: Pipeline Funnel
+@st.fragment
+def funnel_section():
+    st.header("Pipeline Funnel")
+    if not section_toggle("funnel"):
+        return
+    col_funnel1, col_funnel2 = st.columns(2)
+    with col_funnel1:
+        render_section("funnel")
+    with col_funnel2:
+        st.subheader("Processing Time Analysis")
+        render_section("processing")
+    st.subheader("Processing Time Distribution")
+    render_section("stage_latency")
+
+
+funnel_section()
 st.markdown("---")
 
-# SECTION 5: Content Breakdown
-st.header("Content Analysis")
-
-col_content1, col_content2 = st.columns(2)
-
-with col_content1:
-    query_categories = f"""
-    SELECT category, COUNT(*) as count
-    FROM news
-    WHERE created_at >= '{start_date.date()}'::date
-    AND created_at < '{end_date.date()}'::date + interval '1 day'
-    GROUP BY category
-    ORDER BY count DESC;
-    """
-    
-    try:
-        category_data = fetch_metric_data(query_categories)
-        if category_data and len(category_data) > 0:
-            df_categories = pd.DataFrame(category_data)
-            fig = px.pie(df_categories, values='count', names='category',
-                        title="Content by Category")
-            fig.update_layout(height=400)
-            st.plotly_chart(fig, width='stretch')
-        else:
-            st.info("No category data available")
-    except Exception as e:
-        st.warning(f"Error loading categories: {e}")
-
-with col_content2:
-    query_sources = f"""
-    SELECT source_name, COUNT(*) as count
-    FROM news
-    WHERE created_at >= '{start_date.date()}'::date
-    AND created_at < '{end_date.date()}'::date + interval '1 day'
-    GROUP BY source_name
-    ORDER BY count DESC
-    LIMIT 10;
-    """
-    
-    try:
-        source_data = fetch_metric_data(query_sources)
-        if source_data and len(source_data) > 0:
-            df_sources = pd.DataFrame(source_data)
-            df_sources = df_sources.sort_values('count', ascending=True)
-            fig = px.bar(df_sources, y='source_name', x='count',
-                        orientation='h',
-                        title="Top 10 News Sources",
-                        labels={'source_name': 'Source', 'count': 'Articles'},
-                        color='count',
-                        color_continuous_scale='Viridis')
-            fig.update_layout(
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                xaxis=dict(showgrid=True, gridwidth=1, gridcolor='rgba(128,128,128,0.2)'),
-                coloraxis_colorbar=dict(title="Count")
-            )
-            st.plotly_chart(fig, width='stretch')
-        else:
-            st.info("No source data available")
-    except Exception as e:
-        st.warning(f"Error loading sources: {e}")
 
+# SECTION 4: Channel Performance
+@st.fragment
+def channels_section():
+    st.header("Channel Metrics")
+    if section_toggle("channels"):
+        render_section("channels")
+        render_section("upload_errors")
+
+
+channels_section()
+st.markdown("---")
+
+
+# SECTION 5: Content Breakdown
+@st.fragment
+def content_section():
+    st.header("Content Analysis")
+    if not section_toggle("content"):
+        return
+    col_content1, col_content2 = st.columns(2)
+    with col_content1:
+        render_section("categories")
+    with col_content2:
+        render_section("sources")
+
+
+content_section()
 st.markdown("---")
 
 # Footer
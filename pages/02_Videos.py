@@ -6,16 +6,17 @@ from __future__ import annotations
 
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List
+from concurrent.futures import as_completed
+from datetime import datetime
 
 import streamlit as st
-import yt_dlp
 from dotenv import dotenv_values
 
 # Import config loader for Streamlit secrets + .env support
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config_loader import get_channel_links
+from config_loader import get_channel_links, get_config_value
+from thumbnail_cache import data_uri, get_thumbnail_cache
+from video_catalog import get_video_catalog
 
 st.set_page_config(
     page_title="Videos",
@@ -40,82 +41,97 @@ st.markdown("""_If you are visiting the page for the first time, it make take so
 st.markdown("---")
 
 
-@st.cache_data(ttl=3600)
-def _fetch_shorts(channel_url: str, max_entries: int = 20) -> List[Dict[str, str]]:
-    shorts_url = channel_url.rstrip("/") + "/shorts"
+channels = get_channel_links()
 
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "extract_flat": True,
-        "nocheckcertificate": True,
-    }
+if not channels:
+    st.warning("No *_CHANNEL entries found in .env or environment variables.")
+    st.stop()
+
+max_videos = st.slider("Videos per channel", min_value=3, max_value=12, value=3, step=1)
+embed_all = st.toggle("Load all players", value=False, help="Embed every video up front instead of thumbnails that load a player when clicked")
 
-    videos: List[Dict[str, str]] = []
+# Thumbnail grid: tiles per page of a channel, columns per row
+page_size = int(get_config_value("VIDEOS_PAGE_SIZE", 6))
+GRID_COLUMNS = 3
+thumbnail_cache = get_thumbnail_cache()
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(shorts_url, download=False)
-        entries = [e for e in info.get("entries", []) if e]
 
-        for entry in entries[:max_entries]:
-            video_id = entry.get("id")
-            if video_id:
-                videos.append(
-                    {
-                        "id": video_id,
-                        "title": entry.get("title") or "Untitled",
-                        "url": f"https://www.youtube.com/watch?v={video_id}",
-                        "thumbnail": entry.get("thumbnail") or "",
-                    }
-                )
+def thumbnail_url(video: dict) -> str:
+    return video["thumbnail"] or f"https://i.ytimg.com/vi/{video['id']}/hqdefault.jpg"
 
-    return videos
 
+def set_state(key: str, value) -> None:
+    st.session_state[key] = value
 
-channels = get_channel_links()
 
-if not channels:
-    st.warning("No *_CHANNEL entries found in .env or environment variables.")
-    st.stop()
+@st.fragment
+def channel_grid(url: str, videos: list) -> None:
+    """
+    One page of a channel's Shorts as thumbnail tiles
 
-max_videos = st.slider("Videos per channel", min_value=3, max_value=12, value=3, step=1)
+    A tile mounts its YouTube player only when clicked (one per channel), and
+    clicking or paging reruns just this channel. Thumbnails are served from
+    the local thumbnail cache, falling back to the remote image.
+    """
+    pages = -(-len(videos) // page_size)
+    page_key, playing_key = f"grid_page_{url}", f"grid_playing_{url}"
+    page = min(st.session_state.get(page_key, 0), pages - 1)
+    shown = videos[page * page_size:(page + 1) * page_size]
+    thumbnails = thumbnail_cache.get_many((v["id"], thumbnail_url(v)) for v in shown) if thumbnail_cache else {}
 
-# Fetch all channels in parallel and display as they complete
+    cols = st.columns(min(len(shown), GRID_COLUMNS))
+    for idx, video in enumerate(shown):
+        with cols[idx % len(cols)]:
+            if st.session_state.get(playing_key) == video["id"]:
+                st.video(video["url"], autoplay=True)
+            else:
+                image = thumbnails.get(video["id"])
+                st.image(data_uri(image) if image else thumbnail_url(video), width="stretch")
+                st.button("▶ Play", key=f"play_{url}_{video['id']}", on_click=set_state, args=(playing_key, video["id"]))
+            st.markdown(f"**{video['title']}**")
+
+    if pages > 1:
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        col_prev.button("◀ Previous", key=f"prev_{url}", disabled=page == 0, on_click=set_state, args=(page_key, page - 1))
+        col_page.caption(f"Page {page + 1} of {pages}")
+        col_next.button("Next ▶", key=f"next_{url}", disabled=page >= pages - 1, on_click=set_state, args=(page_key, page + 1))
+
+
+# Request every channel up front and display them as they complete; fetches
+# from YouTube are capped, rate limited and time-bounded by the fetch scheduler
 progress_placeholder = st.empty()
 completed = 0
 total_channels = len(channels)
 
-def fetch_channel_videos(name, url):
-    try:
-        videos = _fetch_shorts(url, max_entries=max_videos)
-        return name, url, videos, None
-    except Exception as e:
-        return name, url, [], str(e)
-
-with ThreadPoolExecutor(max_workers=len(channels)) as executor:
-    futures = {
-        executor.submit(fetch_channel_videos, name, url): name 
-        for name, url in channels.items()
-    }
+catalog = get_video_catalog()
+futures = {catalog.request(url, max_videos): (name, url) for name, url in channels.items()}
+
+for future in as_completed(futures):
+    name, url = futures[future]
+    error = future.exception()
+    videos = [] if error else future.result()
+    completed += 1
+    
+    progress_placeholder.info(f"Loading... {completed}/{total_channels} channels loaded")
     
-    for future in as_completed(futures):
-        name, url, videos, error = future.result()
-        completed += 1
-        
-        progress_placeholder.info(f"Loading... {completed}/{total_channels} channels loaded")
-        
-        st.markdown(f"### [{name}]({url})")
-
-        if error:
-            st.warning(f"Could not load videos for {name}: {error}")
-            st.markdown("---")
-            continue
-
-        if not videos:
-            st.info("No Shorts found for this channel.")
-            st.markdown("---")
-            continue
+    st.markdown(f"### [{name}]({url})")
 
+    if error:
+        st.warning(f"Could not load videos for {name}: {error}")
+        st.markdown("---")
+        continue
+
+    status = catalog.status(url)
+    if status["error"] and status["refreshed_at"]:
+        refreshed = datetime.fromtimestamp(status["refreshed_at"]).strftime("%Y-%m-%d %H:%M")
+        st.caption(f"Could not refresh this channel ({status['error']}); showing videos as of {refreshed}.")
+
+    if not videos:
+        st.info("No Shorts found for this channel.")
+        st.markdown("---")
+        continue
+
+    if embed_all:
         # Use fewer columns for portrait videos (2 or 3 instead of 4)
         num_cols = min(len(videos), 3)
         cols = st.columns(num_cols)
@@ -124,7 +140,9 @@ with ThreadPoolExecutor(max_workers=len(channels)) as executor:
             with col:
                 st.video(video["url"])
                 st.markdown(f"**{video['title']}**")
+    else:
+        channel_grid(url, videos)
 
-        st.markdown("---")
+    st.markdown("---")
 
 progress_placeholder.empty()
@@ -0,0 +1,289 @@
+"""
+Partition cache - Day-partitioned results for the windowed Analytics breakdowns
+
+Results of the timeline, channel, category and source metrics are stored per
+calendar day. A request for a window only queries the days that are not
+cached yet (in as few contiguous ranges as possible) and merges the day
+partitions into the metric's usual columns, so widening "Last 30 days" to
+"Last 90 days" fetches just the 60 missing days. A day is closed, and never
+re-queried, once it has been fetched at least PARTITION_CACHE_SYNC_LAG_HOURS
+after its midnight (the cloud DB receives rows late); until then its partition
+expires after a short TTL like today's.
+
+Partitions are kept as DataFrame chunks fetched through the columnar path, so
+no per-row dicts are built on the way. Chunks of adjacent ranges are merged, so
+a day query holds one chunk per contiguous run of cached days. Their memory is
+charged to the result caches' shared budget (CACHE_MAX_MB), which may evict a
+day query's partitions like any other cached result.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from columnar import fetch_frame
+from config_loader import get_config_value
+from db_pool import get_pool
+from query_registry import query_generation
+from result_cache import estimate_size, get_memory_budget
+
+
+def _merge_timeline(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values("day")
+    return pd.DataFrame({"upload_date": df["day"].to_numpy(), "videos_uploaded": df["videos_uploaded"].to_numpy()})
+
+
+def _merge_counts(column: str, limit: Optional[int] = None) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    def merge(df: pd.DataFrame) -> pd.DataFrame:
+        merged = (
+            df.groupby(column, dropna=False, sort=False)["count"].sum()
+            .sort_values(ascending=False, kind="stable")
+            .reset_index()
+        )
+        return merged.head(limit) if limit else merged
+
+    return merge
+
+
+def _merge_channels(df: pd.DataFrame) -> pd.DataFrame:
+    merged = (
+        df.groupby(["channel_name", "platform"], dropna=False, sort=False)[["total_uploads", "successful"]].sum()
+        .reset_index()
+    )
+    total = merged["total_uploads"].astype("float64")
+    merged["success_rate"] = (100.0 * merged["successful"] / total.where(total > 0)).round(1)
+    merged = merged.sort_values("total_uploads", ascending=False, kind="stable").reset_index(drop=True)
+    return merged[["channel_name", "total_uploads", "successful", "success_rate", "platform"]]
+
+
+# metric name -> (day-grouped registry query, merge function)
+PARTITIONED_METRICS: Dict[str, Tuple[str, Callable[[pd.DataFrame], pd.DataFrame]]] = {
+    "timeline": ("timeline_by_day", _merge_timeline),
+    "channels": ("channels_by_day", _merge_channels),
+    "categories": ("categories_by_day", _merge_counts("category")),
+    "sources": ("sources_by_day", _merge_counts("source_name", limit=10)),
+}
+
+
+def day_runs(days: Sequence[date]) -> List[Tuple[date, date]]:
+    """Collapse sorted days into (first, last) contiguous ranges"""
+    runs: List[Tuple[date, date]] = []
+    for day in days:
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+class _Partitions:
+    """Fetched DataFrame chunks of one day query, plus when each day was fetched"""
+
+    def __init__(self, key: Tuple[str, int]):
+        self.key = key
+        self.fetched_at: Dict[date, float] = {}  # wall-clock (epoch) fetch time per day
+        self.chunks: List[Tuple[date, date, pd.DataFrame]] = []  # disjoint, non-adjacent, sorted
+        self.empty: Optional[pd.DataFrame] = None  # column layout for windows without rows
+
+
+class _Charge:
+    """A day query's partitions as accounted by the memory budget"""
+
+    __slots__ = ("parts", "size")
+
+    def __init__(self, parts: _Partitions):
+        self.parts = parts
+        self.size = sum(estimate_size(chunk) for _, _, chunk in parts.chunks)
+
+
+class DayPartitionedCache:
+    """Per-day result partitions for each (day query, generation)"""
+
+    namespace = "partitions"  # Key space in the shared memory budget
+
+    def __init__(self, today_ttl: float = 300, sync_lag: float = 3 * 3600, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            today_ttl: Seconds before a partition of a day that is not closed is re-fetched
+            sync_lag: Seconds after midnight that rows of the previous day may still arrive
+            clock: Wall clock (epoch seconds); replaceable for drills
+        """
+        self.today_ttl = today_ttl
+        self.sync_lag = sync_lag
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._parts: Dict[Tuple[str, int], _Partitions] = {}
+
+    def _partitions(self, key: Tuple[str, int]) -> _Partitions:
+        """Partitions of a key, dropping those of the query's older generations"""
+        with self._lock:
+            parts = self._parts.get(key)
+            if parts is not None:
+                return parts
+            parts = self._parts[key] = _Partitions(key)
+            old = [other for other in self._parts if other[0] == key[0] and other[1] < key[1]]
+            for other in old:
+                del self._parts[other]
+        for other in old:
+            get_memory_budget().forget(self, self._budget_key(other))
+        return parts
+
+    @staticmethod
+    def _budget_key(key: Tuple[str, int]) -> str:
+        return f"{key[0]}:{key[1]}"
+
+    def _charge(self, parts: _Partitions) -> None:
+        """(Re)account a key's chunks in the memory budget, unless it was evicted meanwhile"""
+        with self._lock:
+            if self._parts.get(parts.key) is not parts:
+                return
+            charge = _Charge(parts)
+        get_memory_budget().admit(self, self._budget_key(parts.key), charge)
+
+    def _evict(self, budget_key: str, charge: _Charge) -> None:
+        """Drop a key's partitions (called by the memory budget)"""
+        with self._lock:
+            if self._parts.get(charge.parts.key) is charge.parts:
+                del self._parts[charge.parts.key]
+
+    def missing_days(self, key: Tuple[str, int], start: date, end: date) -> List[date]:
+        """Days of the window with no partition, plus expired partitions of days not closed yet"""
+        return self._missing_days(self._partitions(key), start, end)
+
+    def _closes_at(self, day: date) -> float:
+        """Epoch time after which a fetch of ``day`` holds all of its rows"""
+        return datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp() + self.sync_lag
+
+    def _missing_days(self, parts: _Partitions, start: date, end: date) -> List[date]:
+        now = self.clock()
+        with self._lock:
+            fetched_at = parts.fetched_at
+            missing = []
+            day = start
+            while day <= end:
+                stamp = fetched_at.get(day)
+                if stamp is None or (stamp < self._closes_at(day) and now - stamp > self.today_ttl):
+                    missing.append(day)
+                day += timedelta(days=1)
+        return missing
+
+    def store(self, key: Tuple[str, int], first: date, last: date, df: pd.DataFrame) -> None:
+        """Store a fetched range; days in it without rows become empty partitions"""
+        parts = self._partitions(key)
+        self._store(parts, first, last, df)
+        self._charge(parts)
+
+    def _store(self, parts: _Partitions, first: date, last: date, df: pd.DataFrame) -> None:
+        now = self.clock()
+        lo, hi = pd.Timestamp(first), pd.Timestamp(last)
+        with self._lock:
+            if parts.empty is None:
+                parts.empty = df.iloc[:0]
+            # Merge the range with the chunks it overlaps or touches, dropping
+            # their stale rows for re-fetched days (days not closed yet)
+            merged_first, merged_last, pieces, kept = first, last, [], []
+            for c_first, c_last, chunk in parts.chunks:
+                if c_first <= last + timedelta(days=1) and first <= c_last + timedelta(days=1):
+                    merged_first, merged_last = min(merged_first, c_first), max(merged_last, c_last)
+                    pieces.append(chunk[~chunk["day"].between(lo, hi)] if c_first <= last and first <= c_last else chunk)
+                else:
+                    kept.append((c_first, c_last, chunk))
+            pieces = [piece for piece in pieces + [df] if len(piece)]
+            if pieces:
+                merged = pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0]
+                kept.append((merged_first, merged_last, merged))
+            parts.chunks = sorted(kept, key=lambda c: c[0])
+            day = first
+            while day <= last:
+                parts.fetched_at[day] = now
+                day += timedelta(days=1)
+
+    def frame(self, key: Tuple[str, int], start: date, end: date) -> pd.DataFrame:
+        """All cached rows of the window as one DataFrame"""
+        return self._frame(self._partitions(key), start, end)
+
+    def _frame(self, parts: _Partitions, start: date, end: date) -> pd.DataFrame:
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        with self._lock:
+            chunks = [chunk for c_first, c_last, chunk in parts.chunks if c_first <= end and start <= c_last]
+            empty = parts.empty
+        get_memory_budget().touch(self, self._budget_key(parts.key))
+        if not chunks:
+            return empty
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        return df[df["day"].between(lo, hi)]
+
+    def get_window(
+        self,
+        name: str,
+        params: Sequence[date],
+        fetch: Callable[[str, Tuple[date, date]], pd.DataFrame],
+        generation: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Answer a partitioned metric for a window, fetching only missing days
+
+        Args:
+            name: Metric name (a key of PARTITIONED_METRICS)
+            params: (first_day, last_day) of the window, both inclusive
+            fetch: Runs a registered day-grouped query for a (first, last) range
+            generation: Metric cache generation from query_registry
+
+        Returns:
+            DataFrame with the columns of the metric's un-partitioned SQL result
+        """
+        day_query, merge = PARTITIONED_METRICS[name]
+        start, end = params
+        # Held for the whole call, so a concurrent eviction cannot drop rows it just fetched
+        parts = self._partitions((day_query, generation))
+        runs = day_runs(self._missing_days(parts, start, end))
+        for first, last in runs:
+            self._store(parts, first, last, fetch(day_query, (first, last)))
+        if runs:
+            self._charge(parts)
+        return merge(self._frame(parts, start, end))
+
+    def stats(self) -> Dict[str, int]:
+        """Cached day queries, chunks and their bytes"""
+        with self._lock:
+            chunks = [chunk for parts in self._parts.values() for _, _, chunk in parts.chunks]
+            return {"queries": len(self._parts), "chunks": len(chunks), "bytes": sum(estimate_size(c) for c in chunks)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._parts.clear()
+        get_memory_budget().forget(self)
+
+
+_cache: Optional[DayPartitionedCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_partition_cache() -> DayPartitionedCache:
+    """
+    Get the process-wide partition cache
+
+    Returns:
+        DayPartitionedCache whose open partitions live PARTITION_CACHE_TODAY_TTL
+        seconds, closing PARTITION_CACHE_SYNC_LAG_HOURS after midnight
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DayPartitionedCache(
+                today_ttl=float(get_config_value("PARTITION_CACHE_TODAY_TTL", 300)),
+                sync_lag=float(get_config_value("PARTITION_CACHE_SYNC_LAG_HOURS", 3)) * 3600,
+            )
+        return _cache
+
+
+def fetch_partitioned(name: str, params: Sequence[date]) -> pd.DataFrame:
+    """Answer a partitioned metric from the cloud DB through the partition cache"""
+
+    def fetch(day_query: str, window: Tuple[date, date]) -> pd.DataFrame:
+        with get_pool().connection() as conn:
+            return fetch_frame(conn, day_query, window)
+
+    return get_partition_cache().get_window(name, params, fetch, generation=query_generation(name))
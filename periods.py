@@ -0,0 +1,28 @@
+"""
+Periods - Time Period choices of the Analytics page and their date ranges
+
+Shared by the page and the benchmark suite so both measure the same windows.
+"""
+from datetime import datetime, timedelta
+
+PERIODS = ["Last 7 days", "Last 30 days", "Last 90 days", "Last 6 months", "Last 12 months", "All-time"]
+
+
+def get_date_range(period: str) -> tuple:
+    """Calculate date range based on period selection"""
+    end_date = datetime.now()
+    
+    if period == "Last 7 days":
+        start_date = end_date - timedelta(days=7)
+    elif period == "Last 30 days":
+        start_date = end_date - timedelta(days=30)
+    elif period == "Last 90 days":
+        start_date = end_date - timedelta(days=90)
+    elif period == "Last 6 months":
+        start_date = end_date - timedelta(days=180)
+    elif period == "Last 12 months":
+        start_date = end_date - timedelta(days=365)
+    else:  # All-time
+        start_date = datetime(2020, 1, 1)
+    
+    return start_date, end_date
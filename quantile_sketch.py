@@ -0,0 +1,130 @@
+"""
+Quantile sketch - A small, mergeable t-digest
+
+Summarizes a stream of values in a bounded number of weighted centroids
+(roughly ``compression / 2``), finer at the tails than in the middle, so p50,
+p90, p99 and box-plot statistics can be estimated from a few kilobytes.
+Digests of disjoint data (e.g. one per day) merge into a digest of the union.
+"""
+import struct
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+_HEADER = struct.Struct("<dIdddd")  # compression, centroids, count, sum, min, max
+
+
+class TDigest:
+    """Merging t-digest with the k1 (arcsine) scale function"""
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means = np.empty(0, dtype="float64")
+        self.weights = np.empty(0, dtype="float64")
+        self.count = 0.0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """Merge weighted points into the centroids and re-compress"""
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        if not len(means):
+            return
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = float(weights.sum())
+        scale = self.compression / (2 * np.pi)
+
+        def weight_limit(weight_so_far: float) -> float:
+            # Largest cumulative weight the next centroid may reach: one unit of k-space
+            k = scale * np.arcsin(min(1.0, 2 * weight_so_far / total - 1)) + 1
+            return total * (np.sin(min(k / scale, np.pi / 2)) + 1) / 2
+
+        out_means, out_weights = [], []
+        weight_so_far = 0.0
+        limit = weight_limit(0.0)
+        cur_mean, cur_weight = float(means[0]), float(weights[0])
+        for mean, weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            if weight_so_far + cur_weight + weight <= limit:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                out_means.append(cur_mean)
+                out_weights.append(cur_weight)
+                weight_so_far += cur_weight
+                limit = weight_limit(weight_so_far)
+                cur_mean, cur_weight = mean, weight
+        out_means.append(cur_mean)
+        out_weights.append(cur_weight)
+        self.means = np.asarray(out_means, dtype="float64")
+        self.weights = np.asarray(out_weights, dtype="float64")
+
+    def update(self, values: Sequence[float]) -> None:
+        """Add raw values (NaNs are ignored)"""
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._absorb(values, np.ones(len(values)))
+
+    def merge(self, other: "TDigest") -> None:
+        """Fold another digest into this one"""
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._absorb(other.means, other.weights)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-th quantile (0 <= q <= 1); None for an empty digest"""
+        if not self.count:
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        # Interpolate between centroid centers, anchored at the exact min/max
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * self.count, positions, values))
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Count, mean, min/max, percentiles and Tukey box-plot statistics"""
+        if not self.count:
+            return {"n": 0}
+        q1, median, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        iqr = q3 - q1
+        return {
+            "n": int(self.count),
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "lowerfence": max(self.min, q1 - 1.5 * iqr),
+            "upperfence": min(self.max, q3 + 1.5 * iqr),
+        }
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(self.compression, len(self.means), self.count, self.total, self.min, self.max)
+        return header + self.means.tobytes() + self.weights.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        compression, size, count, total, lo, hi = _HEADER.unpack_from(data)
+        digest = cls(compression)
+        offset = _HEADER.size
+        digest.means = np.frombuffer(data, dtype="float64", count=size, offset=offset).copy()
+        digest.weights = np.frombuffer(data, dtype="float64", count=size, offset=offset + 8 * size).copy()
+        digest.count, digest.total, digest.min, digest.max = count, total, lo, hi
+        return digest
@@ -0,0 +1,106 @@
+"""
+Query dispatch - Run dashboard queries concurrently with bounded per-DB concurrency
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from config_loader import get_config_value, get_db_config, get_db_pool_config
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _db_key(db_config: Dict[str, Any]) -> str:
+    return f"{db_config['host']}:{db_config['port']}/{db_config['database']}"
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide executor for the configured database
+
+    All sessions share one executor per database, so the number of queries in
+    flight against a DB never exceeds DB_MAX_CONCURRENT_QUERIES (defaults to the
+    connection pool size), no matter how many viewers are on the page.
+    """
+    key = _db_key(get_db_config())
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            max_workers = int(get_config_value("DB_MAX_CONCURRENT_QUERIES", get_db_pool_config()["max_size"]))
+            executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="db-query")
+            _executors[key] = executor
+        return executor
+
+
+class QueryDispatcher:
+    """
+    Submits every section's queries up front; each section then waits for its own
+
+    Usage:
+        dispatcher = QueryDispatcher(fetch_metric_data)
+        dispatcher.submit("kpis", {"kpis": ("kpis", window, generation)})
+        dispatcher.submit("funnel", {"funnel": (window, generation)}, fetch=fetch_funnel)
+        results, error = dispatcher.result("kpis")
+    """
+
+    def __init__(self, fetch: Callable[..., Any], executor: Optional[ThreadPoolExecutor] = None):
+        self.fetch = fetch
+        self.executor = executor or get_db_executor()
+        # Worker threads need the session's script context to use Streamlit APIs
+        self._ctx = get_script_run_ctx()
+        self._sections: Dict[str, Dict[str, Future]] = {}
+
+    def _run(self, fetch: Callable[..., Any], *args: Any) -> Any:
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, self._ctx)
+        try:
+            return fetch(*args)
+        finally:
+            add_script_run_ctx(thread, None)
+
+    def submit(self, section: str, queries: Dict[str, Any], fetch: Optional[Callable[..., Any]] = None) -> None:
+        """
+        Queue all queries of a section for execution
+
+        Args:
+            section: Section name the results are reported under
+            queries: Mapping of result key to the argument passed to ``fetch``
+                (a tuple is unpacked into positional arguments)
+            fetch: Fetch function for this section (defaults to the dispatcher's)
+        """
+        fetch = fetch or self.fetch
+        self._sections[section] = {
+            key: self.executor.submit(self._run, fetch, *(args if isinstance(args, tuple) else (args,)))
+            for key, args in queries.items()
+        }
+
+    def __contains__(self, section: str) -> bool:
+        return section in self._sections
+
+    @staticmethod
+    def _collect(futures: Dict[str, Future]) -> Tuple[Dict[str, Any], Optional[BaseException]]:
+        results: Dict[str, Any] = {}
+        error: Optional[BaseException] = None
+        for key, future in futures.items():
+            exc = future.exception()
+            if exc is None:
+                results[key] = future.result()
+            elif error is None:
+                error = exc
+        return results, error
+
+    def result(self, section: str) -> Tuple[Dict[str, Any], Optional[BaseException]]:
+        """
+        Wait for one section's queries and return ``(results, error)``
+
+        Lets each page section block on its own queries only, in whatever
+        order the sections are rendered. ``error`` is the first exception
+        raised by one of the section's queries, in which case ``results`` only
+        holds the queries that succeeded.
+        """
+        futures = self._sections[section]
+        wait(list(futures.values()))
+        return self._collect(futures)
@@ -0,0 +1,153 @@
+"""
+Query metrics - In-process instrumentation of cached fetches
+
+Every call through a cached fetcher (see result_cache) is recorded in a ring
+buffer with its wall time, time spent in the database, rows and bytes
+received, and how the cache answered it. The DB helpers add their share to the
+call running on the current thread, so a cache miss carries the cost of the
+queries it ran. The diagnostics page summarizes the buffer.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from config_loader import get_config_value
+
+
+@dataclass
+class CallRecord:
+    """One cached fetch call"""
+
+    started_at: float
+    namespace: str
+    metric: str
+    key: str
+    cache: str = ""  # hit, stale, disk, miss, coalesced or refresh
+    wall_ms: float = 0.0
+    db_ms: float = 0.0
+    queries: int = 0
+    rows: int = 0
+    bytes: int = 0
+    error: str = ""
+
+
+_buffer: Optional[Deque[CallRecord]] = None
+_buffer_lock = threading.Lock()
+_current = threading.local()
+
+
+def _records() -> Deque[CallRecord]:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = deque(maxlen=int(get_config_value("QUERY_METRICS_BUFFER_SIZE", 2000)))
+        return _buffer
+
+
+@contextmanager
+def track(namespace: str, metric: str, key: str) -> Iterator[CallRecord]:
+    """
+    Record one call; DB work done on this thread while it runs is added to it
+
+    Args:
+        namespace: Cached function namespace
+        metric: Metric (or channel) the call is for
+        key: Readable call arguments
+    """
+    record = CallRecord(started_at=time.time(), namespace=namespace, metric=metric, key=key)
+    previous = getattr(_current, "record", None)
+    _current.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.wall_ms = (time.perf_counter() - start) * 1000
+        _current.record = previous
+        records = _records()
+        with _buffer_lock:
+            records.append(record)
+
+
+def current() -> Optional[CallRecord]:
+    """The call being recorded on this thread, if any"""
+    return getattr(_current, "record", None)
+
+
+def record_db(elapsed: float, rows: int = 0, nbytes: int = 0, new_query: bool = True) -> None:
+    """
+    Add DB time (seconds), rows and bytes to the current call
+
+    Pass ``new_query=False`` for further fetches of an already counted query
+    (e.g. server-side cursor chunks).
+    """
+    record = current()
+    if record is not None:
+        record.db_ms += elapsed * 1000
+        record.queries += int(new_query)
+        record.rows += max(rows, 0)
+        record.bytes += nbytes
+
+
+def recent(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Recorded calls as dicts, newest first"""
+    records = _records()
+    with _buffer_lock:
+        rows = [asdict(record) for record in reversed(records)]
+    return rows[:limit] if limit else rows
+
+
+def slowest(limit: int = 20) -> List[Dict[str, Any]]:
+    """The slowest recorded calls"""
+    return sorted(recent(), key=lambda row: row["wall_ms"], reverse=True)[:limit]
+
+
+def latency_summary() -> List[Dict[str, Any]]:
+    """
+    Per (namespace, metric) call counts, latency percentiles and cache efficiency
+
+    Returns:
+        Rows with calls, errors, hit_rate, p50/p90/p99/max wall ms of calls
+        served to pages, and mean DB ms, rows and bytes of the fetches (misses
+        and background refreshes); slowest p90 first
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in recent():
+        groups.setdefault((row["namespace"], row["metric"]), []).append(row)
+
+    summary = []
+    for (namespace, metric), rows in groups.items():
+        served = [row for row in rows if row["cache"] != "refresh"]
+        fetched = [row for row in rows if row["cache"] in ("miss", "refresh") and not row["error"]]
+        wall = np.array([row["wall_ms"] for row in served] or [0.0])
+        hits = sum(row["cache"] in ("hit", "stale", "disk", "coalesced") for row in served)
+        p50, p90, p99 = np.percentile(wall, [50, 90, 99])
+        summary.append({
+            "namespace": namespace,
+            "metric": metric,
+            "calls": len(served),
+            "refreshes": len(rows) - len(served),
+            "errors": sum(bool(row["error"]) for row in rows),
+            "hit_rate": hits / len(served) if served else None,
+            "p50_ms": p50,
+            "p90_ms": p90,
+            "p99_ms": p99,
+            "max_ms": wall.max(),
+            "db_ms": np.mean([row["db_ms"] for row in fetched]) if fetched else None,
+            "rows": np.mean([row["rows"] for row in fetched]) if fetched else None,
+            "bytes": np.mean([row["bytes"] for row in fetched]) if fetched else None,
+        })
+    return sorted(summary, key=lambda row: row["p90_ms"], reverse=True)
+
+
+def reset() -> None:
+    records = _records()
+    with _buffer_lock:
+        records.clear()
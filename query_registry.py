@@ -0,0 +1,362 @@
+"""
+Query registry - Named, parameterized Analytics statements
+
+Every dashboard metric is registered once under a stable name with ``$n``
+placeholders. Statements are server-side prepared the first time they run on a
+pooled connection and executed by name afterwards, so Postgres plans each
+metric once per session and callers can cache on ``(name, params)`` instead of
+the full SQL text.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import query_metrics
+from db_pool import PooledConnection
+from disk_cache import get_disk_cache
+from kpi_engine import KPI_SQL
+
+# Every windowed metric takes the first and last day of the window (inclusive)
+WINDOW_PARAMS = ("date", "date")
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+
+@dataclass(frozen=True)
+class MetricQuery:
+    """A named, parameterized statement"""
+
+    name: str
+    sql: str
+    param_types: Tuple[str, ...] = WINDOW_PARAMS
+    description: str = ""
+
+    @property
+    def statement_name(self) -> str:
+        """Name of the server-side prepared statement"""
+        return f"autodrop_{self.name}"
+
+    def prepare_sql(self) -> str:
+        types = ", ".join(self.param_types)
+        return f"PREPARE {self.statement_name} ({types}) AS {self.sql}"
+
+    def execute_sql(self) -> str:
+        placeholders = ", ".join(["%s"] * len(self.param_types))
+        return f"EXECUTE {self.statement_name} ({placeholders})"
+
+    def as_pyformat(self, params: Sequence[Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Rewrite the statement for client-side binding (COPY, cursors, EXPLAIN)
+
+        Returns:
+            SQL with ``%(pN)s`` placeholders and the matching parameter dict
+        """
+        sql = _PLACEHOLDER.sub(
+            lambda m: f"%(p{m.group(1)})s::{self.param_types[int(m.group(1)) - 1]}",
+            self.sql.replace("%", "%%"),
+        )
+        return sql, {f"p{i}": value for i, value in enumerate(params, start=1)}
+
+
+_registry: Dict[str, MetricQuery] = {}
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def register_query(name: str, sql: str, param_types: Tuple[str, ...] = WINDOW_PARAMS, description: str = "") -> MetricQuery:
+    """
+    Register a named statement
+
+    Args:
+        name: Stable metric name, used as cache key and prepared-statement suffix
+        sql: Statement using ``$1``..``$n`` placeholders
+        param_types: Postgres types of the placeholders, in order
+        description: Short human-readable description
+
+    Returns:
+        The registered MetricQuery
+    """
+    if not re.fullmatch(r"[a-z][a-z0-9_]*", name):
+        raise ValueError(f"invalid query name: {name!r}")
+    query = MetricQuery(name, sql.strip().rstrip(";"), tuple(param_types), description)
+    _registry[name] = query
+    return query
+
+
+def get_query(name: str) -> MetricQuery:
+    try:
+        return _registry[name]
+    except KeyError:
+        raise KeyError(f"unknown metric query: {name!r}") from None
+
+
+def list_queries() -> List[MetricQuery]:
+    return list(_registry.values())
+
+
+def query_generation(name: str) -> int:
+    """
+    Current cache generation of a metric; part of every cache key
+
+    Read from the disk cache file when there is one, so disk-cached results of
+    an invalidated metric are not served again after a restart (or by another
+    process); otherwise kept in memory.
+    """
+    disk = get_disk_cache()
+    generation = disk.generation(name) if disk is not None else None
+    with _generations_lock:
+        return max(generation or 0, _generations.get(name, 0))
+
+
+def invalidate_query(name: Optional[str] = None) -> None:
+    """
+    Invalidate cached results for one metric (or all metrics when name is None)
+
+    Bumps the metric's generation so cache entries keyed on the old generation
+    are never read again, in memory or on disk.
+    """
+    names = [name] if name else list(_registry)
+    disk = get_disk_cache()
+    if disk is not None and disk.bump_generations(names):
+        # Keep in-memory fallbacks from an earlier failed write ahead too
+        with _generations_lock:
+            for query_name in names:
+                if query_name in _generations:
+                    _generations[query_name] += 1
+        return
+    current = {query_name: query_generation(query_name) for query_name in names}
+    with _generations_lock:
+        for query_name in names:
+            _generations[query_name] = current[query_name] + 1
+
+
+def run_prepared(cur, conn: PooledConnection, name: str, params: Sequence[Any]) -> None:
+    """
+    Execute a registered statement on ``cur``, preparing it on ``conn`` first if needed
+
+    Leaves the result on the cursor so callers can read ``cur.description`` and
+    fetch rows however they like.
+    """
+    query = get_query(name)
+    if query.statement_name not in conn.prepared:
+        cur.execute(query.prepare_sql())
+        conn.prepared.add(query.statement_name)
+    start = time.perf_counter()
+    cur.execute(query.execute_sql(), tuple(params))
+    query_metrics.record_db(time.perf_counter() - start, rows=cur.rowcount)
+
+
+def execute_query(conn: PooledConnection, name: str, params: Sequence[Any], cursor_factory=None) -> List[Any]:
+    """
+    Execute a registered statement, preparing it on this connection first if needed
+
+    Args:
+        conn: Pooled connection (tracks which statements it has prepared)
+        name: Registered metric name
+        params: Positional parameter values
+        cursor_factory: Optional psycopg2 cursor factory for the result rows
+
+    Returns:
+        All result rows
+    """
+    with conn.cursor(cursor_factory=cursor_factory) as cur:
+        run_prepared(cur, conn, name, params)
+        return cur.fetchall()
+
+
+# Analytics page statements. $1 is the first day of the window and $2 the last
+# day, both inclusive.
+
+register_query("kpis", KPI_SQL, description="Key Metrics row counts (see kpi_engine.KpiSummary)")
+
+register_query("timeline", """
+SELECT 
+  DATE(created_at)::text as upload_date,
+  COUNT(DISTINCT video_generation_id) as videos_uploaded
+FROM video_uploads 
+WHERE upload_status = 'completed'
+AND created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY DATE(created_at)
+ORDER BY upload_date;
+""", description="Completed uploads per day")
+
+register_query("funnel", """
+WITH funnel_data AS (
+  SELECT 1 as stage_order, 'Ingested' as stage, COUNT(DISTINCT id) as count
+  FROM news
+  WHERE created_at >= $1
+  AND created_at < $2 + interval '1 day'
+  UNION ALL
+  SELECT 2, 'Summarized', COUNT(DISTINCT article_id)
+  FROM article_summaries
+  WHERE created_at >= $1
+  AND created_at < $2 + interval '1 day'
+  UNION ALL
+  SELECT 3, 'Audio Generated', COUNT(DISTINCT article_id)
+  FROM audio_transcripts
+  WHERE created_at >= $1
+  AND created_at < $2 + interval '1 day'
+  UNION ALL
+  SELECT 4, 'Video Generated', COUNT(DISTINCT id)
+  FROM video_generations
+  WHERE status = 'completed'
+  AND created_at >= $1
+  AND created_at < $2 + interval '1 day'
+  UNION ALL
+  SELECT 5, 'Approved', COUNT(DISTINCT id)
+  FROM video_generations
+  WHERE review_status = 'approved'
+  AND created_at >= $1
+  AND created_at < $2 + interval '1 day'
+  UNION ALL
+  SELECT 6, 'Uploaded', COUNT(DISTINCT video_generation_id)
+  FROM video_uploads
+  WHERE upload_status = 'completed'
+  AND created_at >= $1
+  AND created_at < $2 + interval '1 day'
+)
+SELECT stage, count FROM funnel_data ORDER BY stage_order;
+""", description="Articles reaching each pipeline stage")
+
+register_query("processing_time", """
+SELECT 
+  ROUND(AVG(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as avg_hours,
+  ROUND(MIN(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as min_hours,
+  ROUND(MAX(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600)::numeric, 2) as max_hours
+FROM video_generations vg
+JOIN news n ON vg.article_id = n.id
+WHERE vg.status = 'completed'
+AND vg.completed_at IS NOT NULL
+AND vg.created_at >= $1
+AND vg.created_at < $2 + interval '1 day';
+""", description="News -> video completion time (hours), excluding review")
+
+register_query("turnaround_time", """
+SELECT 
+  ROUND(AVG(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as avg_hours,
+  ROUND(MIN(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as min_hours,
+  ROUND(MAX(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600)::numeric, 2) as max_hours
+FROM video_generations vg
+JOIN news n ON vg.article_id = n.id
+JOIN video_uploads vu ON vg.id = vu.video_generation_id
+WHERE vu.upload_status = 'completed'
+AND vu.created_at >= $1
+AND vu.created_at < $2 + interval '1 day';
+""", description="News -> upload time (hours), including review")
+
+register_query("channels", """
+SELECT 
+  c.name as channel_name,
+  COUNT(*) as total_uploads,
+  SUM(CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END) as successful,
+  ROUND(100.0 * SUM(CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END) / NULLIF(COUNT(*), 0), 1) as success_rate,
+  u.platform
+FROM video_uploads u
+LEFT JOIN channels c ON u.channel_id = c.id
+WHERE u.created_at >= $1
+AND u.created_at < $2 + interval '1 day'
+GROUP BY c.name, u.platform
+ORDER BY total_uploads DESC;
+""", description="Uploads and success rate per channel and platform")
+
+register_query("categories", """
+SELECT category, COUNT(*) as count
+FROM news
+WHERE created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY category
+ORDER BY count DESC;
+""", description="Articles per news category")
+
+register_query("sources", """
+SELECT source_name, COUNT(*) as count
+FROM news
+WHERE created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY source_name
+ORDER BY count DESC
+LIMIT 10;
+""", description="Top 10 news sources by article count")
+
+# Day-grouped variants of the windowed breakdowns, cached per calendar day by
+# partition_cache and merged into the shapes above.
+
+register_query("timeline_by_day", """
+SELECT 
+  created_at::date as day,
+  COUNT(DISTINCT video_generation_id) as videos_uploaded
+FROM video_uploads 
+WHERE upload_status = 'completed'
+AND created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY 1;
+""", description="Completed uploads, per day")
+
+register_query("channels_by_day", """
+SELECT 
+  u.created_at::date as day,
+  c.name as channel_name,
+  u.platform,
+  COUNT(*) as total_uploads,
+  SUM(CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END) as successful
+FROM video_uploads u
+LEFT JOIN channels c ON u.channel_id = c.id
+WHERE u.created_at >= $1
+AND u.created_at < $2 + interval '1 day'
+GROUP BY 1, c.name, u.platform;
+""", description="Uploads and successful uploads per channel and platform, per day")
+
+register_query("categories_by_day", """
+SELECT created_at::date as day, category, COUNT(*) as count
+FROM news
+WHERE created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY 1, category;
+""", description="Articles per news category, per day")
+
+register_query("sources_by_day", """
+SELECT created_at::date as day, source_name, COUNT(*) as count
+FROM news
+WHERE created_at >= $1
+AND created_at < $2 + interval '1 day'
+GROUP BY 1, source_name;
+""", description="Articles per news source, per day")
+
+# Row-level statements, read in chunks through query_stream rather than fetched whole.
+
+register_query("upload_failures", """
+SELECT
+  u.created_at,
+  c.name as channel_name,
+  u.platform,
+  COALESCE(NULLIF(u.error_message, ''), 'Unknown error') as error_message
+FROM video_uploads u
+LEFT JOIN channels c ON u.channel_id = c.id
+WHERE u.upload_status = 'failed'
+AND u.created_at >= $1
+AND u.created_at < $2 + interval '1 day';
+""", description="One row per failed upload with its error message")
+
+register_query("stage_durations", """
+SELECT
+  vg.created_at::date as day,
+  EXTRACT(EPOCH FROM (s.created_at - n.created_at)) / 3600 as news_to_summary,
+  EXTRACT(EPOCH FROM (a.created_at - s.created_at)) / 3600 as summary_to_audio,
+  EXTRACT(EPOCH FROM (vg.completed_at - a.created_at)) / 3600 as audio_to_video,
+  EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600 as news_to_video
+FROM video_generations vg
+JOIN news n ON vg.article_id = n.id
+LEFT JOIN LATERAL (
+  SELECT MIN(created_at) as created_at FROM article_summaries WHERE article_id = n.id
+) s ON true
+LEFT JOIN LATERAL (
+  SELECT MIN(created_at) as created_at FROM audio_transcripts WHERE article_id = n.id
+) a ON true
+WHERE vg.status = 'completed'
+AND vg.completed_at IS NOT NULL
+AND vg.created_at >= $1
+AND vg.created_at < $2 + interval '1 day';
+""", description="Per-stage durations (hours) per generated video, keyed by generation day")
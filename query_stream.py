@@ -0,0 +1,154 @@
+"""
+Query streaming - Read large results through server-side cursors in chunks
+
+Row-level statements (durations, per-upload error listings) can return
+hundreds of thousands of rows for "All-time". ``stream_query`` reads them
+through a named server-side cursor and yields typed DataFrame chunks, and the
+aggregators below fold those chunks into small results, so peak memory depends
+on the chunk size and never on the window size.
+"""
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+import query_metrics
+from columnar import frame_from_rows
+from config_loader import get_config_value
+from db_pool import PooledConnection, get_pool
+from query_registry import get_query
+
+_cursor_ids = itertools.count(1)
+
+
+def stream_query(
+    name: str,
+    params: Sequence[Any],
+    chunk_size: Optional[int] = None,
+    conn: Optional[PooledConnection] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a registered statement in DataFrame chunks from a server-side cursor
+
+    Args:
+        name: Registered metric name
+        params: Positional parameter values
+        chunk_size: Rows per chunk (default: STREAM_ITERSIZE, else 5000)
+        conn: Optional pooled connection; one is checked out if omitted
+
+    Yields:
+        Typed DataFrames of at most ``chunk_size`` rows
+    """
+    if conn is None:
+        with get_pool().connection() as pooled:
+            yield from stream_query(name, params, chunk_size, pooled)
+        return
+
+    chunk_size = chunk_size or int(get_config_value("STREAM_ITERSIZE", 5000))
+    sql, bound = get_query(name).as_pyformat(params)
+    with conn.cursor(name=f"autodrop_stream_{next(_cursor_ids)}") as cur:
+        cur.itersize = chunk_size
+        start = time.perf_counter()
+        cur.execute(sql, bound)
+        query_metrics.record_db(time.perf_counter() - start)
+        while True:
+            start = time.perf_counter()
+            rows = cur.fetchmany(chunk_size)
+            query_metrics.record_db(time.perf_counter() - start, rows=len(rows), new_query=False)
+            if not rows:
+                break
+            yield frame_from_rows(rows, cur.description)
+
+
+class Aggregator(ABC):
+    """Folds DataFrame chunks into a small result"""
+
+    @abstractmethod
+    def update(self, chunk: pd.DataFrame) -> None:
+        ...
+
+    @abstractmethod
+    def result(self) -> Any:
+        ...
+
+
+class CountAggregator(Aggregator):
+    """Row count, or row counts per value of ``by``"""
+
+    def __init__(self, by: Optional[str] = None):
+        self.by = by
+        self.total = 0
+        self.counts: Dict[Any, int] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.total += len(chunk)
+        if self.by:
+            for key, count in chunk[self.by].value_counts(dropna=False).items():
+                self.counts[key] = self.counts.get(key, 0) + int(count)
+
+    def result(self) -> Any:
+        return dict(self.counts) if self.by else self.total
+
+
+class TopKAggregator(Aggregator):
+    """
+    Most frequent values of ``columns`` using the Space-Saving algorithm
+
+    Keeps at most ``capacity`` counters (default 10 * k). Counts are exact while
+    the number of distinct values stays under capacity and overestimate by at
+    most the reported ``error`` otherwise.
+    """
+
+    def __init__(self, columns: Sequence[str], k: int = 10, capacity: Optional[int] = None):
+        self.columns = list(columns)
+        self.k = k
+        self.capacity = capacity or 10 * k
+        self.counters: Dict[Tuple[Any, ...], List[int]] = {}  # key -> [count, error]
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        grouped = chunk.groupby(self.columns, dropna=False, sort=False).size()
+        for key, count in grouped.items():
+            key = key if isinstance(key, tuple) else (key,)
+            counter = self.counters.get(key)
+            if counter is not None:
+                counter[0] += int(count)
+            elif len(self.counters) < self.capacity:
+                self.counters[key] = [int(count), 0]
+            else:
+                # Replace the smallest counter; its count becomes the new key's error bound
+                smallest = min(self.counters, key=lambda k: self.counters[k][0])
+                floor = self.counters.pop(smallest)[0]
+                self.counters[key] = [floor + int(count), floor]
+
+    def result(self) -> List[Dict[str, Any]]:
+        top = heapq.nlargest(self.k, self.counters.items(), key=lambda item: item[1][0])
+        return [
+            {**dict(zip(self.columns, key)), "count": count, "error": error}
+            for key, (count, error) in top
+        ]
+
+
+def aggregate(
+    name: str,
+    params: Sequence[Any],
+    *aggregators: Aggregator,
+    chunk_size: Optional[int] = None,
+    stream: Optional[Callable[..., Iterator[pd.DataFrame]]] = None,
+) -> Tuple[Any, ...]:
+    """
+    Stream a registered statement through one or more aggregators
+
+    Args:
+        stream: Chunk source called as ``stream(name, params, chunk_size=...)``
+            (default: stream_query on the cloud DB)
+
+    Returns:
+        Each aggregator's result, in the order given
+    """
+    for chunk in (stream or stream_query)(name, params, chunk_size=chunk_size):
+        for aggregator in aggregators:
+            aggregator.update(chunk)
+    return tuple(aggregator.result() for aggregator in aggregators)
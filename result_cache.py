@@ -0,0 +1,386 @@
+"""
+Result cache - In-memory stale-while-revalidate cache over the disk tier
+
+Replaces ``st.cache_data`` for the dashboard fetchers. An entry is fresh for
+``ttl`` seconds; after that it is still served immediately while a background
+worker re-runs the fetch and swaps the new result in. Only entries older than
+``hard_ttl`` (or missing from both memory and disk) make the caller wait.
+
+Fetches are single-flight: concurrent callers of the same key (across sessions,
+and including a background refresh) wait on one execution and share its result.
+
+Memory use is bounded: every entry is sized when stored and all caches share
+one byte budget (CACHE_MAX_MB), evicting least recently used entries first.
+Evicted results are still on disk, so they come back without a query.
+
+Every call is recorded by query_metrics, with the cache outcome and the DB
+cost of any fetch it ran.
+
+Cached values are shared between sessions, so callers must treat them as
+read-only.
+"""
+import functools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import query_metrics
+from config_loader import get_config_value
+from disk_cache import DiskCache, get_disk_cache
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_lock = threading.Lock()
+
+# Page scripts re-run on every interaction, so caches live here, keyed by namespace
+_caches: Dict[str, "ResultCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def get_refresh_executor() -> ThreadPoolExecutor:
+    """Process-wide background refresh workers (CACHE_REFRESH_WORKERS, default 2)"""
+    global _refresh_executor
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=int(get_config_value("CACHE_REFRESH_WORKERS", 2)),
+                thread_name_prefix="cache-refresh",
+            )
+        return _refresh_executor
+
+
+def _label(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """Readable form of a call's arguments for stats"""
+    parts = [repr(arg) for arg in args] + [f"{name}={value!r}" for name, value in kwargs.items()]
+    return ", ".join(parts)
+
+
+def _metric(args: Tuple[Any, ...]) -> str:
+    """Metric (or channel) a call is for: its first argument when that is a string"""
+    return args[0] if args and isinstance(args[0], str) else ""
+
+
+def _annotate(cache: str) -> None:
+    """Set the cache outcome of the call recorded on this thread"""
+    record = query_metrics.current()
+    if record is not None:
+        record.cache = cache
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate in-memory size of a cached result in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict) and any(isinstance(v, pd.DataFrame) for v in value.values()):
+        return sum(estimate_size(v) for v in value.values())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "size")
+
+    def __init__(self, value: Any, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+        self.size = estimate_size(value)
+
+
+class MemoryBudget:
+    """Byte budget shared by all result caches, with global LRU eviction"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[str, str], Tuple[ResultCache, _Entry]]" = OrderedDict()
+
+    def admit(self, cache: "ResultCache", key: str, entry: _Entry) -> bool:
+        """
+        Account for a newly stored entry and evict LRU entries over the budget
+
+        Returns:
+            False if the entry alone exceeds the budget (the caller drops it)
+        """
+        if entry.size > self.max_bytes:
+            self.forget(cache, key)
+            return False
+        victims = []
+        with self._lock:
+            old = self._lru.pop((cache.namespace, key), None)
+            if old is not None:
+                self.bytes -= old[1].size
+            self._lru[(cache.namespace, key)] = (cache, entry)
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes:
+                (_, victim_key), (victim_cache, victim) = self._lru.popitem(last=False)
+                self.bytes -= victim.size
+                self.evictions += 1
+                victims.append((victim_cache, victim_key, victim))
+        for victim_cache, victim_key, victim in victims:
+            victim_cache._evict(victim_key, victim)
+        return True
+
+    def touch(self, cache: "ResultCache", key: str) -> None:
+        with self._lock:
+            if (cache.namespace, key) in self._lru:
+                self._lru.move_to_end((cache.namespace, key))
+
+    def forget(self, cache: "ResultCache", key: Optional[str] = None) -> None:
+        """Stop accounting for one key of a cache, or all of its keys"""
+        with self._lock:
+            keys = [(cache.namespace, key)] if key is not None else [k for k in self._lru if k[0] == cache.namespace]
+            for lru_key in keys:
+                old = self._lru.pop(lru_key, None)
+                if old is not None:
+                    self.bytes -= old[1].size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._lru),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> MemoryBudget:
+    """Process-wide memory budget (CACHE_MAX_MB, default 128)"""
+    global _budget
+    with _caches_lock:
+        if _budget is None:
+            _budget = MemoryBudget(int(float(get_config_value("CACHE_MAX_MB", 128)) * 1024 * 1024))
+        return _budget
+
+
+class ResultCache:
+    """Stale-while-revalidate cache of one function's results"""
+
+    def __init__(self, namespace: str, func: Callable[..., Any], ttl: float, hard_ttl: float):
+        self.namespace = namespace
+        self.func = func
+        self.ttl = ttl
+        self.hard_ttl = max(hard_ttl, ttl)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._refreshing: set = set()
+        self._inflight: Dict[str, Future] = {}
+        self._flights: Dict[str, Dict[str, Any]] = {}  # key -> label and execution/coalesced counts
+        self._counters = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _store(self, key: str, entry: _Entry) -> _Entry:
+        """Keep an entry in memory if the budget admits it"""
+        with self._lock:
+            self._entries[key] = entry
+        if not get_memory_budget().admit(self, key, entry):
+            self._evict(key, entry)
+        return entry
+
+    def _evict(self, key: str, entry: _Entry) -> None:
+        """Drop ``entry`` from memory unless it has been replaced since (called by the budget)"""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+                self._counters["evictions"] += 1
+                if key not in self._inflight:
+                    self._flights.pop(key, None)
+
+    def _load(self, key: str) -> Optional[_Entry]:
+        """Memory entry for ``key``, promoted from the disk tier if needed"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            get_memory_budget().touch(self, key)
+            return entry
+        disk = get_disk_cache()
+        hit = disk.get(key) if disk is not None else None
+        if hit is None:
+            return None
+        self._count("disk_hits")
+        _annotate("disk")
+        return self._store(key, _Entry(*hit))
+
+    def _compute(self, key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """
+        Run the function and store its result in memory and on disk
+
+        If the key is already being computed, wait for that execution instead
+        and return (or raise) its outcome.
+        """
+        with self._lock:
+            flight = self._flights.setdefault(
+                key, {"key": _label(args, kwargs), "executions": 0, "coalesced": 0}
+            )
+            future = self._inflight.get(key)
+            entry = self._entries.get(key)
+            if future is None and entry is not None and time.time() - entry.stored_at < self.ttl:
+                _annotate("hit")
+                return entry.value  # Another execution finished since this caller looked
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                flight["executions"] += 1
+            else:
+                flight["coalesced"] += 1
+        if not leader:
+            _annotate("coalesced")
+            return future.result()
+
+        try:
+            value = self.func(*args, **kwargs)
+            entry = self._store(key, _Entry(value, time.time()))
+            record = query_metrics.current()
+            if record is not None:
+                # Fetches outside the DB helpers (e.g. yt-dlp) report the result itself
+                record.bytes = record.bytes or entry.size
+                if not record.rows and isinstance(value, (list, pd.DataFrame)):
+                    record.rows = len(value)
+            disk = get_disk_cache()
+            if disk is not None:
+                disk.set(key, value, self.hard_ttl, namespace=self.namespace, stored_at=entry.stored_at)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _refresh(self, key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        try:
+            with query_metrics.track(self.namespace, _metric(args), _label(args, kwargs)) as call:
+                call.cache = "refresh"
+                self._compute(key, args, kwargs)
+        except Exception:
+            pass  # Keep serving the stale entry; the next read schedules another attempt
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._refreshing or key in self._inflight:
+                return
+            self._refreshing.add(key)
+        get_refresh_executor().submit(self._refresh, key, args, kwargs)
+
+    def get(self, *args: Any, **kwargs: Any) -> Any:
+        key = DiskCache.make_key(self.namespace, args, kwargs)
+        with query_metrics.track(self.namespace, _metric(args), _label(args, kwargs)) as call:
+            entry = self._load(key)
+            if entry is not None:
+                age = time.time() - entry.stored_at
+                if age < self.ttl:
+                    self._count("hits")
+                    call.cache = call.cache or "hit"
+                    return entry.value
+                if age < self.hard_ttl:
+                    self._count("stale_hits")
+                    call.cache = "stale"
+                    self._schedule_refresh(key, args, kwargs)
+                    return entry.value
+            self._count("misses")
+            call.cache = "miss"
+            return self._compute(key, args, kwargs)
+
+    def flight_stats(self) -> List[Dict[str, Any]]:
+        """Per-key executions and coalesced callers, most coalesced first"""
+        with self._lock:
+            stats = [dict(flight, namespace=self.namespace) for flight in self._flights.values()]
+        return sorted(stats, key=lambda flight: flight["coalesced"], reverse=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters plus entries and bytes held in memory"""
+        with self._lock:
+            entries = list(self._entries.values())
+            counters = dict(self._counters)
+        return {"namespace": self.namespace, **counters, "entries": len(entries), "bytes": sum(e.size for e in entries)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        get_memory_budget().forget(self)
+        disk = get_disk_cache()
+        if disk is not None:
+            disk.clear(self.namespace)
+
+
+def cached(namespace: str, ttl: float = 3600, hard_ttl: Optional[float] = None) -> Callable:
+    """
+    Decorator caching a function's results with stale-while-revalidate
+
+    Args:
+        namespace: Cache namespace (keep it unique per function)
+        ttl: Seconds a result is fresh
+        hard_ttl: Seconds after which a stale result is no longer served
+            (default: CACHE_HARD_TTL, else 24 hours)
+
+    The wrapper exposes the cache as ``.cache`` and ``.clear()``. Failures are
+    never cached.
+    """
+    if hard_ttl is None:
+        hard_ttl = float(get_config_value("CACHE_HARD_TTL", 24 * 3600))
+
+    def decorator(func: Callable) -> Callable:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = ResultCache(namespace, func, ttl, hard_ttl)
+            else:
+                cache.func, cache.ttl, cache.hard_ttl = func, ttl, max(hard_ttl, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache.get(*args, **kwargs)
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def clear_caches() -> None:
+    """Drop every cached result from memory and disk"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
+
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Memory use and counters of all result caches
+
+    Returns:
+        Dict with the budget's entries/bytes/max_bytes/evictions and a
+        ``caches`` list of per-namespace ResultCache.stats()
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {**get_memory_budget().stats(), "caches": [cache.stats() for cache in caches]}
+
+
+def flight_stats() -> List[Dict[str, Any]]:
+    """Single-flight counts of every cached function, most coalesced first"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    stats = [flight for cache in caches for flight in cache.flight_stats()]
+    return sorted(stats, key=lambda flight: flight["coalesced"], reverse=True)
@@ -0,0 +1,453 @@
+"""
+Rollup store - Incrementally maintained daily metric rollups in a local SQLite file
+
+Raw rows are aggregated once into per-day buckets (optionally split by channel,
+platform, category or source). Refreshes only recompute days that saw new or
+updated rows since the last watermark, and any dashboard window is answered by
+summing day buckets, so the cost of a page load scales with the number of days
+rather than the number of rows.
+
+Distinct counts (e.g. uploaded video generations) are distinct per day; a
+generation uploaded on two different days is counted on both.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config_loader import get_cache_dir, get_config_value
+from db_pool import get_pool
+
+
+@dataclass(frozen=True)
+class RollupFamily:
+    """
+    A group of daily rollups computed from one source table
+
+    ``changed_sql`` returns ``(day, max_ts)`` for days with rows newer than
+    ``%(since)s`` (all days when ``since`` is NULL). Each statement in
+    ``rollup_sql`` returns ``(day, metric, dim1, dim2, value)`` rows for the days
+    in ``%(days)s``.
+
+    ``late_updates`` marks tables whose rows change after insert without a
+    timestamp to detect it (upload status); their last ``recheck`` days are
+    recomputed on every refresh.
+    """
+
+    name: str
+    changed_sql: str
+    rollup_sql: Tuple[str, ...]
+    late_updates: bool = False
+
+
+def _changed(table: str, ts_expr: str) -> str:
+    return f"""
+SELECT created_at::date as day, MAX({ts_expr}) as max_ts
+FROM {table}
+WHERE %(since)s::timestamp IS NULL OR {ts_expr} > %(since)s::timestamp
+GROUP BY 1
+"""
+
+
+def _days_filter(column: str) -> str:
+    return (
+        f"{column} >= %(first_day)s::date AND {column} < %(last_day)s::date + interval '1 day' "
+        f"AND {column}::date = ANY(%(days)s::date[])"
+    )
+
+
+FAMILIES: Tuple[RollupFamily, ...] = (
+    RollupFamily(
+        "video_generations",
+        _changed("video_generations", "GREATEST(created_at, completed_at, reviewed_at)"),
+        (
+            f"""
+SELECT g.day, m.metric, NULL, NULL, m.value
+FROM (
+  SELECT
+    created_at::date as day,
+    COUNT(*) FILTER (WHERE status = 'completed') as generated,
+    COUNT(*) FILTER (WHERE reviewed_at IS NULL AND review_status IS NULL) as pending_review,
+    COUNT(*) FILTER (WHERE review_status = 'approved') as approved,
+    COUNT(*) FILTER (WHERE review_status IS NOT NULL) as reviewed
+  FROM video_generations
+  WHERE {_days_filter("created_at")}
+  GROUP BY 1
+) g
+CROSS JOIN LATERAL (VALUES
+  ('generated', g.generated), ('pending_review', g.pending_review),
+  ('approved', g.approved), ('reviewed', g.reviewed)
+) m(metric, value)
+""",
+            f"""
+SELECT p.day, m.metric, NULL, NULL, m.value
+FROM (
+  SELECT
+    vg.created_at::date as day,
+    COUNT(*) as n,
+    SUM(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600) as total,
+    MIN(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600) as lo,
+    MAX(EXTRACT(EPOCH FROM (vg.completed_at - n.created_at)) / 3600) as hi
+  FROM video_generations vg
+  JOIN news n ON vg.article_id = n.id
+  WHERE vg.status = 'completed'
+  AND vg.completed_at IS NOT NULL
+  AND {_days_filter("vg.created_at")}
+  GROUP BY 1
+) p
+CROSS JOIN LATERAL (VALUES
+  ('processing_n', p.n), ('processing_sum', p.total), ('processing_min', p.lo), ('processing_max', p.hi)
+) m(metric, value)
+""",
+        ),
+    ),
+    RollupFamily(
+        "video_uploads",
+        _changed("video_uploads", "created_at"),
+        (
+            f"""
+SELECT created_at::date, 'uploaded', NULL, NULL, COUNT(DISTINCT video_generation_id)
+FROM video_uploads
+WHERE upload_status = 'completed'
+AND {_days_filter("created_at")}
+GROUP BY 1
+""",
+            f"""
+SELECT u.created_at::date, m.metric, c.name, u.platform, SUM(m.value)
+FROM video_uploads u
+LEFT JOIN channels c ON u.channel_id = c.id
+CROSS JOIN LATERAL (VALUES
+  ('channel_total', 1), ('channel_successful', CASE WHEN u.upload_status = 'completed' THEN 1 ELSE 0 END)
+) m(metric, value)
+WHERE {_days_filter("u.created_at")}
+GROUP BY 1, 2, 3, 4
+""",
+            f"""
+SELECT t.day, m.metric, NULL, NULL, m.value
+FROM (
+  SELECT
+    vu.created_at::date as day,
+    COUNT(*) as n,
+    SUM(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600) as total,
+    MIN(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600) as lo,
+    MAX(EXTRACT(EPOCH FROM (vu.created_at - n.created_at)) / 3600) as hi
+  FROM video_generations vg
+  JOIN news n ON vg.article_id = n.id
+  JOIN video_uploads vu ON vg.id = vu.video_generation_id
+  WHERE vu.upload_status = 'completed'
+  AND {_days_filter("vu.created_at")}
+  GROUP BY 1
+) t
+CROSS JOIN LATERAL (VALUES
+  ('turnaround_n', t.n), ('turnaround_sum', t.total), ('turnaround_min', t.lo), ('turnaround_max', t.hi)
+) m(metric, value)
+""",
+        ),
+        late_updates=True,
+    ),
+    RollupFamily(
+        "news",
+        _changed("news", "created_at"),
+        (
+            f"""
+SELECT created_at::date, 'ingested', NULL, NULL, COUNT(*)
+FROM news
+WHERE {_days_filter("created_at")}
+GROUP BY 1
+""",
+            f"""
+SELECT created_at::date, 'category', category, NULL, COUNT(*)
+FROM news
+WHERE {_days_filter("created_at")}
+GROUP BY 1, 3
+""",
+            f"""
+SELECT created_at::date, 'source', source_name, NULL, COUNT(*)
+FROM news
+WHERE {_days_filter("created_at")}
+GROUP BY 1, 3
+""",
+        ),
+    ),
+    RollupFamily(
+        "article_summaries",
+        _changed("article_summaries", "created_at"),
+        (
+            f"""
+SELECT created_at::date, 'summarized', NULL, NULL, COUNT(DISTINCT article_id)
+FROM article_summaries
+WHERE {_days_filter("created_at")}
+GROUP BY 1
+""",
+        ),
+    ),
+    RollupFamily(
+        "audio_transcripts",
+        _changed("audio_transcripts", "created_at"),
+        (
+            f"""
+SELECT created_at::date, 'audio_generated', NULL, NULL, COUNT(DISTINCT article_id)
+FROM audio_transcripts
+WHERE {_days_filter("created_at")}
+GROUP BY 1
+""",
+        ),
+    ),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+  family TEXT NOT NULL,
+  metric TEXT NOT NULL,
+  day TEXT NOT NULL,
+  dim1 TEXT,
+  dim2 TEXT,
+  value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rollups_metric_day ON rollups (metric, day);
+CREATE INDEX IF NOT EXISTS rollups_family_day ON rollups (family, day);
+CREATE TABLE IF NOT EXISTS watermarks (
+  family TEXT PRIMARY KEY,
+  max_ts TEXT NOT NULL,
+  refreshed_at REAL NOT NULL
+);
+"""
+
+FUNNEL_STAGES = (
+    ("Ingested", "ingested"),
+    ("Summarized", "summarized"),
+    ("Audio Generated", "audio_generated"),
+    ("Video Generated", "generated"),
+    ("Approved", "approved"),
+    ("Uploaded", "uploaded"),
+)
+
+
+class RollupStore:
+    """
+    Daily rollups of every Analytics metric, persisted in SQLite
+
+    Watermarks are the newest source timestamp seen per table. Because rows
+    reach the cloud DB through a periodic sync, each refresh re-reads rows
+    newer than ``watermark - lookback``. Upload statuses change after insert
+    without a timestamp, so the last ``recheck`` of upload days is recomputed
+    on every refresh; a status change on an older upload is not reflected
+    until the rollups are rebuilt.
+    """
+
+    def __init__(self, path: str, lookback: timedelta = timedelta(hours=6), recheck: timedelta = timedelta(days=7)):
+        self.path = path
+        self.lookback = lookback
+        self.recheck = recheck
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._last_refresh = 0.0
+
+    # Refresh
+
+    def _watermark(self, family: str) -> Optional[datetime]:
+        row = self._db.execute("SELECT max_ts FROM watermarks WHERE family = ?", (family,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def refresh(self, conn=None) -> Dict[str, int]:
+        """
+        Recompute the day buckets that changed since the last refresh
+
+        Args:
+            conn: Optional pooled connection; one is checked out if omitted
+
+        Returns:
+            Number of recomputed days per family
+        """
+        if conn is None:
+            with get_pool().connection() as pooled:
+                return self.refresh(pooled)
+
+        refreshed: Dict[str, int] = {}
+        with self._lock:
+            for family in FAMILIES:
+                watermark = self._watermark(family.name)
+                since = watermark - self.lookback if watermark else None
+                with conn.cursor() as cur:
+                    cur.execute(family.changed_sql, {"since": since})
+                    changed = cur.fetchall()
+                days = {day for day, _ in changed}
+                if family.late_updates and watermark is not None:
+                    today = date.today()
+                    days.update(today - timedelta(days=i) for i in range(self.recheck.days + 1))
+                if not days:
+                    refreshed[family.name] = 0
+                    continue
+
+                days = sorted(days)
+                params = {"first_day": days[0], "last_day": days[-1], "days": days}
+                rows: List[Tuple[Any, ...]] = []
+                with conn.cursor() as cur:
+                    for sql in family.rollup_sql:
+                        cur.execute(sql, params)
+                        rows.extend(cur.fetchall())
+
+                new_watermark = max([ts for _, ts in changed if ts] + ([watermark] if watermark else []) or [datetime(1970, 1, 1)])
+                with self._db:
+                    self._db.executemany(
+                        "DELETE FROM rollups WHERE family = ? AND day = ?",
+                        [(family.name, day.isoformat()) for day in days],
+                    )
+                    self._db.executemany(
+                        "INSERT INTO rollups (family, metric, day, dim1, dim2, value) VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (family.name, metric, day.isoformat(), dim1, dim2, float(value))
+                            for day, metric, dim1, dim2, value in rows
+                            if value is not None
+                        ],
+                    )
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO watermarks (family, max_ts, refreshed_at) VALUES (?, ?, ?)",
+                        (family.name, new_watermark.isoformat(), time.time()),
+                    )
+                refreshed[family.name] = len(days)
+            self._last_refresh = time.monotonic()
+        return refreshed
+
+    def refresh_if_stale(self, max_age: float) -> None:
+        """Refresh unless the last refresh in this process is younger than max_age seconds"""
+        with self._lock:
+            if time.monotonic() - self._last_refresh >= max_age:
+                self.refresh()
+
+    # Queries
+
+    def _sums(self, metrics: Sequence[str], start: date, end: date) -> Dict[str, float]:
+        placeholders = ", ".join("?" * len(metrics))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT metric, SUM(value) FROM rollups WHERE metric IN ({placeholders}) "
+                "AND day >= ? AND day <= ? GROUP BY metric",
+                (*metrics, start.isoformat(), end.isoformat()),
+            ).fetchall()
+        sums = {metric: 0.0 for metric in metrics}
+        sums.update({metric: value or 0.0 for metric, value in rows})
+        return sums
+
+    def _rows(self, sql: str, params: Iterable[Any]) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            return self._db.execute(sql, tuple(params)).fetchall()
+
+    def _duration(self, prefix: str, start: date, end: date) -> List[Dict[str, Any]]:
+        row = self._rows(
+            "SELECT SUM(CASE WHEN metric = ? THEN value END), SUM(CASE WHEN metric = ? THEN value END), "
+            "MIN(CASE WHEN metric = ? THEN value END), MAX(CASE WHEN metric = ? THEN value END) "
+            "FROM rollups WHERE metric IN (?, ?, ?, ?) AND day >= ? AND day <= ?",
+            (
+                f"{prefix}_n", f"{prefix}_sum", f"{prefix}_min", f"{prefix}_max",
+                f"{prefix}_n", f"{prefix}_sum", f"{prefix}_min", f"{prefix}_max",
+                start.isoformat(), end.isoformat(),
+            ),
+        )[0]
+        n, total, lo, hi = row
+        if not n:
+            return [{"avg_hours": None, "min_hours": None, "max_hours": None}]
+        return [{"avg_hours": round(total / n, 2), "min_hours": round(lo, 2), "max_hours": round(hi, 2)}]
+
+    def _counts_by(self, metric: str, column: str, start: date, end: date, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = (
+            "SELECT dim1, SUM(value) as total FROM rollups WHERE metric = ? AND day >= ? AND day <= ? "
+            "GROUP BY dim1 ORDER BY total DESC"
+        )
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [
+            {column: key, "count": int(total)}
+            for key, total in self._rows(sql, (metric, start.isoformat(), end.isoformat()))
+        ]
+
+    def query(self, name: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        """
+        Answer a registered Analytics metric from the day buckets
+
+        Args:
+            name: Metric name from query_registry
+            params: (first_day, last_day) of the window, both inclusive
+
+        Returns:
+            Rows shaped like the metric's SQL result
+        """
+        start, end = params
+        if name == "kpis":
+            sums = self._sums(
+                ("generated", "pending_review", "approved", "reviewed", "uploaded", "ingested"), start, end
+            )
+            return [{
+                "total_generated": int(sums["generated"]),
+                "pending_review": int(sums["pending_review"]),
+                "approved": int(sums["approved"]),
+                "reviewed": int(sums["reviewed"]),
+                "total_uploaded": int(sums["uploaded"]),
+                "ingested": int(sums["ingested"]),
+            }]
+        if name == "timeline":
+            return [
+                {"upload_date": day, "videos_uploaded": int(total)}
+                for day, total in self._rows(
+                    "SELECT day, SUM(value) FROM rollups WHERE metric = 'uploaded' AND day >= ? AND day <= ? "
+                    "GROUP BY day ORDER BY day",
+                    (start.isoformat(), end.isoformat()),
+                )
+            ]
+        if name == "funnel":
+            sums = self._sums([metric for _, metric in FUNNEL_STAGES], start, end)
+            return [{"stage": stage, "count": int(sums[metric])} for stage, metric in FUNNEL_STAGES]
+        if name == "processing_time":
+            return self._duration("processing", start, end)
+        if name == "turnaround_time":
+            return self._duration("turnaround", start, end)
+        if name == "channels":
+            rows = self._rows(
+                "SELECT dim1, dim2, SUM(CASE WHEN metric = 'channel_total' THEN value ELSE 0 END) as total, "
+                "SUM(CASE WHEN metric = 'channel_successful' THEN value ELSE 0 END) "
+                "FROM rollups WHERE metric IN ('channel_total', 'channel_successful') AND day >= ? AND day <= ? "
+                "GROUP BY dim1, dim2 ORDER BY total DESC",
+                (start.isoformat(), end.isoformat()),
+            )
+            return [
+                {
+                    "channel_name": channel,
+                    "total_uploads": int(total),
+                    "successful": int(successful),
+                    "success_rate": round(100.0 * successful / total, 1) if total else None,
+                    "platform": platform,
+                }
+                for channel, platform, total, successful in rows
+            ]
+        if name == "categories":
+            return self._counts_by("category", "category", start, end)
+        if name == "sources":
+            return self._counts_by("source", "source_name", start, end, limit=10)
+        raise KeyError(f"metric {name!r} has no rollup")
+
+
+_store: Optional[RollupStore] = None
+_store_lock = threading.Lock()
+
+
+def get_rollup_store() -> RollupStore:
+    """
+    Get the process-wide rollup store, refreshed at most every ROLLUP_REFRESH_INTERVAL seconds
+
+    Returns:
+        RollupStore backed by ROLLUP_DB_PATH (default: rollups.sqlite3 in the cache dir)
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = get_config_value("ROLLUP_DB_PATH", os.path.join(get_cache_dir(), "rollups.sqlite3"))
+            lookback = timedelta(hours=float(get_config_value("ROLLUP_REFRESH_LOOKBACK_HOURS", 6)))
+            recheck = timedelta(days=int(get_config_value("ROLLUP_UPLOAD_RECHECK_DAYS", 7)))
+            _store = RollupStore(path, lookback=lookback, recheck=recheck)
+        store = _store
+    store.refresh_if_stale(float(get_config_value("ROLLUP_REFRESH_INTERVAL", 300)))
+    return store
@@ -0,0 +1,292 @@
+"""
+Snapshot store - Local columnar copy of the Autodrop tables, queried with DuckDB
+
+The tables the dashboard reads are mirrored into Parquet files (one per table
+and month of ``created_at``) in the cache dir, and the registered metric SQL
+runs unchanged on an embedded DuckDB whose views read those files. Refreshes
+re-fetch only the months holding rows changed since the last watermark (plus the
+latest two months of uploads, whose status changes without a timestamp), so the
+dashboard answers in milliseconds and keeps working on the last snapshot when
+the cloud DB is unreachable.
+
+Requires the optional ``duckdb`` package.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import pandas as pd
+import psycopg2
+
+from columnar import frame_from_rows
+from config_loader import get_cache_dir, get_config_value
+from db_pool import PoolError, PooledConnection, get_pool
+from query_registry import get_query
+
+try:
+    import duckdb
+except ImportError:  # Only needed when ANALYTICS_BACKEND is "snapshot"
+    duckdb = None
+
+
+@dataclass(frozen=True)
+class SnapshotTable:
+    """A mirrored table: the columns the metric SQL reads and how to spot changed rows"""
+
+    name: str
+    columns: Tuple[str, ...]
+    # SQL expression of when a row last changed; None reloads the table fully
+    changed_at: Optional[str] = "created_at"
+    # Months (current one included) rewritten on every refresh, for rows that change without a timestamp
+    recent_months: int = 0
+
+
+SNAPSHOT_TABLES: Tuple[SnapshotTable, ...] = (
+    SnapshotTable("channels", ("id", "name"), changed_at=None),
+    SnapshotTable("news", ("id", "title", "category", "source_name", "created_at")),
+    SnapshotTable("article_summaries", ("id", "article_id", "created_at")),
+    SnapshotTable("audio_transcripts", ("id", "article_id", "created_at")),
+    SnapshotTable(
+        "video_generations",
+        ("id", "article_id", "status", "review_status", "created_at", "completed_at", "reviewed_at"),
+        changed_at="GREATEST(created_at, completed_at, reviewed_at)",
+    ),
+    # No update timestamp: status changes are only picked up by rewriting the
+    # current and previous month; older uploads keep their snapshotted status
+    SnapshotTable(
+        "video_uploads",
+        ("id", "video_generation_id", "channel_id", "platform", "upload_status", "error_message", "created_at"),
+        recent_months=2,
+    ),
+)
+
+
+class SnapshotUnavailableError(RuntimeError):
+    """No snapshot has been built yet and the cloud DB cannot be reached"""
+
+
+class SnapshotStore:
+    """Month-partitioned Parquet mirror of the Autodrop tables with a DuckDB query engine"""
+
+    def __init__(self, directory: str, lookback: timedelta = timedelta(hours=6)):
+        if duckdb is None:
+            raise ImportError("ANALYTICS_BACKEND = \"snapshot\" needs the duckdb package (pip install duckdb)")
+        self.directory = directory
+        self.lookback = lookback
+        self.last_error: Optional[str] = None
+        self.generation = 0  # Bumped by every successful refresh
+        self._lock = threading.RLock()
+        self._db = duckdb.connect()
+        self._last_refresh = 0.0
+        for table in SNAPSHOT_TABLES:
+            os.makedirs(self._table_dir(table), exist_ok=True)
+        self._watermarks = self._load_watermarks()
+        self._create_views()
+
+    def _table_dir(self, table: SnapshotTable) -> str:
+        return os.path.join(self.directory, table.name)
+
+    def _load_watermarks(self) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self.directory, "watermarks.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_watermarks(self) -> None:
+        path = os.path.join(self.directory, "watermarks.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._watermarks, f)
+        os.replace(path + ".tmp", path)
+
+    def _create_views(self) -> None:
+        """(Re)create one view per table over its Parquet files"""
+        for table in SNAPSHOT_TABLES:
+            if any(name.endswith(".parquet") for name in os.listdir(self._table_dir(table))):
+                pattern = os.path.join(self._table_dir(table), "*.parquet").replace("'", "''")
+                self._db.execute(f"CREATE OR REPLACE VIEW {table.name} AS SELECT * FROM read_parquet('{pattern}')")
+
+    @property
+    def refreshed_at(self) -> Optional[float]:
+        """Epoch time of the last successful refresh (by any process), or None before the first"""
+        try:
+            return os.path.getmtime(os.path.join(self.directory, "watermarks.json"))
+        except OSError:
+            return None
+
+    @property
+    def ready(self) -> bool:
+        """Whether every table has been snapshotted at least once"""
+        return all(table.name in self._watermarks for table in SNAPSHOT_TABLES)
+
+    def _write(self, table: SnapshotTable, part: str, df: pd.DataFrame) -> None:
+        """
+        Atomically replace one Parquet file of a table
+
+        An empty ``df`` removes the file, unless it is the table's only one
+        (an empty file keeps the view and its column types).
+        """
+        path = os.path.join(self._table_dir(table), f"{part}.parquet")
+        others = [name for name in os.listdir(self._table_dir(table)) if name.endswith(".parquet") and name != f"{part}.parquet"]
+        if not len(df) and others:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp = path + ".tmp"
+        cur = self._db.cursor()
+        try:
+            cur.register("snapshot_part", df)
+            cur.execute(f"COPY snapshot_part TO '{tmp.replace(chr(39), chr(39) * 2)}' (FORMAT parquet)")
+            cur.unregister("snapshot_part")
+        finally:
+            cur.close()
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _fetch(conn: PooledConnection, sql: str, params: dict) -> pd.DataFrame:
+        """Read a result through a server-side cursor into one typed DataFrame"""
+        chunks = []
+        chunk_size = int(get_config_value("STREAM_ITERSIZE", 5000))
+        with conn.cursor(name="autodrop_snapshot") as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if rows or not chunks:
+                    chunks.append(frame_from_rows(rows, cur.description))
+                if not rows:
+                    break
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+    def refresh(self, conn: Optional[PooledConnection] = None) -> Dict[str, int]:
+        """
+        Re-fetch the months of every table holding rows changed since its watermark
+
+        Args:
+            conn: Optional pooled connection; one is checked out if omitted
+
+        Returns:
+            Table name -> number of rewritten Parquet files
+        """
+        if conn is None:
+            with get_pool().connection() as pooled:
+                return self.refresh(pooled)
+
+        refreshed: Dict[str, int] = {}
+        with self._lock:
+            for table in SNAPSHOT_TABLES:
+                columns = ", ".join(table.columns)
+                if table.changed_at is None:
+                    self._write(table, "all", self._fetch(conn, f"SELECT {columns} FROM {table.name}", {}))
+                    self._watermarks[table.name] = datetime.now().isoformat()
+                    refreshed[table.name] = 1
+                    continue
+
+                watermark = self._watermarks.get(table.name)
+                since = datetime.fromisoformat(watermark) - self.lookback if watermark else None
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"""
+                        SELECT date_trunc('month', created_at)::date as month, MAX({table.changed_at}) as max_ts
+                        FROM {table.name}
+                        WHERE %(since)s::timestamp IS NULL OR {table.changed_at} > %(since)s::timestamp
+                        GROUP BY 1
+                        """,
+                        {"since": since},
+                    )
+                    changed = cur.fetchall()
+                months = {month for month, _ in changed}
+                if watermark and table.recent_months:
+                    month = date.today().replace(day=1)
+                    for _ in range(table.recent_months):
+                        months.add(month)
+                        month = (month - timedelta(days=1)).replace(day=1)
+                for month in sorted(months):
+                    next_month = (month + timedelta(days=32)).replace(day=1)
+                    df = self._fetch(
+                        conn,
+                        f"SELECT {columns} FROM {table.name} WHERE created_at >= %(start)s AND created_at < %(end)s",
+                        {"start": month, "end": next_month},
+                    )
+                    self._write(table, f"{month:%Y-%m}", df)
+                timestamps = [ts for _, ts in changed if ts] + ([datetime.fromisoformat(watermark)] if watermark else [])
+                self._watermarks[table.name] = max(timestamps).isoformat() if timestamps else datetime(1970, 1, 1).isoformat()
+                refreshed[table.name] = len(months)
+            self._save_watermarks()
+            self._create_views()
+            self._last_refresh = time.monotonic()
+            self.last_error = None
+            self.generation += 1
+        return refreshed
+
+    def refresh_if_stale(self, max_age: float) -> None:
+        """
+        Refresh unless the last attempt in this process is younger than max_age seconds
+
+        If the cloud DB cannot be reached the existing snapshot keeps being
+        served (the error is kept in ``last_error``); without any snapshot
+        SnapshotUnavailableError is raised.
+        """
+        with self._lock:
+            if time.monotonic() - self._last_refresh < max_age:
+                return
+            try:
+                self.refresh()
+            except (psycopg2.Error, PoolError) as e:
+                self._last_refresh = time.monotonic()
+                self.last_error = str(e).strip()
+                if not self.ready:
+                    raise SnapshotUnavailableError(f"No local snapshot yet and the cloud DB is unreachable: {self.last_error}") from e
+
+    def query(self, name: str, params: Sequence[date]) -> pd.DataFrame:
+        """Run a registered metric on the snapshot"""
+        cur = self._db.cursor()
+        try:
+            return cur.execute(get_query(name).sql, list(params)).df()
+        finally:
+            cur.close()
+
+    def stream(self, name: str, params: Sequence[date], chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Run a registered statement on the snapshot and yield DataFrame chunks"""
+        return self.stream_sql(get_query(name).sql, params, chunk_size)
+
+    def stream_sql(self, sql: str, params: Sequence = (), chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Run DuckDB SQL over the snapshot views and yield DataFrame chunks"""
+        chunk_size = chunk_size or int(get_config_value("STREAM_ITERSIZE", 5000))
+        cur = self._db.cursor()
+        try:
+            cur.execute(sql, list(params))
+            while True:
+                chunk = cur.fetch_df_chunk(max(1, chunk_size // 2048))
+                if not len(chunk):
+                    break
+                yield chunk
+        finally:
+            cur.close()
+
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """
+    Get the process-wide snapshot, refreshed at most every SNAPSHOT_REFRESH_INTERVAL seconds
+
+    Returns:
+        SnapshotStore in SNAPSHOT_DIR (default: <cache dir>/snapshot)
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore(
+                get_config_value("SNAPSHOT_DIR") or os.path.join(get_cache_dir(), "snapshot"),
+                lookback=timedelta(hours=float(get_config_value("SNAPSHOT_REFRESH_LOOKBACK_HOURS", 6))),
+            )
+        store = _store
+    store.refresh_if_stale(float(get_config_value("SNAPSHOT_REFRESH_INTERVAL", 300)))
+    return store
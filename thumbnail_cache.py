@@ -0,0 +1,182 @@
+"""
+Thumbnail cache - Resized WebP copies of video thumbnails on local disk
+
+Each thumbnail is downloaded once, scaled down to THUMBNAIL_WIDTH pixels wide
+and stored as WebP under its video id, and the Videos grid serves those bytes
+instead of sending every visitor to the full-size remote image. The directory
+is kept under THUMBNAIL_CACHE_MAX_MB by deleting the least recently served
+files.
+
+The grid passes thumbnails to st.image as data URIs (data_uri()): Streamlit
+re-encodes image bytes other than JPEG and PNG to JPEG on every render, but
+serves URLs as they are.
+"""
+import base64
+import io
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+from config_loader import get_cache_dir, get_config_value
+
+
+class ThumbnailCache:
+    """WebP thumbnails keyed by video id in one directory, evicted least recently used first"""
+
+    def __init__(self, directory: str, max_bytes: int, width: int = 320, quality: int = 70, timeout: float = 10.0, workers: int = 4):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.width = width
+        self.quality = quality
+        self.timeout = timeout
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="thumbnail")
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".webp"))
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _path(self, video_id: str) -> str:
+        # Video ids are URL-safe, but never let one escape the directory
+        return os.path.join(self.directory, video_id.replace("/", "_").replace("\\", "_") + ".webp")
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # Marks it recently used for eviction
+        return data
+
+    def _convert(self, raw: bytes) -> bytes:
+        """Scale an image down to ``width`` (keeping its aspect ratio) and encode it as WebP"""
+        with Image.open(io.BytesIO(raw)) as image:
+            image = image.convert("RGB")
+            if image.width > self.width:
+                image = image.resize((self.width, max(1, round(image.height * self.width / image.width))), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format="WEBP", quality=self.quality, method=4)
+        return out.getvalue()
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            entries = sorted(
+                (entry for entry in os.scandir(self.directory) if entry.name.endswith(".webp")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in entries:
+                if self._bytes <= self.max_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self._bytes -= size
+
+    def get(self, video_id: str, url: str) -> Optional[bytes]:
+        """
+        Get a video's thumbnail, downloading and converting it on first use
+
+        Concurrent requests for the same video download it once.
+
+        Returns:
+            WebP bytes, or None if the image could not be downloaded or decoded
+            (callers fall back to the remote URL)
+        """
+        path = self._path(video_id)
+        data = self._read(path)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(video_id, threading.Lock())
+        try:
+            with fetch_lock:
+                data = self._read(path)
+                if data is not None:
+                    self.hits += 1
+                    return data
+                self.misses += 1
+                try:
+                    with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                        data = self._convert(response.read())
+                except Exception:
+                    self.failures += 1
+                    return None
+
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                with self._lock:
+                    self._bytes += len(data)
+        finally:
+            with self._lock:
+                if self._fetch_locks.get(video_id) is fetch_lock and not fetch_lock.locked():
+                    del self._fetch_locks[video_id]
+        self._evict()
+        return data
+
+    def get_many(self, items: Iterable[Tuple[str, str]]) -> Dict[str, Optional[bytes]]:
+        """
+        get() several thumbnails, downloading the missing ones in parallel
+
+        Args:
+            items: (video id, URL) pairs
+
+        Returns:
+            Video id -> WebP bytes or None
+        """
+        futures = {video_id: self._executor.submit(self.get, video_id, url) for video_id, url in items}
+        return {video_id: future.result() for video_id, future in futures.items()}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files = sum(1 for entry in os.scandir(self.directory) if entry.name.endswith(".webp"))
+            return {
+                "files": files, "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "failures": self.failures,
+            }
+
+
+def data_uri(data: bytes) -> str:
+    """A WebP thumbnail as a ``data:`` URL"""
+    return "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+
+
+_cache: Optional[ThumbnailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> Optional[ThumbnailCache]:
+    """
+    Get the process-wide thumbnail cache
+
+    Returns:
+        ThumbnailCache in THUMBNAIL_CACHE_DIR (default: <cache dir>/thumbnails),
+        or None when THUMBNAIL_CACHE_ENABLED is false
+    """
+    global _cache
+    if str(get_config_value("THUMBNAIL_CACHE_ENABLED", "true")).lower() in ("0", "false", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache(
+                get_config_value("THUMBNAIL_CACHE_DIR") or os.path.join(get_cache_dir(), "thumbnails"),
+                max_bytes=int(float(get_config_value("THUMBNAIL_CACHE_MAX_MB", 64)) * 1024 * 1024),
+                width=int(get_config_value("THUMBNAIL_WIDTH", 320)),
+                quality=int(get_config_value("THUMBNAIL_QUALITY", 70)),
+                timeout=float(get_config_value("THUMBNAIL_FETCH_TIMEOUT", 5)),
+            )
+        return _cache
@@ -0,0 +1,171 @@
+"""
+Time series - Bounded-size rendering of long time series charts
+
+Charts of a whole history would otherwise ship every point to the browser as
+SVG. Series are aggregated to the selected granularity, downsampled to about
+one point per horizontal pixel (largest-triangle-three-buckets, or min/max per
+bucket to keep every spike), and drawn with WebGL traces above a size
+threshold, so figure payload and browser render time stay bounded.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from config_loader import get_config_value
+
+# Granularity label -> pandas resample rule (None keeps the rows as they are)
+GRANULARITIES: Dict[str, Optional[str]] = {
+    "Daily": None,
+    "Weekly": "W-MON",
+    "Monthly": "MS",
+}
+
+
+def aggregate(df: pd.DataFrame, x: str, y: str, granularity: str = "Daily") -> pd.DataFrame:
+    """
+    Sum a series into weekly (weeks starting Monday) or monthly buckets
+
+    Args:
+        df: Frame with a datetime column ``x`` and a numeric column ``y``
+        granularity: A key of GRANULARITIES
+
+    Returns:
+        Frame with columns ``x`` (bucket start) and ``y``, sorted by ``x``
+    """
+    df = df[[x, y]].sort_values(x)
+    rule = GRANULARITIES[granularity]
+    if rule is None:
+        return df.reset_index(drop=True)
+    return df.resample(rule, on=x, label="left", closed="left")[y].sum().reset_index()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-triangle-three-buckets downsampling
+
+    Keeps the first and last points and, from each of ``n_out - 2`` equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the mean of the next one.
+
+    Args:
+        x: Numeric, increasing x values
+        y: y values
+        n_out: Number of points to keep
+
+    Returns:
+        Indices of the kept points, increasing
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = np.empty(n_out, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min/max bucketing: the lowest and highest point of ``n_out // 2`` equal buckets
+
+    Returns:
+        Indices of the kept points, increasing
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    kept = []
+    for bucket in np.array_split(np.arange(n), n_out // 2):
+        values = y[bucket]
+        kept.extend((bucket[np.argmin(values)], bucket[np.argmax(values)]))
+    return np.unique(kept)
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, max_points: int, method: str = "lttb") -> pd.DataFrame:
+    """
+    Reduce a sorted series to at most ``max_points`` rows
+
+    Args:
+        df: Frame sorted by ``x`` (datetime or numeric)
+        method: "lttb" (keeps the visual shape) or "minmax" (keeps every extreme)
+
+    Returns:
+        ``df`` itself when it is small enough, otherwise the kept rows
+    """
+    if len(df) <= max_points:
+        return df
+    values = df[y].to_numpy(dtype="float64", na_value=0.0)
+    if method == "minmax":
+        kept = minmax(values, max_points)
+    elif method == "lttb":
+        positions = df[x].to_numpy()
+        if np.issubdtype(positions.dtype, np.datetime64):
+            positions = positions.astype("datetime64[ns]").astype("int64")
+        kept = lttb(positions.astype("float64"), values, max_points)
+    else:
+        raise ValueError(f"unknown downsampling method {method!r}")
+    return df.iloc[kept]
+
+
+def area_chart(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str,
+    labels: Dict[str, str],
+    color: str = "#9D4EDD",
+    fillcolor: str = "rgba(157, 78, 221, 0.3)",
+    max_points: Optional[int] = None,
+    webgl_threshold: Optional[int] = None,
+) -> go.Figure:
+    """
+    Filled line chart of a sorted series with a bounded number of points
+
+    Args:
+        df: Frame sorted by ``x``
+        labels: Axis titles keyed by column name
+        max_points: Downsample above this many points (default: TIMESERIES_MAX_POINTS,
+            about the chart width in pixels)
+        webgl_threshold: Draw with Scattergl from this many points (default:
+            TIMESERIES_WEBGL_THRESHOLD)
+
+    Returns:
+        Plotly figure
+    """
+    if max_points is None:
+        max_points = int(get_config_value("TIMESERIES_MAX_POINTS", 1000))
+    if webgl_threshold is None:
+        webgl_threshold = int(get_config_value("TIMESERIES_WEBGL_THRESHOLD", 500))
+    shown = downsample(df, x, y, max_points, method=str(get_config_value("TIMESERIES_DOWNSAMPLE", "lttb")))
+    trace = go.Scattergl if len(shown) >= webgl_threshold else go.Scatter
+    fig = go.Figure(trace(
+        x=shown[x],
+        y=shown[y],
+        mode="lines",
+        fill="tozeroy",
+        fillcolor=fillcolor,
+        line=dict(color=color, width=3),
+        name=labels.get(y, y),
+    ))
+    if len(shown) < len(df):
+        title += f" ({len(shown):,} of {len(df):,} points)"
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+    )
+    return fig
@@ -0,0 +1,377 @@
+"""
+Video catalog - Persistent per-channel Shorts catalog with incremental refresh
+
+Every channel's Shorts (video id, title, thumbnail and when the catalog first
+saw them) are kept in a local SQLite file, so the Videos page reads them
+instantly. A refresh pages through the channel's ``/shorts`` tab newest first
+and stops at the first video already in the catalog, so its cost scales with
+new uploads rather than channel history. A new channel is only filled as deep
+as the page needs, and filled deeper when a larger "Videos per channel" value
+asks for more.
+
+All reads of YouTube go through the fetch scheduler (global concurrency cap,
+per-host rate limit, deadlines, retries and a per-channel circuit breaker).
+Stale channels are refreshed in the background while the catalog keeps
+serving what it has, and a channel whose fetch fails is served from its last
+good catalog.
+
+Concurrent requests that need the same channel filled share one fetch, and
+every request, fill and refresh is recorded by query_metrics under
+``videos.catalog`` (so they show up on the Diagnostics page).
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import yt_dlp
+
+import query_metrics
+from config_loader import get_cache_dir, get_config_value
+from fetch_scheduler import FetchScheduler, get_fetch_scheduler
+
+NAMESPACE = "videos.catalog"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+  channel_url TEXT NOT NULL,
+  video_id TEXT NOT NULL,
+  title TEXT NOT NULL,
+  thumbnail TEXT NOT NULL,
+  first_seen REAL NOT NULL,
+  seq INTEGER NOT NULL,
+  PRIMARY KEY (channel_url, video_id)
+);
+CREATE INDEX IF NOT EXISTS videos_channel_seq ON videos (channel_url, seq);
+CREATE TABLE IF NOT EXISTS channels (
+  channel_url TEXT PRIMARY KEY,
+  depth INTEGER NOT NULL,
+  complete INTEGER NOT NULL,
+  refreshed_at REAL NOT NULL
+);
+"""
+
+
+def iter_shorts(channel_url: str) -> Iterator[Dict[str, str]]:
+    """
+    Yield a channel's Shorts newest first, paging through the tab only as far as consumed
+
+    The tab is extracted without processing its entries, so yt-dlp requests
+    the next page of the listing only when the generator is advanced.
+
+    Yields:
+        Dicts with id, title and thumbnail
+    """
+    ydl_opts = {
+        "quiet": True,
+        "skip_download": True,
+        "extract_flat": True,
+        "nocheckcertificate": True,
+        "socket_timeout": float(get_config_value("FETCH_DEADLINE", 20)),
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(channel_url.rstrip("/") + "/shorts", download=False, process=False)
+        if info.get("_type") in ("url", "url_transparent"):
+            info = ydl.extract_info(info["url"], download=False, process=False)
+
+        for entry in info.get("entries") or []:
+            video_id = entry and entry.get("id")
+            if not video_id:
+                continue
+            thumbnails = entry.get("thumbnails") or [{}]
+            yield {
+                "id": video_id,
+                "title": entry.get("title") or "Untitled",
+                "thumbnail": entry.get("thumbnail") or thumbnails[-1].get("url") or "",
+            }
+
+
+class VideoCatalog:
+    """Shorts of every channel, persisted in SQLite and refreshed newest first"""
+
+    def __init__(
+        self,
+        path: str,
+        refresh_interval: float = 3600,
+        step: int = 12,
+        lister: Callable[[str], Iterator[Dict[str, str]]] = iter_shorts,
+        scheduler: Optional[FetchScheduler] = None,
+    ):
+        """
+        Args:
+            path: SQLite file of the catalog
+            refresh_interval: Seconds before a channel is refreshed again
+            step: Depth increments when filling a channel
+            lister: Yields a channel's Shorts newest first (default: yt-dlp)
+            scheduler: Runs the fetches (default: the process-wide scheduler)
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.step = max(1, step)
+        self.lister = lister
+        self.scheduler = scheduler or get_fetch_scheduler()
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._channel_locks: Dict[str, threading.Lock] = {}
+        self._refreshing: Set[str] = set()
+        self._fills: Dict[str, Tuple[int, Future]] = {}  # channel -> depth and Future of its running fill
+
+    def _channel_lock(self, channel_url: str) -> threading.Lock:
+        with self._lock:
+            return self._channel_locks.setdefault(channel_url, threading.Lock())
+
+    def _channel(self, channel_url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT depth, complete, refreshed_at, "
+                "(SELECT COUNT(*) FROM videos WHERE channel_url = ?), "
+                "(SELECT MIN(seq) FROM videos WHERE channel_url = ?), "
+                "(SELECT MAX(seq) FROM videos WHERE channel_url = ?) "
+                "FROM channels WHERE channel_url = ?",
+                (channel_url, channel_url, channel_url, channel_url),
+            ).fetchone()
+        if row is None:
+            return None
+        depth, complete, refreshed_at, count, min_seq, max_seq = row
+        return {
+            "depth": depth, "complete": bool(complete), "refreshed_at": refreshed_at,
+            "count": count, "min_seq": min_seq or 0, "max_seq": max_seq or 0,
+        }
+
+    def _known_ids(self, channel_url: str) -> Set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT video_id FROM videos WHERE channel_url = ?", (channel_url,)).fetchall()
+        return {video_id for video_id, in rows}
+
+    def _insert(self, channel_url: str, videos: List[Dict[str, str]], seqs: List[int], channel: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO videos (channel_url, video_id, title, thumbnail, first_seen, seq) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(channel_url, v["id"], v["title"], v["thumbnail"], now, seq) for v, seq in zip(videos, seqs)],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO channels (channel_url, depth, complete, refreshed_at) VALUES (?, ?, ?, ?)",
+                (channel_url, channel["depth"], int(channel["complete"]), channel["refreshed_at"]),
+            )
+
+    def fill(self, channel_url: str, depth: int) -> int:
+        """
+        Read a channel's first ``depth`` Shorts into the catalog
+
+        Videos listed above the newest one the catalog knows are new uploads
+        and go on top; the others are older than everything it holds. Does
+        nothing if the channel was filled this deep (or completely) meanwhile.
+
+        Returns:
+            Number of videos added
+        """
+        with self._channel_lock(channel_url):
+            channel = self._channel(channel_url)
+            if channel is not None and (channel["depth"] >= depth or channel["complete"]):
+                return 0
+            channel = channel or {
+                "depth": 0, "complete": False, "refreshed_at": time.time(), "count": 0, "min_seq": 0, "max_seq": 0,
+            }
+            known = self._known_ids(channel_url)
+            listed = list(itertools.islice(self.lister(channel_url), depth))
+            # Listed newest first: everything before the first known video is newer than the catalog
+            top = next((i for i, video in enumerate(listed) if video["id"] in known), len(listed) if known else 0)
+            newer, older = listed[:top], [video for video in listed[top:] if video["id"] not in known]
+            seqs = [channel["max_seq"] + top - i for i in range(top)] + [channel["min_seq"] - 1 - i for i in range(len(older))]
+            channel.update(depth=max(depth, channel["depth"]), complete=len(listed) < depth)
+            self._insert(channel_url, newer + older, seqs, channel)
+            return len(newer) + len(older)
+
+    def refresh(self, channel_url: str) -> int:
+        """
+        Add a channel's new Shorts, reading its tab only until the first known video
+
+        Returns:
+            Number of videos added
+        """
+        channel = self._channel(channel_url)
+        if channel is None:
+            return self.fill(channel_url, self.step)
+
+        with self._channel_lock(channel_url):
+            known = self._known_ids(channel_url)
+            new = list(itertools.takewhile(lambda video: video["id"] not in known, self.lister(channel_url)))
+            channel = self._channel(channel_url)
+            # Listed newest first: the first new video gets the highest seq
+            seqs = [channel["max_seq"] + len(new) - i for i in range(len(new))]
+            channel.update(refreshed_at=time.time())
+            self._insert(channel_url, new, seqs, channel)
+            return len(new)
+
+    def _record(self, channel_url: str, error: Optional[BaseException]) -> None:
+        with self._lock:
+            if error is None:
+                self._errors.pop(channel_url, None)
+            else:
+                self._errors[channel_url] = str(error) or type(error).__name__
+
+    def _tracked(self, cache: str, channel_url: str, label: str, fetch: Callable[[], int]) -> Callable[[], int]:
+        """Wrap a fill or refresh so each attempt is recorded by query_metrics (rows: videos added)"""
+        def run() -> int:
+            with query_metrics.track(NAMESPACE, channel_url, label) as call:
+                call.cache = cache
+                call.rows = fetch()
+                return call.rows
+
+        return run
+
+    def _refresh_in_background(self, channel_url: str) -> None:
+        with self._lock:
+            if channel_url in self._refreshing:
+                return
+            self._refreshing.add(channel_url)
+
+        def done(future: Future) -> None:
+            self._record(channel_url, future.exception())
+            with self._lock:
+                self._refreshing.discard(channel_url)
+
+        refresh = self._tracked("refresh", channel_url, "refresh", lambda: self.refresh(channel_url))
+        self.scheduler.submit(channel_url, channel_url, refresh).add_done_callback(done)
+
+    def _fill_in_background(self, channel_url: str, depth: int) -> Tuple[Future, bool]:
+        """
+        Schedule a fill to ``depth``, or join a running fill of the channel that goes at least as deep
+
+        Returns:
+            Future of the fill and whether it was joined rather than scheduled
+        """
+        with self._lock:
+            running = self._fills.get(channel_url)
+            if running is not None and running[0] >= depth:
+                return running[1], True
+            fill: Future = Future()
+            self._fills[channel_url] = (depth, fill)
+
+        def done(future: Future) -> None:
+            with self._lock:
+                if self._fills.get(channel_url, (0, None))[1] is fill:
+                    del self._fills[channel_url]
+            error = future.exception()
+            if error is None:
+                fill.set_result(future.result())
+            else:
+                fill.set_exception(error)
+
+        run = self._tracked("miss", channel_url, f"fill to {depth}", lambda: self.fill(channel_url, depth))
+        self.scheduler.submit(channel_url, channel_url, run).add_done_callback(done)
+        return fill, False
+
+    def _rows(self, channel_url: str, count: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT video_id, title, thumbnail, first_seen FROM videos WHERE channel_url = ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (channel_url, count),
+            ).fetchall()
+        return [
+            {
+                "id": video_id,
+                "title": title,
+                "url": f"https://www.youtube.com/watch?v={video_id}",
+                "thumbnail": thumbnail,
+                "first_seen": first_seen,
+            }
+            for video_id, title, thumbnail, first_seen in rows
+        ]
+
+    def request(self, channel_url: str, count: int) -> Future:
+        """
+        Get a channel's ``count`` newest Shorts without blocking
+
+        A channel the catalog does not hold deep enough is filled first (its
+        depth rounded up to a multiple of ``step``); a channel not refreshed
+        for ``refresh_interval`` seconds is served as is and refreshed in the
+        background. If the fill fails, what the catalog already holds is
+        served and the error is reported by status(); only a channel with
+        nothing in the catalog fails.
+
+        Returns:
+            Future of up to ``count`` dicts with id, title, url, thumbnail and first_seen
+        """
+        result: Future = Future()
+        channel = self._channel(channel_url)
+        if channel is None or (channel["count"] < count and not channel["complete"]):
+            depth = max(-(-count // self.step) * self.step, channel["depth"] + self.step if channel else 0)
+            fill, joined = self._fill_in_background(channel_url, depth)
+            if joined:
+                with query_metrics.track(NAMESPACE, channel_url, f"{count} videos") as call:
+                    call.cache = "coalesced"
+
+            def filled(future: Future) -> None:
+                error = future.exception()
+                self._record(channel_url, error)
+                rows = self._rows(channel_url, count)
+                if error is not None and not rows:
+                    result.set_exception(error)
+                else:
+                    result.set_result(rows)
+
+            fill.add_done_callback(filled)
+            return result
+
+        with query_metrics.track(NAMESPACE, channel_url, f"{count} videos") as call:
+            if time.time() - channel["refreshed_at"] >= self.refresh_interval:
+                call.cache = "stale"
+                self._refresh_in_background(channel_url)
+            else:
+                call.cache = "hit"
+            rows = self._rows(channel_url, count)
+        result.set_result(rows)
+        return result
+
+    def videos(self, channel_url: str, count: int) -> List[Dict[str, Any]]:
+        """Blocking request(): a channel's ``count`` newest Shorts"""
+        return self.request(channel_url, count).result()
+
+    def status(self, channel_url: str) -> Dict[str, Any]:
+        """
+        When a channel was last refreshed and why its last fetch failed
+
+        Returns:
+            Dict with ``refreshed_at`` (epoch seconds or None), ``error`` (None
+            after a successful fetch) and the ``breaker`` state
+        """
+        channel = self._channel(channel_url)
+        with self._lock:
+            error = self._errors.get(channel_url)
+        return {
+            "refreshed_at": channel["refreshed_at"] if channel else None,
+            "error": error,
+            "breaker": self.scheduler.breaker(channel_url).state,
+        }
+
+
+_catalog: Optional[VideoCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_video_catalog() -> VideoCatalog:
+    """
+    Get the process-wide video catalog
+
+    Returns:
+        VideoCatalog backed by VIDEO_CATALOG_PATH (default: video_catalog.sqlite3 in the cache dir)
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = VideoCatalog(
+                get_config_value("VIDEO_CATALOG_PATH") or os.path.join(get_cache_dir(), "video_catalog.sqlite3"),
+                refresh_interval=float(get_config_value("VIDEO_CATALOG_REFRESH_INTERVAL", 3600)),
+                step=int(get_config_value("SHORTS_FETCH_STEP", 12)),
+            )
+        return _catalog